@@ -46,16 +46,35 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # Outside the request budget, so profiles of slow requests can still be saved.
+    "core.profiling.ProfilingMiddleware",
+    "core.middleware.RequestBudgetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.ReplicaRoutingMiddleware",
 ]
 
+# The token-authenticated API skips the session, CSRF, auth, message and
+# frame-options middleware when served by core.handlers.LaneWSGIHandler (see
+# app/wsgi.py). The test client always runs the full MIDDLEWARE.
+API_MIDDLEWARE = [
+    "django.middleware.security.SecurityMiddleware",
+    "core.profiling.ProfilingMiddleware",
+    "core.middleware.RequestBudgetMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "core.middleware.ReplicaRoutingMiddleware",
+]
+API_MIDDLEWARE_PREFIXES = ["/api/recipe/", "/api/user/", "/api/batch/", "/api/profiles/"]
+
 ROOT_URLCONF = "app.urls"
 
+# Clears buffered recipe views before the test databases are destroyed.
+TEST_RUNNER = "core.test_runner.TestRunner"
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -85,9 +104,75 @@ DATABASES = {
         "NAME": os.environ.get("DB_NAME"),
         "USER": os.environ.get("DB_USER"),
         "PASSWORD": os.environ.get("DB_PASS"),
+        # Keep connections between requests, including those opened at warm-up.
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
     }
 }
 
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica1,replica2:5433. Each becomes a
+# replica_<n> alias with the primary's credentials (core.db_routers). Leave it
+# unset for `manage.py test`; the end-to-end router tests run when a second,
+# separate database is configured under the alias "replica".
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(","))):
+    host, _, port = replica.partition(":")
+    alias = f"replica_{index}"
+    DATABASES[alias] = dict(DATABASES["default"], HOST=host, PORT=port, TEST={"MIRROR": "default"})
+    DATABASE_REPLICAS.append(alias)
+
+# Shards for user-owned rows, e.g. DB_SHARD_HOSTS=shard1,shard2:5433, which
+# become shard_<n> aliases next to "default" (core.sharding). Users stay on
+# "default" with a copy on their shard; give each shard's id sequences a
+# disjoint range so rows keep their ids when move_user_shard moves them.
+DATABASE_SHARDS = ["default"]
+for index, shard in enumerate(filter(None, os.environ.get("DB_SHARD_HOSTS", "").split(","))):
+    host, _, port = shard.partition(":")
+    alias = f"shard_{index + 1}"
+    DATABASES[alias] = dict(DATABASES["default"], HOST=host, PORT=port)
+    DATABASE_SHARDS.append(alias)
+
+# Work app/wsgi.py does before serving (core.warmup): build the fields of the
+# serializers in WARMUP_SERIALIZER_MODULES and send one request to
+# WARMUP_PATH. Set DJANGO_WSGI_WARMUP=0 to skip it. Connections to the
+# databases are only opened, and kept, with DJANGO_WARMUP_DATABASES=1; leave
+# it unset when the application is loaded before forking workers (gunicorn
+# --preload), which would otherwise share the sockets. `manage.py
+# profile_startup` checks STARTUP_TARGETS, in seconds.
+WSGI_WARMUP = os.environ.get("DJANGO_WSGI_WARMUP", "1") != "0"
+WARMUP_DATABASES = list(DATABASES) if os.environ.get("DJANGO_WARMUP_DATABASES") == "1" else []
+WARMUP_SERIALIZER_MODULES = ["recipe.serializers", "user.serializers"]
+WARMUP_PATH = "/api/recipe/"
+STARTUP_TARGETS = {"cold_start": 3.0, "first_request": 0.1}
+
+DATABASE_ROUTERS = ["core.sharding.ShardRouter", "core.db_routers.ReplicaRouter"]
+
+# Seconds each process may cache a user's shard assignment; also how long
+# move_user_shard waits for writers to notice that a user is moving.
+SHARD_DIRECTORY_CACHE_SECONDS = 30
+
+# Cache shared by every worker, e.g. MEMCACHED_HOSTS=memcached:11211,cache2:11211.
+# It holds the replica read-your-writes markers, the shard directory and the
+# load-shedding counts, so DATABASE_REPLICAS (checked at startup by
+# core.caches) and `manage.py shed_counts` require it. Without it each
+# process gets its own local memory cache, fit only for development.
+MEMCACHED_HOSTS = list(filter(None, os.environ.get("MEMCACHED_HOSTS", "").split(",")))
+if MEMCACHED_HOSTS:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
+            "LOCATION": MEMCACHED_HOSTS,
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# Seconds a client keeps reading from the primary after it writes.
+REPLICA_STICKY_SECONDS = 5
+# Seconds between health checks of each replica, and the most replication
+# lag (Postgres only) a replica may have and stay in rotation.
+REPLICA_HEALTH_CHECK_INTERVAL = 10
+REPLICA_MAX_LAG = None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -124,4 +209,112 @@ STATIC_ROOT = "/vol/web/static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = "/vol/web/media"
 
+# How media bytes leave the worker: unset streams them from Django (sendfile
+# through wsgi.file_wrapper), "x-accel-redirect" hands them to nginx from an
+# internal location at MEDIA_ACCEL_PREFIX and "x-sendfile" to Apache/lighttpd.
+MEDIA_ACCEL = os.environ.get("MEDIA_ACCEL") or None
+MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/protected-media/")
+
+# Uploads always stream to a temporary file and are validated from their
+# header, so these limits are enforced before anything decodes the pixels.
+FILE_UPLOAD_HANDLERS = ["core.uploads.LimitedTemporaryFileUploadHandler"]
+IMAGE_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_DIMENSION = 8000
+IMAGE_UPLOAD_MAX_PIXELS = 40 * 1000 * 1000
+
+# Resumable uploads: chunks are appended to a part file under
+# UPLOAD_SESSION_ROOT, and sessions idle for longer than UPLOAD_SESSION_MAX_AGE
+# seconds are removed by `manage.py clear_upload_sessions`.
+UPLOAD_SESSION_ROOT = "/vol/web/upload-sessions"
+UPLOAD_SESSION_MAX_AGE = 24 * 60 * 60
+IMAGE_UPLOAD_CHUNK_MAX_BYTES = 4 * 1024 * 1024
+
+# Recipe file imports: uploads are kept under RECIPE_IMPORT_ROOT while they
+# are processed RECIPE_IMPORT_CHUNK_SIZE recipes per transaction, in a thread
+# of the web process unless RECIPE_IMPORT_IN_BACKGROUND is off.
+RECIPE_IMPORT_ROOT = "/vol/web/recipe-imports"
+RECIPE_IMPORT_MAX_BYTES = 200 * 1024 * 1024
+RECIPE_IMPORT_CHUNK_SIZE = 500
+RECIPE_IMPORT_MAX_ERRORS = 100
+RECIPE_IMPORT_IN_BACKGROUND = True
+
+# Recipe views are counted in memory and saved every RECIPE_VIEWS_FLUSH_SECONDS
+# (after a request, so an idle worker keeps its last few seconds of views). The
+# "popularity" ordering halves the weight of a view every
+# RECIPE_POPULARITY_HALF_LIFE seconds; changing it skews existing scores.
+RECIPE_VIEWS_FLUSH_SECONDS = 5
+RECIPE_POPULARITY_HALF_LIFE = 3 * 24 * 60 * 60
+
+# Idempotency-Key on creates: successful responses are replayed for
+# IDEMPOTENCY_KEY_TTL seconds, and a key whose request has been running for
+# IDEMPOTENCY_LOCK_SECONDS is taken to be abandoned. Expired keys are removed
+# by `manage.py clear_idempotency_keys`.
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_SECONDS = 60
+
+# Time budgets in seconds by URL name (core.middleware.RequestBudgetMiddleware),
+# also set as the Postgres statement timeout. Requests that waited in the
+# proxy for over REQUEST_MAX_QUEUE_SECONDS (by X-Request-Start) or that find
+# REQUEST_MAX_IN_FLIGHT requests running in their process are answered 503
+# with Retry-After: LOAD_SHED_RETRY_AFTER. None turns a check off; the
+# in-flight limit only matters with threaded workers.
+REQUEST_BUDGET_DEFAULT = 10
+REQUEST_BUDGETS = {
+    "recipe:recipe-list": 5,
+    "recipe:tag-list": 5,
+    "recipe:ingredient-list": 5,
+    "recipe:tag-autocomplete": 1,
+    "recipe:ingredient-autocomplete": 1,
+    "user:import": 300,
+}
+REQUEST_BUDGET_EXEMPT = (
+    "recipe:events",
+    "recipe:recipe-import-file",
+    "recipe:recipe-upload-image",
+    "recipe:recipe-upload-chunk",
+    "recipe:recipe-upload-session-complete",
+    "media",
+)
+REQUEST_MAX_QUEUE_SECONDS = None
+REQUEST_MAX_IN_FLIGHT = None
+LOAD_SHED_RETRY_AFTER = 2
+
+# Request profiling (core.profiling.ProfilingMiddleware): staff tokens sending
+# `X-Profile: 1`, and a PROFILING_SAMPLE_RATE fraction of all requests, run
+# under cProfile with their SQL and serializer timings recorded, browsable at
+# api/profiles/ by admins. Each process profiles at most
+# PROFILING_MAX_PER_MINUTE requests and only the newest PROFILING_MAX_STORED
+# profiles are kept, each with up to PROFILING_MAX_QUERIES queries and the
+# PROFILING_STATS_LINES functions with the most cumulative time.
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_MAX_PER_MINUTE = 10
+PROFILING_MAX_STORED = 500
+PROFILING_MAX_QUERIES = 200
+PROFILING_STATS_LINES = 50
+PROFILING_EXCLUDED_PATHS = ("/api/recipe/events/", "/api/profiles/", MEDIA_URL)
+
+# Most changes returned by one page of the recipe sync endpoint.
+SYNC_PAGE_SIZE = 500
+
+# Most recipes one recipes/batch/ request may ask for.
+RECIPE_BATCH_MAX_IDS = 100
+
+# Sub-requests per call to api/batch/, and threads for its parallel GETs.
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 4
+
+# Change notifications (recipe/events/). The local backend only reaches
+# streams served by the same process; use core.events.PostgresBackend when
+# running several. Each stream holds a worker thread for up to
+# EVENTS_STREAM_MAX_SECONDS, then the client reconnects with Last-Event-ID.
+EVENTS_BACKEND = "core.events.LocalBackend"
+EVENTS_BUFFER_SIZE = 100
+EVENTS_HEARTBEAT_SECONDS = 15
+EVENTS_STREAM_MAX_SECONDS = 300
+
 AUTH_USER_MODEL = "core.User"
+
+# Bulk user import (api/user/import/ and `manage.py import_users`): password
+# hashing processes per import (None for one per CPU) and rows per request.
+USER_IMPORT_WORKERS = None
+USER_IMPORT_MAX_ROWS = 10000
@@ -15,11 +15,18 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
 from django.conf import settings
 
+from core.batch import BatchView
+from core.media import MediaView
+from core.profiling import RequestProfileDetail, RequestProfileList
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/user/", include("user.urls")),
     path("api/recipe/", include("recipe.urls")),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path("api/batch/", BatchView.as_view(), name="batch"),
+    path("api/profiles/", RequestProfileList.as_view(), name="profiles"),
+    path("api/profiles/<int:pk>/", RequestProfileDetail.as_view(), name="profile"),
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:name>", MediaView.as_view(), name="media"),
+]
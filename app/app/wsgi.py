@@ -9,8 +9,16 @@ https://docs.djangoproject.com/en/2.1/howto/deployment/wsgi/
 
 import os
 
-from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
 
+from core.handlers import get_wsgi_application  # noqa: E402
+
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.WSGI_WARMUP:
+    from core.warmup import warm_up
+
+    warm_up(application)
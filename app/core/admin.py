@@ -1,13 +1,72 @@
+import json
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 
 from core import models
 
 
+class EstimatedCountPaginator(Paginator):
+    """Trusts the Postgres planner's row estimate instead of running COUNT(*) on big lists"""
+
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql":
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = int(plan[0]["Plan"]["Plan Rows"])
+            if estimate > self.exact_count_limit:
+                return estimate
+        return super().count
+
+
+class OwnerFilter(admin.SimpleListFilter):
+    """Filters by owner without listing every user in the sidebar"""
+
+    title = _("owner")
+    parameter_name = "user"
+
+    def lookups(self, request, model_admin):
+        value = self.value()
+        if not value or not value.isdigit():
+            return ()
+        return models.User.objects.filter(pk=value).values_list("pk", "email")
+
+    def has_output(self):
+        return bool(self.value())
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            return queryset.filter(user_id=self.value())
+        return queryset
+
+
+class UserOwnedAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_select_related = ("user",)
+    list_filter = (OwnerFilter,)
+    raw_id_fields = ("user",)
+
+
 class UserAdmin(BaseUserAdmin):
     ordering = ["id"]
     list_display = ["email", "name"]
+    search_fields = ["^email", "^name"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     fieldsets = (
         (None, {"fields": ("email", "password")}),
@@ -21,7 +80,29 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class TagAdmin(UserOwnedAdmin):
+    list_display = ["name", "user"]
+    search_fields = ["^name"]
+
+
+class IngredientAdmin(UserOwnedAdmin):
+    list_display = ["name", "user"]
+    search_fields = ["^name"]
+
+
+class CanonicalIngredientAdmin(admin.ModelAdmin):
+    list_display = ["name", "name_key"]
+    search_fields = ["^name_key"]
+
+
+class RecipeAdmin(UserOwnedAdmin):
+    list_display = ["title", "user", "time_in_minutes", "price"]
+    search_fields = ["^title"]
+    autocomplete_fields = ["tags", "ingredients"]
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
-admin.site.register(models.Recipe)
+admin.site.register(models.Tag, TagAdmin)
+admin.site.register(models.Ingredient, IngredientAdmin)
+admin.site.register(models.CanonicalIngredient, CanonicalIngredientAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
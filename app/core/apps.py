@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = "core"
+
+    def ready(self):
+        from core import signals  # noqa: F401
+        from core.caches import check_caches
+
+        check_caches()
@@ -0,0 +1,151 @@
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.exception import response_for_exception
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import Resolver404, resolve
+from rest_framework import serializers
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+# Views a batch may call. Sub-requests skip the middleware, so only cheap
+# views are allowed: not sign up, tokens, imports, uploads, sync, event
+# streams or nested batches, which have their own budgets and size limits.
+BATCH_VIEWS = frozenset(
+    (
+        "recipe:tag-list",
+        "recipe:tag-autocomplete",
+        "recipe:ingredient-list",
+        "recipe:ingredient-autocomplete",
+        "recipe:recipe-list",
+        "recipe:recipe-detail",
+        "recipe:recipe-batch",
+        "recipe:recipe-import-job",
+        "recipe:recipe-upload-session",
+        "user:me",
+    )
+)
+
+
+class SubRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=("GET", "POST", "PUT", "PATCH", "DELETE"))
+    path = serializers.CharField(max_length=2048)
+    body = serializers.JSONField(required=False)
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = SubRequestSerializer(many=True, allow_empty=False)
+    parallel = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(
+                f"Send at most {settings.BATCH_MAX_REQUESTS} requests at a time"
+            )
+        return value
+
+
+class BatchView(APIView):
+    """
+    Runs several API requests in one call.
+
+    Post ``{"requests": [{"method": "GET", "path": "/api/recipe/tags/"}, ...]}``
+    and get back ``{"responses": [{"status": 200, "body": ...}, ...]}`` in the
+    same order. The caller is authenticated once for all of them. With
+    ``"parallel": true``, runs of consecutive GETs go to a thread pool; other
+    requests run one after another, so a GET after a write sees it.
+    """
+
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data["requests"]
+
+        if not serializer.validated_data["parallel"]:
+            return Response({"responses": [self.dispatch_item(request, item) for item in items]})
+
+        responses = []
+        with ThreadPoolExecutor(settings.BATCH_MAX_WORKERS) as pool:
+            start = 0
+            while start < len(items):
+                end = start + 1
+                if items[start]["method"] == "GET":
+                    while end < len(items) and items[end]["method"] == "GET":
+                        end += 1
+                if end - start == 1:
+                    responses.append(self.dispatch_item(request, items[start]))
+                else:
+                    responses += self.dispatch_group(pool, request, items[start:end])
+                start = end
+        return Response({"responses": responses})
+
+    def dispatch_group(self, pool, request, group):
+        """Spread ``group`` over the workers, each running its share one after another"""
+        workers = min(settings.BATCH_MAX_WORKERS, len(group))
+        responses = [None] * len(group)
+
+        def run(indexes):
+            try:
+                for index in indexes:
+                    responses[index] = self.dispatch_item(request, group[index])
+            finally:
+                # Database connections are per thread; close each worker's once.
+                connections.close_all()
+
+        list(pool.map(run, [range(worker, len(group), workers) for worker in range(workers)]))
+        return responses
+
+    def dispatch_item(self, request, item):
+        path, _, query = item["path"].partition("?")
+        try:
+            match = resolve(path)
+        except Resolver404:
+            match = None
+        if match is None or match.view_name not in BATCH_VIEWS:
+            return {"status": 404, "body": {"detail": "Not found."}}
+
+        sub_request = self.build_request(request, item, path, query)
+        try:
+            response = match.func(sub_request, *match.args, **match.kwargs)
+        except Exception as exc:
+            response = response_for_exception(sub_request, exc)
+
+        if getattr(response, "data", None) is not None or response.status_code == 204:
+            body = getattr(response, "data", None)
+        else:
+            if hasattr(response, "render"):
+                response.render()
+            body = response.content.decode(response.charset, "replace")
+        return {"status": response.status_code, "body": body}
+
+    def build_request(self, request, item, path, query):
+        environ = dict(request.META)
+        # The batch's own key must not make its creates replay one another.
+        environ.pop("HTTP_IDEMPOTENCY_KEY", None)
+        body = b""
+        if "body" in item:
+            body = json.dumps(item["body"]).encode()
+        environ.update(
+            {
+                "REQUEST_METHOD": item["method"],
+                "PATH_INFO": path,
+                "QUERY_STRING": query,
+                "CONTENT_TYPE": "application/json",
+                "CONTENT_LENGTH": str(len(body)),
+                "HTTP_ACCEPT": "application/json",
+                "wsgi.input": io.BytesIO(body),
+            }
+        )
+        sub_request = WSGIRequest(environ)
+        # Reuse the batch's authentication instead of looking the token up again.
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+        return sub_request
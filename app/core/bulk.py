@@ -0,0 +1,74 @@
+import csv
+import io
+
+from django.core.management.color import no_style
+from django.db import connections
+
+COPY_NULL = r"\N"
+
+
+def _columns(connection, model, fields):
+    return ", ".join(
+        connection.ops.quote_name(model._meta.get_field(name).column) for name in fields
+    )
+
+
+def _copy_rows(connection, model, fields, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row in rows:
+        writer.writerow(COPY_NULL if value is None else value for value in row)
+        count += 1
+    buffer.seek(0)
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = _columns(connection, model, fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')", buffer
+        )
+    return count
+
+
+def _insert_rows(connection, model, fields, rows):
+    rows = list(rows)
+    if not rows:
+        return 0
+    # Plain ints and strings go through as they are; only adapt the other columns.
+    adapt = [
+        index
+        for index, value in enumerate(rows[0])
+        if not isinstance(value, (int, str, type(None)))
+    ]
+    params = rows
+    if adapt:
+        preps = {index: model._meta.get_field(fields[index]).get_db_prep_save for index in adapt}
+        params = [list(row) for row in rows]
+        for row in params:
+            for index, prep in preps.items():
+                row[index] = prep(row[index], connection)
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = _columns(connection, model, fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", params)
+    return len(params)
+
+
+def bulk_insert(model, fields, rows, using="default"):
+    """
+    Insert ``rows``, tuples of values for ``fields``, without model saves or
+    signals. Postgres gets a single COPY, other databases one executemany.
+    """
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        return _copy_rows(connection, model, fields, rows)
+    return _insert_rows(connection, model, fields, rows)
+
+
+def reset_sequences(models, using="default"):
+    """Move id sequences past rows inserted with explicit ids"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+# Backends whose contents other processes never see.
+PROCESS_LOCAL = (LocMemCache, DummyCache)
+
+
+def is_shared(alias="default"):
+    """Whether every worker process sees what is stored in cache ``alias``"""
+    return not isinstance(caches[alias], PROCESS_LOCAL)
+
+
+def require_shared_cache(feature):
+    if not is_shared():
+        raise ImproperlyConfigured(
+            f"{feature} needs a cache shared between processes, set MEMCACHED_HOSTS"
+        )
+
+
+def check_caches():
+    """Refuse to start with replicas when the read-your-writes markers are per process"""
+    if settings.DATABASE_REPLICAS:
+        require_shared_cache("DATABASE_REPLICAS")
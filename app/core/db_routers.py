@@ -0,0 +1,118 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+PRIMARY = "default"
+
+_state = threading.local()
+
+
+@contextmanager
+def replica_reads(allowed=True):
+    """Allow reads in this block to go to replicas until something is written"""
+    previous = getattr(_state, "replicas_allowed", False), getattr(_state, "wrote", False)
+    _state.replicas_allowed, _state.wrote = allowed, False
+    try:
+        yield
+    finally:
+        _state.replicas_allowed, _state.wrote = previous
+
+
+def wrote_to_primary():
+    return getattr(_state, "wrote", False)
+
+
+class ReplicaPool:
+    """Round-robins over the replicas that passed their last health check"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._checked_at = {}
+        self._healthy = {}
+
+    def reset(self):
+        with self._lock:
+            self._checked_at.clear()
+            self._healthy.clear()
+
+    def check(self, alias):
+        """Run a trivial query, and the lag query when REPLICA_MAX_LAG is set"""
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT 1")
+                max_lag = getattr(settings, "REPLICA_MAX_LAG", None)
+                if max_lag is not None and connections[alias].vendor == "postgresql":
+                    cursor.execute(
+                        "SELECT COALESCE(EXTRACT(EPOCH FROM now() - "
+                        "pg_last_xact_replay_timestamp()), 0)"
+                    )
+                    return cursor.fetchone()[0] <= max_lag
+            return True
+        except DatabaseError:
+            connections[alias].close()
+            return False
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            due = now - self._checked_at.get(alias, float("-inf"))
+            if due < settings.REPLICA_HEALTH_CHECK_INTERVAL:
+                return self._healthy[alias]
+            # Claim the check so concurrent requests keep the previous answer.
+            self._checked_at[alias] = now
+            self._healthy.setdefault(alias, True)
+        healthy = self.check(alias)
+        with self._lock:
+            self._healthy[alias] = healthy
+        return healthy
+
+    def choose(self):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            return None
+        start = next(self._counter)
+        for offset in range(len(replicas)):
+            alias = replicas[(start + offset) % len(replicas)]
+            if self.is_healthy(alias):
+                return alias
+        return None
+
+
+pool = ReplicaPool()
+
+
+class ReplicaRouter:
+    """
+    Routes reads to a healthy replica inside ``replica_reads()`` and everything
+    else to the primary. The first write in a block pins the rest of it to the
+    primary so it reads its own changes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not getattr(_state, "replicas_allowed", False) or wrote_to_primary():
+            return PRIMARY
+        return pool.choose() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db not in (None, *settings.DATABASE_REPLICAS):
+            # Explicit .using() on a non-replica database, as Django's default does.
+            return instance._state.db
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
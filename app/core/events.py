@@ -0,0 +1,202 @@
+import json
+import queue
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+from rest_framework.renderers import BaseRenderer
+
+from core.models import Ingredient, Recipe, Tag, Tombstone
+
+CHANNEL = "recipe_changes"
+
+
+def format_event(data, event=None, event_id=None):
+    """Encode one server-sent event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients ask for text/event-stream, and sends them errors as an event"""
+
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_event(data, event="error")
+
+
+class Subscription:
+    """One connection's bounded buffer; overflowing it ends the stream"""
+
+    def __init__(self, user_id, size):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=size)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Broker:
+    """Fans change events out to the subscriptions of this process"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, user_id):
+        self.backend.start(self)
+        subscription = Subscription(user_id, settings.EVENTS_BUFFER_SIZE)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+    def publish(self, user_id, event):
+        self.backend.publish(user_id, event)
+
+    def dispatch(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+class LocalBackend:
+    """Delivers events within this process only"""
+
+    broker = None
+
+    def start(self, broker):
+        self.broker = broker
+
+    def publish(self, user_id, event):
+        # Nobody has subscribed yet when the broker hasn't started.
+        if self.broker is not None:
+            self.broker.dispatch(user_id, event)
+
+
+class PostgresBackend:
+    """
+    Delivers events to every process with LISTEN/NOTIFY on the default database.
+    Each process runs one listener thread on a connection of its own.
+    """
+
+    poll_interval = 5
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, broker):
+        self.broker = broker
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, daemon=True)
+                self._thread.start()
+
+    def publish(self, user_id, event):
+        payload = json.dumps({"user": user_id, "event": event})
+        with connections["default"].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+
+    def _listen(self):
+        while True:
+            try:
+                self._listen_once()
+            except Exception:
+                time.sleep(self.poll_interval)
+
+    def _listen_once(self):
+        connection = connections["default"].get_new_connection(
+            connections["default"].get_connection_params()
+        )
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            while True:
+                if select.select([connection], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    message = json.loads(connection.notifies.pop(0).payload)
+                    self.broker.dispatch(message["user"], message["event"])
+        finally:
+            connection.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = Broker(import_string(settings.EVENTS_BACKEND)())
+    return _broker
+
+
+def publish_change(user_id, kind, object_id, change_seq, using, deleted=False):
+    """Publish once the change commits, so listeners never see rolled back changes"""
+    event = {"type": kind, "id": object_id, "seq": change_seq, "deleted": deleted}
+    transaction.on_commit(lambda: get_broker().publish(user_id, event), using=using)
+
+
+def replay(user_id, since, limit):
+    """
+    Events for the changes after ``since``, oldest first, or None when there
+    are more than ``limit`` and the client should use the sync endpoint.
+    """
+    events = []
+    for model in (Tag, Ingredient, Recipe):
+        rows = model.objects.filter(user_id=user_id, change_seq__gt=since).order_by("change_seq")
+        events += [
+            {"type": model._meta.model_name, "id": object_id, "seq": seq, "deleted": False}
+            for object_id, seq in rows.values_list("id", "change_seq")[: limit + 1]
+        ]
+    rows = Tombstone.objects.filter(user_id=user_id, change_seq__gt=since).order_by("change_seq")
+    events += [
+        {"type": kind, "id": object_id, "seq": seq, "deleted": True}
+        for kind, object_id, seq in rows.values_list("model", "object_id", "change_seq")[
+            : limit + 1
+        ]
+    ]
+    if len(events) > limit:
+        return None
+    return sorted(events, key=lambda event: event["seq"])
+
+
+def release_connections():
+    """Hand the database connections back while a stream sits idle"""
+    for connection in connections.all():
+        if not connection.in_atomic_block:
+            connection.close()
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+from django.utils.module_loading import import_string
+
+
+class MiddlewareChain(BaseHandler):
+    """A handler over its own list of middleware instead of settings.MIDDLEWARE"""
+
+    def __init__(self, middleware):
+        self.middleware = middleware
+        self.load_middleware()
+
+    def load_middleware(self):
+        # As BaseHandler.load_middleware(), for self.middleware.
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        handler = convert_exception_to_response(self._get_response)
+        for middleware_path in reversed(self.middleware):
+            try:
+                instance = import_string(middleware_path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            if instance is None:
+                raise ImproperlyConfigured(f"Middleware factory {middleware_path} returned None.")
+            if hasattr(instance, "process_view"):
+                self._view_middleware.insert(0, instance.process_view)
+            if hasattr(instance, "process_template_response"):
+                self._template_response_middleware.append(instance.process_template_response)
+            if hasattr(instance, "process_exception"):
+                self._exception_middleware.append(instance.process_exception)
+            handler = convert_exception_to_response(instance)
+        self._middleware_chain = handler
+
+
+class LaneWSGIHandler(WSGIHandler):
+    """
+    Sends requests under API_MIDDLEWARE_PREFIXES through the shorter
+    API_MIDDLEWARE chain, and everything else, like the admin, through the
+    full MIDDLEWARE. The token-authenticated API has no use for sessions,
+    CSRF, messages or frame options.
+    """
+
+    def load_middleware(self):
+        super().load_middleware()
+        self.api_chain = MiddlewareChain(settings.API_MIDDLEWARE)
+        self.api_prefixes = tuple(settings.API_MIDDLEWARE_PREFIXES)
+
+    def get_response(self, request):
+        if request.path_info.startswith(self.api_prefixes):
+            return self.api_chain.get_response(request)
+        return super().get_response(request)
+
+
+def get_wsgi_application():
+    import django
+
+    django.setup(set_prefix=False)
+    return LaneWSGIHandler()
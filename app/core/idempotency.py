@@ -0,0 +1,83 @@
+import json
+
+from django.utils.crypto import salted_hmac
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.models import IdempotencyKey
+
+HEADER = "HTTP_IDEMPOTENCY_KEY"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still in progress."
+    default_code = "idempotency_key_in_use"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used for a different request."
+    default_code = "idempotency_key_reused"
+
+
+def fingerprint(request):
+    """Keyed hash of the method, path and body, so stored rows don't reveal passwords"""
+    data = request.data
+    if hasattr(data, "lists"):
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, cls=JSONEncoder)
+    return salted_hmac("core.idempotency", f"{request.method} {request.path}\n{body}").hexdigest()
+
+
+class IdempotentCreateMixin:
+    """
+    Lets clients retry creates: a request repeating the ``Idempotency-Key``
+    header of a successful one within IDEMPOTENCY_KEY_TTL seconds gets its
+    response back instead of creating another row. Failed requests release
+    the key so they can be retried.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({"Idempotency-Key": f"Use at most {MAX_KEY_LENGTH} characters"})
+
+        user = request.user
+        request_fingerprint = fingerprint(request)
+        if user.is_authenticated:
+            scope = f"user:{user.pk}"
+        else:
+            # Anonymous clients can't be told apart, so a key only ever
+            # matches a request with the same body, never another client's.
+            scope = f"anonymous:{request_fingerprint}"
+        row, claimed = IdempotencyKey.objects.claim(scope, key, request_fingerprint)
+        if not claimed:
+            return self.replay(row, request)
+
+        try:
+            response = super().create(request, *args, **kwargs)
+        except Exception:
+            row.delete()
+            raise
+        if response.status_code >= 400:
+            row.delete()
+            return response
+        row.status_code = response.status_code
+        row.response = json.dumps(response.data, cls=JSONEncoder)
+        row.save(update_fields=("status_code", "response"))
+        return response
+
+    def replay(self, row, request):
+        if row.fingerprint != fingerprint(request):
+            raise IdempotencyKeyReused
+        if row.status_code is None:
+            raise IdempotencyKeyInUse
+        response = Response(json.loads(row.response), status=row.status_code)
+        response["Idempotent-Replayed"] = "true"
+        return response
@@ -0,0 +1,52 @@
+import collections
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import CanonicalIngredient, Ingredient, normalize_name
+
+
+class Command(BaseCommand):
+    help = "Point ingredients without one at their canonical ingredient, in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--sleep", type=float, default=0, help="Seconds to pause between batches"
+        )
+
+    def handle(self, *args, **options):
+        # Under SQLite's limit on query parameters.
+        batch_size = min(options["batch_size"], CanonicalIngredient.objects.batch_size)
+        mapped = 0
+        for shard in settings.DATABASE_SHARDS:
+            pending = Ingredient.objects.using(shard).filter(canonical__isnull=True)
+            last_pk = 0
+            while True:
+                rows = list(
+                    pending.filter(pk__gt=last_pk)
+                    .order_by("pk")
+                    .values_list("pk", "name", "name_key")[:batch_size]
+                )
+                if not rows:
+                    break
+                mapped += self.map_batch(shard, pending, rows)
+                last_pk = rows[-1][0]
+                self.stdout.write(f"{shard}: mapped up to ingredient {last_pk}")
+                time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Mapped {mapped} ingredients"))
+
+    def map_batch(self, shard, pending, rows):
+        ids = CanonicalIngredient.objects.ids_for(name for _, name, _ in rows)
+        pks_by_key = collections.defaultdict(list)
+        for pk, name, key in rows:
+            if key == normalize_name(name):
+                pks_by_key[key].append(pk)
+        mapped = 0
+        with transaction.atomic(using=shard):
+            for key, pks in pks_by_key.items():
+                # Skips rows renamed since they were read; saving those mapped them already.
+                mapped += pending.filter(pk__in=pks, name_key=key).update(canonical_id=ids[key])
+        return mapped
@@ -0,0 +1,69 @@
+import itertools
+import random
+import string
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.bulk import bulk_insert
+from core.models import ChangeCounter, Ingredient, UserCounters, normalize_name
+from core.sharding import shard_for_user
+from recipe.views import IngredientViewSet
+
+
+class Command(BaseCommand):
+    help = "Time ingredient autocomplete for one user with many ingredients"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email", default="benchmark-autocomplete@example.com")
+        parser.add_argument("--ingredients", type=int, default=50000)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        User = get_user_model()
+        user = User.objects.filter(email=options["email"]).first()
+        if user is None:
+            user = User.objects.create_user(options["email"], "benchmark")
+        missing = options["ingredients"] - Ingredient.objects.filter(user=user).count()
+        if missing > 0:
+            self.seed(user, missing, rng)
+
+        factory = APIRequestFactory()
+        view = IngredientViewSet.as_view({"get": "autocomplete"})
+        timings = []
+        for _ in range(options["requests"]):
+            prefix = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 3)))
+            request = factory.get("/", {"prefix": prefix})
+            force_authenticate(request, user)
+            start = time.perf_counter()
+            view(request).render()
+            timings.append(time.perf_counter() - start)
+
+        timings.sort()
+        for label, quantile in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1)):
+            index = min(int(len(timings) * quantile), len(timings) - 1)
+            self.stdout.write(f"{label} {timings[index] * 1000:7.2f} ms")
+
+    def seed(self, user, count, rng):
+        self.stdout.write(f"Adding {count} ingredients for {user.email}...")
+        using = shard_for_user(user.pk)
+        now = timezone.now()
+        with transaction.atomic(using=using):
+            last = ChangeCounter.objects.db_manager(using).advance(user.pk, count)
+            UserCounters.objects.db_manager(using).add(user.pk, ingredients=count)
+            rows = (
+                (user.pk, name, normalize_name(name), int(rng.paretovariate(1.2)), now, seq)
+                for name, seq in (
+                    ("".join(rng.choices(string.ascii_letters, k=rng.randint(4, 12))), seq,)
+                    for seq in range(last - count + 1, last + 1)
+                )
+            )
+            fields = ("user_id", "name", "name_key", "recipe_count", "updated_at", "change_seq")
+            for batch in iter(lambda: list(itertools.islice(rows, 10000)), []):
+                bulk_insert(Ingredient, fields, batch, using=using)
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.views.static import serve
+
+from core.media import file_response
+
+DIGEST = "0" * 64
+
+
+class Command(BaseCommand):
+    help = "Compare media throughput of django.views.static.serve and core.media"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size-mb", type=int, default=8)
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def handle(self, *args, **options):
+        size = options["size_mb"] * 1024 * 1024
+        iterations = options["iterations"]
+        root = tempfile.mkdtemp()
+        name = f"{DIGEST}.jpg"
+        path = os.path.join(root, name)
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+
+        factory = RequestFactory()
+        cases = [
+            ("static.serve (current)", lambda: serve(factory.get("/"), name, root)),
+            ("core.media full", lambda: file_response(factory.get("/"), path, name)),
+            (
+                "core.media range 1MiB",
+                lambda: file_response(factory.get("/", HTTP_RANGE="bytes=0-1048575"), path, name),
+            ),
+            (
+                "core.media revalidate",
+                lambda: file_response(
+                    factory.get("/", HTTP_IF_NONE_MATCH=f'"{DIGEST}"'), path, name
+                ),
+            ),
+        ]
+
+        try:
+            for label, make_response in cases:
+                sent = 0
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    response = make_response()
+                    if response.streaming:
+                        for chunk in response.streaming_content:
+                            sent += len(chunk)
+                    else:
+                        sent += len(response.content)
+                    response.close()
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{label:<24} {iterations / elapsed:9.1f} req/s "
+                    f"{sent / elapsed / 1024 / 1024:9.1f} MiB/s"
+                )
+        finally:
+            shutil.rmtree(root)
@@ -0,0 +1,60 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.authtoken.models import Token
+
+from core.handlers import LaneWSGIHandler
+
+CASES = [
+    ("api root", "/api/recipe/"),
+    ("tag list", "/api/recipe/tags/"),
+    ("current user", "/api/user/me/"),
+]
+
+
+class Command(BaseCommand):
+    help = "Time API requests through the full middleware chain and the API lane"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email", default="benchmark-middleware@example.com")
+        parser.add_argument("--iterations", type=int, default=2000)
+        parser.add_argument("--rounds", type=int, default=5)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user = User.objects.filter(email=options["email"]).first()
+        if user is None:
+            user = User.objects.create_user(options["email"], "benchmark")
+        token, _ = Token.objects.get_or_create(user=user)
+
+        factory = RequestFactory(SERVER_NAME="localhost", HTTP_AUTHORIZATION=f"Token {token.key}")
+        handlers = {"full": WSGIHandler(), "lane": LaneWSGIHandler()}
+        self.stdout.write(
+            f"{len(settings.MIDDLEWARE)} middleware in the full chain, "
+            f"{len(settings.API_MIDDLEWARE)} in the API lane"
+        )
+        for label, path in CASES:
+            best = {}
+            # Alternate the handlers and keep each one's best round, to even out noise.
+            for _ in range(options["rounds"]):
+                for name, handler in handlers.items():
+                    elapsed = self.time(handler, factory, path, options["iterations"])
+                    best[name] = min(best.get(name, elapsed), elapsed)
+            saved = best["full"] - best["lane"]
+            self.stdout.write(
+                f"{label:<14} full {best['full'] * 1e6:8.1f} us  lane {best['lane'] * 1e6:8.1f} us"
+                f"  saved {saved * 1e6:6.1f} us ({saved / best['full']:.0%})"
+            )
+
+    def time(self, handler, factory, path, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            response = handler.get_response(factory.get(path))
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} answered {response.status_code}")
+            response.close()
+        return (time.perf_counter() - start) / iterations
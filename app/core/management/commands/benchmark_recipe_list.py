@@ -0,0 +1,112 @@
+import itertools
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.bulk import bulk_insert
+from core.models import ChangeCounter, Recipe, UserCounters
+from core.sharding import pinned_to_user, shard_for_user
+from recipe.popularity import add_views
+from recipe.views import RecipeViewSet
+
+CASES = [
+    ("newest first", {}),
+    ("cheapest first", {"ordering": "price"}),
+    ("dearest first", {"ordering": "-price"}),
+    ("quickest first", {"ordering": "time_in_minutes"}),
+    ("by title", {"ordering": "title"}),
+    ("most viewed", {"ordering": "-view_count"}),
+    ("trending", {"ordering": "-popularity"}),
+    ("under 10, cheapest", {"max_price": "10", "ordering": "price"}),
+    ("under 30 min, quickest", {"max_time": "30", "ordering": "time_in_minutes"}),
+    ("page 200, cheapest", {"ordering": "price", "offset": 10000}),
+]
+
+
+class Command(BaseCommand):
+    help = "Time recipe list filters and orderings for one user with many recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email", default="benchmark-recipes@example.com")
+        parser.add_argument(
+            "--recipes", type=int, default=1000000, help="Recipes to give the user first"
+        )
+        parser.add_argument("--limit", type=int, default=50)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--explain", action="store_true", help="Print each query plan")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user = User.objects.filter(email=options["email"]).first()
+        if user is None:
+            user = User.objects.create_user(options["email"], "benchmark")
+        missing = options["recipes"] - Recipe.objects.filter(user=user).count()
+        if missing > 0:
+            self.seed(user, missing)
+
+        # Pagination builds absolute links, so the host has to be an allowed one.
+        factory = APIRequestFactory(SERVER_NAME="localhost")
+        view = RecipeViewSet.as_view({"get": "list"})
+        for label, params in CASES:
+            params = {"limit": options["limit"], **params}
+            start = time.perf_counter()
+            for _ in range(options["iterations"]):
+                request = factory.get("/", params)
+                force_authenticate(request, user)
+                response = view(request)
+                response.render()
+            elapsed = (time.perf_counter() - start) / options["iterations"]
+            self.stdout.write(f"{label:<24} {elapsed * 1000:8.1f} ms/request")
+            if options["explain"]:
+                self.stdout.write(self.explain(factory, user, params))
+
+    def explain(self, factory, user, params):
+        viewset = RecipeViewSet(action="list", request=Request(factory.get("/", params)))
+        viewset.request.user = user
+        with pinned_to_user(user.pk):
+            return viewset.get_queryset()[: params["limit"]].explain()
+
+    def seed(self, user, count):
+        self.stdout.write(f"Adding {count} recipes for {user.email}...")
+        using = shard_for_user(user.pk)
+        rng = random.Random(0)
+        now = timezone.now()
+        with transaction.atomic(using=using):
+            last = ChangeCounter.objects.db_manager(using).advance(user.pk, count)
+            UserCounters.objects.db_manager(using).add(user.pk, recipes=count)
+            rows = (
+                (
+                    user.pk,
+                    f"Recipe {rng.randrange(count)}",
+                    rng.randint(5, 180),
+                    f"{rng.randint(100, 5000) / 100:.2f}",
+                    "",
+                    now,
+                    seq,
+                    views,
+                    add_views(0, views, now - timedelta(seconds=rng.randrange(30 * 24 * 3600))),
+                )
+                for seq, views in (
+                    (seq, int(rng.paretovariate(1.2))) for seq in range(last - count + 1, last + 1)
+                )
+            )
+            fields = (
+                "user_id",
+                "title",
+                "time_in_minutes",
+                "price",
+                "link",
+                "updated_at",
+                "change_seq",
+                "view_count",
+                "popularity",
+            )
+            for batch in iter(lambda: list(itertools.islice(rows, 10000)), []):
+                bulk_insert(Recipe, fields, batch, using=using)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete Idempotency-Key records older than IDEMPOTENCY_KEY_TTL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        removed = 0
+        while True:
+            # Short deletes, so a large backlog doesn't hold long locks.
+            batch = list(
+                IdempotencyKey.objects.expired().values_list("pk", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not batch:
+                break
+            removed += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} expired idempotency keys"))
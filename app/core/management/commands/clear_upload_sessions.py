@@ -0,0 +1,65 @@
+import os
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import ImageUploadSession
+
+
+class Command(BaseCommand):
+    help = "Delete resumable upload sessions that have been idle for too long"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-age",
+            type=int,
+            default=None,
+            help="Idle seconds before a session is stale (default UPLOAD_SESSION_MAX_AGE)",
+        )
+
+    def handle(self, *args, **options):
+        max_age = options["max_age"]
+        if max_age is None:
+            max_age = settings.UPLOAD_SESSION_MAX_AGE
+        cutoff = timezone.now() - timedelta(seconds=max_age)
+
+        removed = 0
+        for shard in settings.DATABASE_SHARDS:
+            stale = ImageUploadSession.objects.using(shard).filter(updated_at__lt=cutoff)
+            for session in stale.iterator():
+                path = session.path
+                session.delete()
+                if os.path.exists(path):
+                    os.remove(path)
+                removed += 1
+
+        orphans = self.remove_orphans(max_age)
+        self.stdout.write(
+            self.style.SUCCESS(f"Removed {removed} stale sessions and {orphans} orphaned files")
+        )
+
+    def remove_orphans(self, max_age):
+        """Remove part files whose session row is gone, e.g. after a recipe was deleted"""
+        if not os.path.isdir(settings.UPLOAD_SESSION_ROOT):
+            return 0
+        orphans = 0
+        oldest = time.time() - max_age
+        with os.scandir(settings.UPLOAD_SESSION_ROOT) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".part") or entry.stat().st_mtime > oldest:
+                    continue
+                try:
+                    session_id = uuid.UUID(entry.name[: -len(".part")])
+                except ValueError:
+                    continue
+                if not any(
+                    ImageUploadSession.objects.using(shard).filter(pk=session_id).exists()
+                    for shard in settings.DATABASE_SHARDS
+                ):
+                    os.remove(entry.path)
+                    orphans += 1
+        return orphans
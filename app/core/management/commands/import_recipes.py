@@ -0,0 +1,46 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import ImportJob
+from core.sharding import pinned_to_user
+from recipe.importer import PARSERS, RecipeImporter
+
+
+class Command(BaseCommand):
+    help = "Import a user's recipes from a JSON array or a CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("email")
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=sorted(PARSERS), help="Default from the extension")
+        parser.add_argument("--chunk-size", type=int)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options["email"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}")
+        path = options["path"]
+        format = options["format"] or os.path.splitext(path)[1].lstrip(".").lower()
+        if format not in PARSERS:
+            raise CommandError("Give the file format with --format")
+
+        with pinned_to_user(user.pk):
+            job = ImportJob.objects.create(
+                user=user, filename=os.path.basename(path), format=format
+            )
+        importer = RecipeImporter(job, options["chunk_size"], on_chunk=self.report)
+        with open(path, "rb") as stream:
+            importer.run(PARSERS[format](stream))
+
+        for error in importer.errors:
+            self.stderr.write(f"Row {error['line']}: {error['errors']}")
+        message = f"Imported {job.created} recipes, {job.failed} rows failed"
+        if job.state == ImportJob.FAILED:
+            raise CommandError(f"{message}; the file could not be read to the end")
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def report(self, job):
+        self.stdout.write(f"{job.processed} rows processed, {job.created} recipes created")
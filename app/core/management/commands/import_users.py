@@ -0,0 +1,45 @@
+import csv
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from user.importer import UserImporter
+
+
+class Command(BaseCommand):
+    help = "Create users from a CSV file with email, password and name columns"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.USER_IMPORT_WORKERS,
+            help="Password hashing processes (default one per CPU)",
+        )
+        parser.add_argument(
+            "--tokens", metavar="PATH", help="Issue API tokens and write email,token rows here"
+        )
+
+    def handle(self, *args, **options):
+        importer = UserImporter(
+            batch_size=options["batch_size"],
+            workers=options["workers"],
+            issue_tokens=bool(options["tokens"]),
+        )
+        with open(options["path"], newline="") as f:
+            result = importer.run(csv.DictReader(f))
+
+        for failure in result.failures:
+            # Rows are numbered from 1 after the header line.
+            self.stderr.write(f"Line {failure['line'] + 1}: {failure['email']}: {failure['error']}")
+        if options["tokens"]:
+            with open(options["tokens"], "w", newline="") as f:
+                csv.writer(f).writerows(sorted(result.tokens.items()))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {len(result.created)} users, {len(result.failures)} rows failed"
+            )
+        )
@@ -0,0 +1,125 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import (
+    ChangeCounter,
+    ImageUploadSession,
+    ImportJob,
+    Ingredient,
+    Recipe,
+    ShardAssignment,
+    Tag,
+    Tombstone,
+    User,
+    UserCounters,
+)
+from core.sharding import PRIMARY, copy_user, forget_assignment, get_assignment
+
+
+def user_querysets(user_id, shard):
+    """The user's rows on ``shard``, parents before the rows pointing at them"""
+    return [
+        Tag.objects.using(shard).filter(user_id=user_id),
+        Ingredient.objects.using(shard).filter(user_id=user_id),
+        Recipe.objects.using(shard).filter(user_id=user_id),
+        Recipe.tags.through.objects.using(shard).filter(recipe__user_id=user_id),
+        Recipe.ingredients.through.objects.using(shard).filter(recipe__user_id=user_id),
+        ImageUploadSession.objects.using(shard).filter(user_id=user_id),
+        ChangeCounter.objects.using(shard).filter(user_id=user_id),
+        Tombstone.objects.using(shard).filter(user_id=user_id),
+        ImportJob.objects.using(shard).filter(user_id=user_id),
+        UserCounters.objects.using(shard).filter(user_id=user_id),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Move a user's recipes, tags and ingredients to another shard"
+
+    def add_arguments(self, parser):
+        parser.add_argument("email")
+        parser.add_argument("shard")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--wait",
+            type=float,
+            default=None,
+            help="Seconds to let cached assignments expire (default SHARD_DIRECTORY_CACHE_SECONDS)",
+        )
+
+    def handle(self, *args, **options):
+        target = options["shard"]
+        if target not in settings.DATABASE_SHARDS:
+            raise CommandError(f"Unknown shard {target!r}")
+        user = User.objects.filter(email=options["email"]).first()
+        if user is None:
+            raise CommandError(f"No user {options['email']!r}")
+
+        source = get_assignment(user.pk)[0]
+        if source == target:
+            self.stdout.write(f"{user.email} is already on {target}")
+            return
+
+        assignment = ShardAssignment.objects.get(user=user)
+        self.set_state(assignment, ShardAssignment.MOVING)
+        self.wait_for_caches(options["wait"])
+
+        try:
+            copied = self.copy(user, source, target, options["batch_size"])
+        except Exception:
+            self.set_state(assignment, ShardAssignment.ACTIVE)
+            raise
+
+        assignment.shard = target
+        self.set_state(assignment, ShardAssignment.ACTIVE)
+        # Other workers may still read the source shard until they see the new entry.
+        self.wait_for_caches(options["wait"])
+        self.delete_source(user, source)
+        self.stdout.write(self.style.SUCCESS(f"Moved {copied} rows of {user.email} to {target}"))
+
+    def wait_for_caches(self, wait):
+        """Let the assignments other processes have cached expire"""
+        time.sleep(settings.SHARD_DIRECTORY_CACHE_SECONDS if wait is None else wait)
+
+    def set_state(self, assignment, state):
+        assignment.state = state
+        assignment.save(update_fields=("shard", "state"))
+        forget_assignment(assignment.user_id)
+
+    def copy(self, user, source, target, batch_size):
+        copy_user(user.pk, target)
+        copied = 0
+        with transaction.atomic(using=target):
+            for queryset in user_querysets(user.pk, source):
+                model = queryset.model
+                last_pk = None
+                while True:
+                    batch = queryset.order_by("pk")
+                    if last_pk is not None:
+                        batch = batch.filter(pk__gt=last_pk)
+                    rows = list(batch[:batch_size])
+                    if not rows:
+                        break
+                    model.objects.using(target).bulk_create(rows)
+                    copied += len(rows)
+                    last_pk = rows[-1].pk
+
+            for before, after in zip(
+                user_querysets(user.pk, source), user_querysets(user.pk, target)
+            ):
+                if before.count() != after.count():
+                    raise CommandError(f"Row counts of {before.model.__name__} differ after copy")
+        return copied
+
+    def delete_source(self, user, source):
+        # Raw deletes send no signals: the rows live on in the target, so
+        # the move must not record tombstones, publish change events or
+        # queue images for deletion. Children go before their parents.
+        querysets = user_querysets(user.pk, source)
+        if source != PRIMARY:
+            querysets.append(User.objects.using(source).filter(pk=user.pk))
+        with transaction.atomic(using=source):
+            for queryset in reversed(querysets):
+                queryset._raw_delete(source)
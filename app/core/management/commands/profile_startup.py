@@ -0,0 +1,133 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+# Run in a fresh interpreter: loads the WSGI application, then times two requests.
+PROBE = """
+import io, json, os, sys, time
+
+start = time.perf_counter()
+from app.wsgi import application
+loaded = time.perf_counter() - start
+
+path, _, query = os.environ["STARTUP_PROBE_PATH"].partition("?")
+token = os.environ.get("STARTUP_PROBE_TOKEN")
+
+
+def call():
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": query,
+        "SERVER_NAME": "localhost", "SERVER_PORT": "80", "HTTP_ACCEPT": "application/json",
+        "wsgi.input": io.BytesIO(), "wsgi.url_scheme": "http", "wsgi.errors": sys.stderr,
+    }
+    if token:
+        environ["HTTP_AUTHORIZATION"] = "Token " + token
+    statuses = []
+    start = time.perf_counter()
+    response = application(environ, lambda status, headers: statuses.append(status))
+    b"".join(response)
+    response.close()
+    return time.perf_counter() - start, statuses[0]
+
+
+first, status = call()
+second, _ = call()
+print(json.dumps({"load": loaded, "first": first, "second": second, "status": status}))
+"""
+
+
+def parse_importtime(stderr):
+    """``(module, self seconds, cumulative seconds)`` from ``python -X importtime`` output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        if own.strip().isdigit():
+            rows.append((name.strip(), int(own) / 1e6, int(cumulative) / 1e6))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Measure cold start, warm-up and first-request latency of the WSGI application"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/api/recipe/recipes/?limit=10")
+        parser.add_argument("--email", default="benchmark-startup@example.com")
+        parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+        parser.add_argument("--check", action="store_true", help="Fail when a target is missed")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user = User.objects.filter(email=options["email"]).first()
+        if user is None:
+            user = User.objects.create_user(options["email"], "benchmark")
+        token, _ = Token.objects.get_or_create(user=user)
+
+        runs = {}
+        for label, warmup in (("cold", "0"), ("warmed up", "1")):
+            runs[label], imports = self.probe(options["path"], token.key, warmup)
+            result = runs[label]
+            self.stdout.write(
+                f"{label:<10} load {result['load'] * 1000:7.0f} ms  "
+                f"first request {result['first'] * 1000:6.1f} ms  "
+                f"second {result['second'] * 1000:6.1f} ms  ({result['status']})"
+            )
+
+        self.report_imports(imports, options["top"])
+        missed = self.check_targets(runs["warmed up"])
+        if missed and options["check"]:
+            raise CommandError(f"Missed startup targets: {', '.join(missed)}")
+
+    def probe(self, path, token, warmup):
+        env = dict(
+            os.environ,
+            DJANGO_WSGI_WARMUP=warmup,
+            # Nothing forks the probe, so it may keep its warmed connections.
+            DJANGO_WARMUP_DATABASES=warmup,
+            STARTUP_PROBE_PATH=path,
+            STARTUP_PROBE_TOKEN=token,
+        )
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode != 0:
+            raise CommandError(f"Startup probe failed:\n{process.stderr[-2000:]}")
+        return json.loads(process.stdout.splitlines()[-1]), parse_importtime(process.stderr)
+
+    def report_imports(self, imports, top):
+        packages = {}
+        for name, own, _ in imports:
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0) + own
+        self.stdout.write("\nImport and module initialization time by package:")
+        for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"  {package:<32} {seconds * 1000:8.1f} ms")
+        self.stdout.write(f"\nSlowest {top} modules (self / cumulative):")
+        for name, own, cumulative in sorted(imports, key=lambda row: -row[1])[:top]:
+            self.stdout.write(f"  {name:<48} {own * 1000:7.1f} / {cumulative * 1000:7.1f} ms")
+
+    def check_targets(self, result):
+        """Compare a warmed-up run to STARTUP_TARGETS, returning the missed ones"""
+        measured = {"cold_start": result["load"], "first_request": result["first"]}
+        missed = []
+        self.stdout.write("\nTargets:")
+        for name, target in settings.STARTUP_TARGETS.items():
+            ok = measured[name] <= target
+            if not ok:
+                missed.append(name)
+            self.stdout.write(
+                f"  {name:<14} {measured[name]:.3f}s (target {target:.3f}s) "
+                + (self.style.SUCCESS("ok") if ok else self.style.ERROR("missed"))
+            )
+        return missed
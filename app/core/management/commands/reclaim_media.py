@@ -0,0 +1,147 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import ImageBlob, PendingImageDeletion, Recipe
+
+IMAGE_DIR = "uploads/recipe"
+
+
+def scan_files(root, prefix=""):
+    """Yield ``(name, mtime)`` for every file under ``root`` without listing it whole"""
+    with os.scandir(root) as entries:
+        for entry in entries:
+            name = f"{prefix}{entry.name}"
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_files(entry.path, f"{name}/")
+            elif entry.is_file(follow_symlinks=False):
+                yield name, entry.stat().st_mtime
+
+
+def referenced_names(names):
+    """The subset of ``names`` used by a recipe on any shard"""
+    referenced = set()
+    for shard in settings.DATABASE_SHARDS:
+        recipes = Recipe.objects.using(shard).filter(image__in=names)
+        referenced.update(recipes.values_list("image", flat=True))
+    return referenced
+
+
+def count_references(name):
+    return sum(
+        Recipe.objects.using(shard).filter(image=name).count() for shard in settings.DATABASE_SHARDS
+    )
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Delete recipe images that no recipe references any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would go")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--rate", type=float, default=50, help="Max deletions per second, 0 for no limit"
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=3600,
+            help="Seconds a file must be untouched before it is reclaimed",
+        )
+        parser.add_argument("--queue-only", action="store_true", help="Skip the full storage scan")
+
+    def handle(self, *args, **options):
+        self.storage = Recipe._meta.get_field("image").storage
+        self.dry_run = options["dry_run"]
+        self.interval = 1 / options["rate"] if options["rate"] else 0
+        self.next_delete_at = 0
+        self.cutoff = timezone.now() - timedelta(seconds=options["min_age"])
+        self.deleted = 0
+        batch_size = options["batch_size"]
+
+        self.process_queue(batch_size)
+        if not options["queue_only"]:
+            self.scan_storage(batch_size)
+
+        verb = "Would delete" if self.dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {self.deleted} files"))
+
+    def process_queue(self, batch_size):
+        last_id = 0
+        while True:
+            batch = list(
+                PendingImageDeletion.objects.filter(id__gt=last_id).order_by("id")[:batch_size]
+            )
+            if not batch:
+                return
+            last_id = batch[-1].id
+            handled = {name for name in {p.name for p in batch} if self.release(name)}
+            if not self.dry_run:
+                # Images still too new to judge stay queued for the next run.
+                done = [p.id for p in batch if p.name in handled]
+                PendingImageDeletion.objects.filter(id__in=done).delete()
+
+    def scan_storage(self, batch_size):
+        root = self.storage.path(IMAGE_DIR)
+        if not os.path.isdir(root):
+            return
+        oldest = self.cutoff.timestamp()
+        files = (
+            (f"{IMAGE_DIR}/{name}", mtime) for name, mtime in scan_files(root) if mtime < oldest
+        )
+        for batch in batched(files, batch_size):
+            names = [name for name, _ in batch]
+            referenced = referenced_names(names)
+            for name in names:
+                if name not in referenced:
+                    self.release(name)
+
+    def release(self, name):
+        """
+        Delete ``name`` if nothing references it, or repair its reference
+        count. Returns False when it was used too recently to decide.
+        """
+        with transaction.atomic():
+            blob = ImageBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.last_used_at > self.cutoff:
+                # Possibly attached to a recipe that hasn't been saved yet.
+                return False
+            references = count_references(name)
+            if references:
+                if blob is not None and blob.ref_count != references and not self.dry_run:
+                    ImageBlob.objects.filter(pk=blob.pk).update(ref_count=references)
+                return True
+            if not self.storage.exists(name) and blob is None:
+                return True
+
+            self.deleted += 1
+            if self.dry_run:
+                self.stdout.write(f"Would delete {name}")
+                return True
+            self.throttle()
+            if blob is not None:
+                blob.delete()
+            self.storage.delete(name)
+            return True
+
+    def throttle(self):
+        now = time.monotonic()
+        if now < self.next_delete_at:
+            time.sleep(self.next_delete_at - now)
+        self.next_delete_at = max(now, self.next_delete_at) + self.interval
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Ingredient, Tag, UserCounters
+from core.sharding import shard_for_user
+
+
+class Command(BaseCommand):
+    help = "Recount users' recipes, tags and ingredients and each tag's and ingredient's recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email", help="Only this user (default everyone)")
+
+    def handle(self, *args, **options):
+        if options["email"]:
+            try:
+                user = get_user_model().objects.get(email=options["email"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['email']}")
+            targets = [(shard_for_user(user.pk), [user.pk])]
+        else:
+            targets = [(shard, None) for shard in settings.DATABASE_SHARDS]
+
+        fixed = 0
+        for shard, user_ids in targets:
+            filters = {} if user_ids is None else {"user_id__in": user_ids}
+            with transaction.atomic(using=shard):
+                fixed += UserCounters.objects.db_manager(shard).reconcile(user_ids)
+                for model in (Tag, Ingredient):
+                    model.objects.db_manager(shard).recount(**filters)
+        self.stdout.write(self.style.SUCCESS(f"Fixed the counters of {fixed} users"))
@@ -0,0 +1,210 @@
+import collections
+import itertools
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.bulk import bulk_insert, reset_sequences
+from core.models import (
+    CanonicalIngredient,
+    ChangeCounter,
+    Ingredient,
+    Recipe,
+    ShardAssignment,
+    Tag,
+    User,
+    UserCounters,
+    normalize_name,
+)
+from core.sharding import PRIMARY, sharding_enabled
+
+ADJECTIVES = ["Spicy", "Creamy", "Crispy", "Smoky", "Fresh", "Roasted", "Quick", "Classic"]
+DISHES = ["Soup", "Curry", "Salad", "Stew", "Pasta", "Tacos", "Risotto", "Pie", "Noodles"]
+TAG_WORDS = ["Vegan", "Dessert", "Breakfast", "Gluten free", "Dinner", "Snack", "Party"]
+INGREDIENT_WORDS = ["Salt", "Onion", "Garlic", "Tomato", "Rice", "Butter", "Egg", "Chili"]
+
+
+def zipf_cum_weights(count, exponent):
+    """Cumulative weights so that rank ``r`` is picked with odds ``1 / r**exponent``"""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def next_id(model):
+    return (model.objects.aggregate(Max("id"))["id__max"] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = "Generate a reproducible synthetic dataset of users, tags, ingredients and recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=100000)
+        parser.add_argument("--tags-per-user", type=int, default=20)
+        parser.add_argument("--ingredients-per-user", type=int, default=50)
+        parser.add_argument("--max-tags-per-recipe", type=int, default=4)
+        parser.add_argument("--max-ingredients-per-recipe", type=int, default=8)
+        parser.add_argument(
+            "--user-skew",
+            type=float,
+            default=1.1,
+            help="Zipf exponent of recipes per user; higher makes a few power users",
+        )
+        parser.add_argument(
+            "--popularity-skew",
+            type=float,
+            default=1.0,
+            help="Zipf exponent of how often each tag and ingredient is used",
+        )
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--password", default="password", help="Password of every user")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+        self.change_seqs = {}
+        self.first_ids = {}
+        self.inserted = 0
+        start = time.perf_counter()
+
+        with transaction.atomic():
+            users = self.seed_users(options["users"], options["password"])
+            tags = self.seed_names(Tag, users, options["tags_per_user"], TAG_WORDS)
+            ingredients = self.seed_names(
+                Ingredient, users, options["ingredients_per_user"], INGREDIENT_WORDS
+            )
+            owners = self.seed_recipes(users, tags, ingredients, options)
+            self.insert(ChangeCounter, ("user_id", "value"), iter(self.change_seqs.items()))
+            recipes = collections.Counter(owners)
+            self.insert(
+                UserCounters,
+                ("user_id", "recipes", "tags", "ingredients"),
+                ((pk, recipes[pk], len(tags[pk]), len(ingredients[pk])) for pk in users),
+            )
+            for model, first in self.first_ids.items():
+                model.objects.recount(pk__gte=first)
+            reset_sequences(
+                [User, Tag, Ingredient, Recipe, Recipe.tags.through, Recipe.ingredients.through]
+            )
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Inserted {self.inserted} rows in {elapsed:.1f}s "
+                f"({self.inserted / elapsed:,.0f} rows/s)"
+            )
+        )
+
+    def insert(self, model, fields, rows):
+        for batch in iter(lambda: list(itertools.islice(rows, self.batch_size)), []):
+            self.inserted += bulk_insert(model, fields, batch)
+
+    def next_seq(self, user_id):
+        self.change_seqs[user_id] = self.change_seqs.get(user_id, 0) + 1
+        return self.change_seqs[user_id]
+
+    def seed_users(self, count, password):
+        first = next_id(User)
+        ids = list(range(first, first + count))
+        # One hash for everyone; hashing per user would dominate the run time.
+        password = make_password(password)
+        fields = ("id", "email", "name", "password", "is_active", "is_staff", "is_superuser")
+        rows = (
+            (pk, f"seed-{pk}@example.com", f"Seed User {pk}", password, True, False, False)
+            for pk in ids
+        )
+        self.insert(User, fields, rows)
+        if sharding_enabled():
+            self.insert(ShardAssignment, ("user_id", "shard"), ((pk, PRIMARY) for pk in ids))
+        return ids
+
+    def seed_names(self, model, users, per_user, words):
+        """Give every user ``per_user`` rows, returning their ids by user"""
+        next_pk = self.first_ids[model] = next_id(model)
+        ids = {}
+        for user_id in users:
+            ids[user_id] = list(range(next_pk, next_pk + per_user))
+            next_pk += per_user
+
+        names = [
+            f"{words[index % len(words)]} {index // len(words) + 1}" for index in range(per_user)
+        ]
+        fields = ("id", "user_id", "name", "name_key", "recipe_count", "updated_at", "change_seq")
+        # Every user gets the same names, so they share one set of catalog entries.
+        canonical = {}
+        if model is Ingredient:
+            canonical = CanonicalIngredient.objects.ids_for(names)
+            fields += ("canonical_id",)
+
+        def rows():
+            for user_id, pks in ids.items():
+                for name, pk in zip(names, pks):
+                    key = normalize_name(name)
+                    row = (pk, user_id, name, key, 0, self.now, self.next_seq(user_id))
+                    yield row + ((canonical[key],) if canonical else ())
+
+        self.insert(model, fields, rows())
+        return ids
+
+    def seed_recipes(self, users, tags, ingredients, options):
+        count = options["recipes"]
+        owners = self.rng.choices(
+            users, cum_weights=zipf_cum_weights(len(users), options["user_skew"]), k=count
+        )
+        popularity = options["popularity_skew"]
+        tag_weights = zipf_cum_weights(options["tags_per_user"], popularity)
+        ingredient_weights = zipf_cum_weights(options["ingredients_per_user"], popularity)
+        first = next_id(Recipe)
+        recipe_tags, recipe_ingredients = [], []
+
+        def recipes():
+            for pk, user_id in enumerate(owners, start=first):
+                for related, weights, limit, links in (
+                    (tags, tag_weights, options["max_tags_per_recipe"], recipe_tags),
+                    (
+                        ingredients,
+                        ingredient_weights,
+                        options["max_ingredients_per_recipe"],
+                        recipe_ingredients,
+                    ),
+                ):
+                    if related[user_id]:
+                        k = self.rng.randint(0, limit)
+                        chosen = self.rng.choices(related[user_id], cum_weights=weights, k=k)
+                        links.extend((pk, related_pk) for related_pk in sorted(set(chosen)))
+                title = f"{self.rng.choice(ADJECTIVES)} {self.rng.choice(DISHES)}"
+                minutes = self.rng.randint(5, 180)
+                price = f"{self.rng.randint(100, 5000) / 100:.2f}"
+                seq = self.next_seq(user_id)
+                yield pk, user_id, title, minutes, price, "", self.now, seq, 0, 0
+
+        fields = (
+            "id",
+            "user_id",
+            "title",
+            "time_in_minutes",
+            "price",
+            "link",
+            "updated_at",
+            "change_seq",
+            "view_count",
+            "popularity",
+        )
+        rows = recipes()
+        for batch in iter(lambda: list(itertools.islice(rows, self.batch_size)), []):
+            self.insert(Recipe, fields, iter(batch))
+            self.insert_links(Recipe.tags.through, "tag_id", recipe_tags)
+            self.insert_links(Recipe.ingredients.through, "ingredient_id", recipe_ingredients)
+        return owners
+
+    def insert_links(self, through, column, links):
+        first = next_id(through)
+        rows = ((pk, recipe_id, other_id) for pk, (recipe_id, other_id) in enumerate(links, first))
+        self.insert(through, ("id", "recipe_id", column), rows)
+        links.clear()
@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import get_resolver
+
+from core.caches import is_shared
+from core.middleware import shed_count_key
+
+REASONS = ("queue", "in_flight", "deadline")
+
+
+def view_names(resolver, prefix=""):
+    for name in resolver.reverse_dict.keys():
+        if isinstance(name, str):
+            yield prefix + name
+    for namespace, (_, sub_resolver) in resolver.namespace_dict.items():
+        yield from view_names(sub_resolver, f"{prefix}{namespace}:")
+
+
+class Command(BaseCommand):
+    help = "Show how many requests each view turned away for load or time budget"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counts afterwards")
+
+    def handle(self, *args, **options):
+        if not is_shared():
+            # This process would only ever see its own, empty, counts.
+            raise CommandError(
+                "Shed counts need a cache shared between processes, set MEMCACHED_HOSTS"
+            )
+        keys = {
+            shed_count_key(name, reason): (name, reason)
+            for name in view_names(get_resolver())
+            for reason in REASONS
+        }
+        counts = {}
+        for key, count in cache.get_many(list(keys)).items():
+            name, reason = keys[key]
+            counts.setdefault(name, dict.fromkeys(REASONS, 0))[reason] = count
+
+        if not counts:
+            self.stdout.write("No requests were shed")
+        else:
+            width = max(len(name) for name in counts)
+            self.stdout.write(f"{'view':{width}}  " + "  ".join(f"{r:>9}" for r in REASONS))
+            for name in sorted(counts):
+                row = "  ".join(f"{counts[name][r]:9d}" for r in REASONS)
+                self.stdout.write(f"{name:{width}}  {row}")
+        if options["reset"]:
+            cache.delete_many(list(keys))
@@ -0,0 +1,164 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from core.models import Recipe
+from core.sharding import ShardedViewMixin
+
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+HASHED_NAME_RE = re.compile(r"^(?P<digest>[0-9a-f]{64})\.[A-Za-z0-9]+$")
+RANGE_RE = re.compile(r"^bytes=(?P<start>\d*)-(?P<end>\d*)$")
+
+
+def parse_range(header, size):
+    """
+    Return ``(start, end)`` (inclusive) for a single byte range, ``None`` when
+    the header should be ignored and ``False`` when it can't be satisfied.
+    Multiple ranges are ignored and answered with the full file.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.group("start"), match.group("end")
+    if not start and not end:
+        return None
+    if not start:
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_passes(request, etag, last_modified):
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', "W/")):
+        return if_range == etag
+    if_range_date = parse_http_date_safe(if_range)
+    return if_range_date is not None and int(last_modified) <= if_range_date
+
+
+def _read_range(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _accel_response(path, name, content_type):
+    # The front-end server does the transfer, ranges included.
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_ACCEL == "x-accel-redirect":
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + name
+    else:
+        response["X-Sendfile"] = path
+    return response
+
+
+def _local_response(request, path, size, etag, last_modified, content_type):
+    byte_range = None
+    if "HTTP_RANGE" in request.META and _if_range_passes(request, etag, last_modified):
+        byte_range = parse_range(request.META["HTTP_RANGE"], size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if request.method == "HEAD":
+        response = HttpResponse(content_type=content_type)
+        response["Content-Length"] = size
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(path, start, end), status=206, content_type=content_type
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+    else:
+        # Servers with wsgi.file_wrapper send this with sendfile().
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+        response.block_size = CHUNK_SIZE
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def file_response(request, path, name):
+    """
+    Build the response for the media file at ``path`` (its storage ``name``).
+
+    Handles conditional requests and single byte ranges, marks content-hashed
+    files as immutable and, depending on ``MEDIA_ACCEL``, hands the transfer
+    to the front-end server instead of streaming it from Python.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404
+    size, last_modified = stat.st_size, stat.st_mtime
+
+    hashed = HASHED_NAME_RE.match(os.path.basename(name))
+    if hashed:
+        etag = quote_etag(hashed.group("digest"))
+        cache_control = f"private, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        etag = quote_etag(f"{int(last_modified):x}-{size:x}")
+        cache_control = "private, no-cache"
+
+    base = HttpResponse()
+    base["ETag"] = etag
+    base["Last-Modified"] = http_date(last_modified)
+    base["Cache-Control"] = cache_control
+    conditional = get_conditional_response(request, etag, last_modified, base)
+    if conditional is not base:
+        return conditional
+
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if getattr(settings, "MEDIA_ACCEL", None):
+        response = _accel_response(path, name, content_type)
+    else:
+        response = _local_response(request, path, size, etag, last_modified, content_type)
+
+    for header in ("ETag", "Last-Modified", "Cache-Control"):
+        response[header] = base[header]
+    return response
+
+
+class MediaView(ShardedViewMixin, APIView):
+    """Serve recipe images to the users who own them"""
+
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def perform_content_negotiation(self, request, force=False):
+        # Image clients send Accept: image/*; errors still go out as JSON.
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, name):
+        user = request.user
+        if not user.is_staff and not Recipe.objects.filter(user=user, image=name).exists():
+            raise Http404
+
+        storage = Recipe._meta.get_field("image").storage
+        return file_response(request, storage.path(name), name)
@@ -0,0 +1,227 @@
+import hashlib
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, OperationalError, connections
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core.db_routers import replica_reads, wrote_to_primary
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe requests read from the replicas.
+
+    After a client writes, its reads stay on the primary for
+    REPLICA_STICKY_SECONDS so it never sees its own changes missing. Clients
+    are told apart by their Authorization header or session cookie, and the
+    marker lives in the default cache, which core.caches requires to be shared
+    between workers when there are replicas.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _client_key(self, request):
+        credentials = request.META.get("HTTP_AUTHORIZATION") or request.COOKIES.get(
+            settings.SESSION_COOKIE_NAME
+        )
+        if not credentials:
+            return None
+        return "replica-pin:" + hashlib.sha1(credentials.encode()).hexdigest()
+
+    def __call__(self, request):
+        key = self._client_key(request)
+        allowed = (
+            bool(settings.DATABASE_REPLICAS)
+            and request.method in SAFE_METHODS
+            and not (key and cache.get(key))
+        )
+        with replica_reads(allowed):
+            response = self.get_response(request)
+            wrote = wrote_to_primary()
+
+        if key and (wrote or request.method not in SAFE_METHODS):
+            cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+
+class RequestDeadlineExceeded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The server took too long to answer, try again shortly."
+    default_code = "deadline_exceeded"
+
+    def __init__(self):
+        super().__init__()
+        # DRF sends this as Retry-After.
+        self.wait = settings.LOAD_SHED_RETRY_AFTER
+
+
+def shed_count_key(view_name, reason):
+    return f"load-shed:{reason}:{view_name}"
+
+
+def count_shed(view_name, reason):
+    """Count a request turned away, in the default cache shared by the workers"""
+    key = shed_count_key(view_name, reason)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between the two calls.
+        cache.add(key, 1, None)
+
+
+def queue_seconds(request):
+    """
+    Time since the proxy got the request, from an X-Request-Start header of
+    ``t=`` and seconds, milliseconds or microseconds since the epoch.
+    """
+    header = request.META.get("HTTP_X_REQUEST_START", "")
+    try:
+        start = float(header[2:] if header.startswith("t=") else header)
+    except ValueError:
+        return None
+    while start > 1e11:
+        start /= 1000
+    return max(time.time() - start, 0)
+
+
+class _Budget:
+    """Database execute wrapper ending the queries of a request at its deadline"""
+
+    def __init__(self):
+        self.view_name = None
+        self.deadline = None
+        self.timed = set()
+
+    def start(self, view_name, seconds):
+        self.view_name = view_name
+        self.deadline = time.monotonic() + seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.deadline is None:
+            return execute(sql, params, many, context)
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            count_shed(self.view_name, "deadline")
+            raise RequestDeadlineExceeded
+        connection = context["connection"]
+        if connection.vendor == "postgresql" and connection.alias not in self.timed:
+            # On the raw cursor, which doesn't come back through this wrapper.
+            context["cursor"].cursor.execute(
+                "SET statement_timeout = %s", [max(int(remaining * 1000), 1)]
+            )
+            self.timed.add(connection.alias)
+        return execute(sql, params, many, context)
+
+    def reset(self):
+        for alias in self.timed:
+            connection = connections[alias]
+            if connection.connection is None or connection.needs_rollback:
+                continue
+            try:
+                with connection.cursor() as cursor:
+                    # Back to the role's or database's default, not to no limit.
+                    cursor.execute("RESET statement_timeout")
+            except DatabaseError:
+                # Don't hand the timeout on to the next request.
+                connection.close()
+
+
+class _InFlight:
+    """Requests running in this process, shared by every middleware chain"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def enter(self, limit):
+        with self._lock:
+            if limit is not None and self.count >= limit:
+                return False
+            self.count += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.count -= 1
+
+
+in_flight = _InFlight()
+
+
+class RequestBudgetMiddleware:
+    """
+    Gives each view a time budget, REQUEST_BUDGETS by URL name or else
+    REQUEST_BUDGET_DEFAULT seconds. Postgres connections get a matching
+    statement timeout, and no query starts past the deadline; either way the
+    client gets a 503 with Retry-After.
+
+    Requests are shed up front, also with a 503, when they waited in the
+    proxy's queue longer than REQUEST_MAX_QUEUE_SECONDS (from X-Request-Start)
+    or REQUEST_MAX_IN_FLIGHT requests are already running in this process.
+    Views in REQUEST_BUDGET_EXEMPT, like event streams, are left alone.
+    Turned away requests are counted per view; see `manage.py shed_counts`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        budget = request.budget = _Budget()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(budget))
+            try:
+                return self.get_response(request)
+            finally:
+                if getattr(request, "_counted_in_flight", False):
+                    in_flight.leave()
+                budget.reset()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = request.resolver_match.view_name
+        if view_name in settings.REQUEST_BUDGET_EXEMPT:
+            return None
+
+        max_queue = settings.REQUEST_MAX_QUEUE_SECONDS
+        waited = queue_seconds(request) if max_queue is not None else None
+        if waited is not None and waited > max_queue:
+            return self.shed(view_name, "queue")
+        if not in_flight.enter(settings.REQUEST_MAX_IN_FLIGHT):
+            return self.shed(view_name, "in_flight")
+        request._counted_in_flight = True
+
+        seconds = settings.REQUEST_BUDGETS.get(view_name, settings.REQUEST_BUDGET_DEFAULT)
+        request.budget.start(view_name, seconds)
+        return None
+
+    def process_exception(self, request, exception):
+        budget = getattr(request, "budget", None)
+        if budget is None or budget.deadline is None:
+            return None
+        if isinstance(exception, OperationalError):
+            # Postgres' query_canceled, from the statement timeout.
+            if getattr(exception.__cause__, "pgcode", None) != "57014":
+                return None
+            count_shed(budget.view_name, "deadline")
+        elif not isinstance(exception, RequestDeadlineExceeded):
+            return None
+        return self.unavailable(RequestDeadlineExceeded.default_detail)
+
+    def shed(self, view_name, reason):
+        count_shed(view_name, reason)
+        return self.unavailable("The server is busy, try again shortly.")
+
+    def unavailable(self, detail):
+        response = JsonResponse({"detail": detail}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response["Retry-After"] = str(settings.LOAD_SHED_RETRY_AFTER)
+        return response
@@ -0,0 +1,39 @@
+# Generated by Django 2.1.15 on 2026-10-19 06:55
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_recipe_image"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageBlob",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("size", models.PositiveIntegerField()),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="image",
+            field=models.ImageField(
+                null=True,
+                storage=core.storage.ContentAddressedStorage(),
+                upload_to=core.models.recipe_image_file_path,
+            ),
+        ),
+    ]
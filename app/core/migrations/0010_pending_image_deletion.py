@@ -0,0 +1,29 @@
+# Generated by Django 2.1.15 on 2026-10-19 07:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_image_upload_session"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingImageDeletion",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("queued_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="imageblob", name="last_used_at", field=models.DateTimeField(auto_now=True),
+        ),
+    ]
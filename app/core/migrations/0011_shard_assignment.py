@@ -0,0 +1,38 @@
+# Generated by Django 2.1.15 on 2026-10-19 07:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_pending_image_deletion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShardAssignment",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("shard", models.CharField(max_length=64)),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[("active", "Active"), ("moving", "Moving")],
+                        default="active",
+                        max_length=16,
+                    ),
+                ),
+            ],
+        ),
+    ]
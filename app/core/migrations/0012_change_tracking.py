@@ -0,0 +1,112 @@
+# Generated by Django 2.1.15 on 2026-10-19 07:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def number_existing_rows(apps, schema_editor):
+    """Give rows from before change tracking their own change numbers, per user"""
+    alias = schema_editor.connection.alias
+    counters = {}
+    for name in ("Tag", "Ingredient", "Recipe"):
+        model = apps.get_model("core", name)
+        rows = model.objects.using(alias).order_by("user_id", "id").values_list("id", "user_id")
+        for pk, user_id in rows.iterator():
+            counters[user_id] = counters.get(user_id, 0) + 1
+            model.objects.using(alias).filter(pk=pk).update(change_seq=counters[user_id])
+    ChangeCounter = apps.get_model("core", "ChangeCounter")
+    ChangeCounter.objects.using(alias).bulk_create(
+        ChangeCounter(user_id=user_id, value=value) for user_id, value in counters.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_shard_assignment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeCounter",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Tombstone",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("model", models.CharField(max_length=32)),
+                ("object_id", models.IntegerField()),
+                ("change_seq", models.BigIntegerField()),
+                ("deleted_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="ingredient", name="change_seq", field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="ingredient", name="updated_at", field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="recipe", name="change_seq", field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="recipe", name="updated_at", field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="tag", name="change_seq", field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="tag", name="updated_at", field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="ingredient",
+            index=models.Index(
+                fields=["user", "change_seq"], name="core_ingred_user_id_dec1df_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["user", "change_seq"], name="core_recipe_user_id_9359a6_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tag",
+            index=models.Index(fields=["user", "change_seq"], name="core_tag_user_id_5e875a_idx"),
+        ),
+        migrations.AddField(
+            model_name="tombstone",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(
+                fields=["user", "change_seq"], name="core_tombst_user_id_8c11dd_idx"
+            ),
+        ),
+        migrations.RunPython(number_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Prefix searches in the admin ("^name") filter on UPPER(column::text) LIKE 'X%',
+# which only an expression index with text_pattern_ops can serve.
+SEARCH_INDEXES = [
+    ("core_user_email_upper_like", "core_user", "email"),
+    ("core_user_name_upper_like", "core_user", "name"),
+    ("core_tag_name_upper_like", "core_tag", "name"),
+    ("core_ingredient_name_upper_like", "core_ingredient", "name"),
+    ("core_recipe_title_upper_like", "core_recipe", "title"),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} (UPPER({column}::text) text_pattern_ops)"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _, _ in SEARCH_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_change_tracking"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
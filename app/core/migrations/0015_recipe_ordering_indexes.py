@@ -0,0 +1,31 @@
+# Generated by Django 2.1.15 on 2026-10-19 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_import_job"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["user", "id"], name="recipe_user_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["user", "price", "id"], name="recipe_user_price_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["user", "time_in_minutes", "id"], name="recipe_user_time_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["user", "title", "id"], name="recipe_user_title_idx"),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 2.1.15 on 2026-10-19 07:33
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Autocomplete filters on name_key LIKE 'prefix%'. Postgres needs the pattern
+# operator class for that unless the database collation is C; SQLite seeks
+# a plain index with the equivalent range.
+PREFIX_INDEXES = [
+    ("core_tag_user_name_key_like", "core_tag"),
+    ("core_ingredient_user_name_key_like", "core_ingredient"),
+]
+
+
+def fill_name_keys_and_counts(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    for name in ("Tag", "Ingredient"):
+        model = apps.get_model("core", name)
+        rows = model.objects.using(alias)
+        for pk, value in rows.values_list("id", "name").iterator():
+            rows.filter(pk=pk).update(name_key=value.strip().casefold())
+
+        column = name.lower()
+        through = model._meta.get_field("recipe").through
+        links = (
+            through.objects.filter(**{column: OuterRef("pk")})
+            .order_by()
+            .values(column)
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        rows.update(recipe_count=Coalesce(Subquery(links, output_field=models.IntegerField()), 0))
+
+
+def create_indexes(apps, schema_editor):
+    opclass = " varchar_pattern_ops" if schema_editor.connection.vendor == "postgresql" else ""
+    for name, table in PREFIX_INDEXES:
+        # recipe_count is included so ranking the matches needs no table reads.
+        schema_editor.execute(
+            f"CREATE INDEX {name} ON {table} (user_id, name_key{opclass}, recipe_count)"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    for name, _ in PREFIX_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_recipe_ordering_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ingredient",
+            name="name_key",
+            field=models.CharField(default="", editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="ingredient",
+            name="recipe_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="tag",
+            name="name_key",
+            field=models.CharField(default="", editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="tag",
+            name="recipe_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_name_keys_and_counts, migrations.RunPython.noop),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
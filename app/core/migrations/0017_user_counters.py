@@ -0,0 +1,48 @@
+# Generated by Django 2.1.15 on 2026-10-19 07:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def count_existing_rows(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    counts = {}
+    for field, name in (("recipes", "Recipe"), ("tags", "Tag"), ("ingredients", "Ingredient")):
+        rows = apps.get_model("core", name).objects.using(alias).order_by()
+        for user_id, count in rows.values_list("user").annotate(count=Count("pk")):
+            counts.setdefault(user_id, {})[field] = count
+    UserCounters = apps.get_model("core", "UserCounters")
+    UserCounters.objects.using(alias).bulk_create(
+        UserCounters(user_id=user_id, **fields) for user_id, fields in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_tag_ingredient_autocomplete"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserCounters",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("recipes", models.IntegerField(default=0)),
+                ("tags", models.IntegerField(default=0)),
+                ("ingredients", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.1.15 on 2026-10-19 07:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_user_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CanonicalIngredient",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("name_key", models.CharField(max_length=255, unique=True)),
+                ("name", models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="ingredient",
+            name="canonical",
+            field=models.ForeignKey(
+                db_constraint=False,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="ingredients",
+                to="core.CanonicalIngredient",
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.1.15 on 2026-10-19 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_canonical_ingredients"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="popularity",
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="view_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["user", "view_count", "id"], name="recipe_user_views_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["user", "popularity", "id"], name="recipe_user_popularity_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 2.1.15 on 2026-10-19 07:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0020_idempotency_keys"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "trigger",
+                    models.CharField(
+                        choices=[("header", "Header"), ("sample", "Sample")], max_length=16
+                    ),
+                ),
+                ("method", models.CharField(max_length=16)),
+                ("path", models.CharField(max_length=255)),
+                ("view_name", models.CharField(blank=True, max_length=255)),
+                ("status_code", models.PositiveSmallIntegerField()),
+                ("duration_ms", models.FloatField()),
+                ("query_count", models.PositiveIntegerField()),
+                ("query_ms", models.FloatField()),
+                ("queries", models.TextField(default="[]")),
+                ("serializers", models.TextField(default="{}")),
+                ("stats", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
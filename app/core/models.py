@@ -1,18 +1,24 @@
-import uuid
 import os
-from django.db import models
+import uuid
+from datetime import timedelta
+from django.db import IntegrityError, models, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 from django.conf import settings
+from django.utils import timezone
+
+from core.storage import ContentAddressedStorage
 
 
 def recipe_image_file_path(instance, filename):
+    """The storage replaces the file name with the content hash"""
     ext = filename.split(".")[-1]
-    filename = f"{uuid.uuid4()}.{ext}"
-    return os.path.join("uploads/recipe/", filename)
+    return os.path.join("uploads/recipe/", f"image.{ext}")
 
 
 class UserManager(BaseUserManager):
@@ -43,23 +49,258 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email"
 
 
-class Tag(models.Model):
+class ChangeCounterManager(models.Manager):
+    def advance(self, user_id, count=1):
+        """
+        Reserve ``count`` change numbers for ``user_id`` and return the last.
+
+        Call it inside a transaction: the counter row stays locked until the
+        commit, so a user's changes become visible in change number order.
+        """
+        self.get_or_create(user_id=user_id)
+        self.filter(user_id=user_id).update(value=F("value") + count)
+        return self.filter(user_id=user_id).values_list("value", flat=True).get()
+
+
+class ChangeCounter(models.Model):
+    """Per-user sequence numbering every change to the user's recipes, tags and ingredients"""
+
+    # No constraint: the cascade from a deleted user can still bump it.
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+    )
+    value = models.BigIntegerField(default=0)
+
+    objects = ChangeCounterManager()
+
+
+class UserCountersManager(models.Manager):
+    def add(self, user_id, **deltas):
+        """Atomically add ``deltas`` (recipes, tags, ingredients) to the user's counters"""
+        changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if changes and not self.filter(user_id=user_id).update(**changes):
+            self.get_or_create(user_id=user_id)
+            self.filter(user_id=user_id).update(**changes)
+
+    def counts(self, user_id):
+        counters = self.filter(user_id=user_id).first()
+        return {field: getattr(counters, field, 0) for field in COUNTED}
+
+    def reconcile(self, user_ids=None):
+        """
+        Recount the rows of ``user_ids`` (default everyone) and fix the
+        counters that drifted, returning how many were fixed.
+        """
+        filters = {} if user_ids is None else {"user_id__in": user_ids}
+        counted = {}
+        for field, model in (("recipes", Recipe), ("tags", Tag), ("ingredients", Ingredient)):
+            rows = model.objects.db_manager(self.db).filter(**filters).order_by()
+            for user_id, count in rows.values_list("user").annotate(count=Count("pk")):
+                counted.setdefault(user_id, {})[field] = count
+
+        stored = {counters.user_id: counters for counters in self.filter(**filters)}
+        fixed = 0
+        for user_id in counted.keys() | stored.keys():
+            counts = {field: counted.get(user_id, {}).get(field, 0) for field in COUNTED}
+            counters = stored.get(user_id)
+            if counters is None:
+                self.create(user_id=user_id, **counts)
+            elif any(getattr(counters, field) != count for field, count in counts.items()):
+                self.filter(user_id=user_id).update(**counts)
+            else:
+                continue
+            fixed += 1
+        return fixed
+
+
+class UserCounters(models.Model):
+    """How many recipes, tags and ingredients a user has, kept up to date on writes"""
+
+    # No constraint, like ChangeCounter: the cascade from a deleted user updates it.
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+    )
+    recipes = models.IntegerField(default=0)
+    tags = models.IntegerField(default=0)
+    ingredients = models.IntegerField(default=0)
+
+    objects = UserCountersManager()
+
+
+COUNTED = ("recipes", "tags", "ingredients")
+
+
+class ChangeTracked(models.Model):
+    """Stamps every save with the time and the user's next change number"""
+
+    updated_at = models.DateTimeField(auto_now=True)
+    change_seq = models.BigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "updated_at", "change_seq"}
+        with transaction.atomic(using=using):
+            self.change_seq = ChangeCounter.objects.db_manager(using).advance(self.user_id)
+            super().save(*args, **kwargs)
+
+    def touch(self, using=None):
+        """Record a change to the object's links without changing its fields"""
+        self.save(using=using, update_fields=())
+
+
+class Tombstone(models.Model):
+    """Marks a deleted recipe, tag or ingredient for clients syncing incrementally"""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False
+    )
+    model = models.CharField(max_length=32)
+    object_id = models.IntegerField()
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "change_seq"])]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id}"
+
+
+def normalize_name(name):
+    """Case-folded form of a tag or ingredient name that prefix searches match on"""
+    return name.strip().casefold()
+
+
+class RecipeAttrManager(models.Manager):
+    def recount(self, **filters):
+        """Recompute ``recipe_count`` of the matching rows from their recipe links"""
+        through = self.model._meta.get_field("recipe").through
+        column = self.model._meta.model_name
+        links = (
+            through.objects.filter(**{column: OuterRef("pk")})
+            .order_by()
+            .values(column)
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        return self.filter(**filters).update(
+            recipe_count=Coalesce(Subquery(links, output_field=models.IntegerField()), 0)
+        )
+
+
+class RecipeAttr(ChangeTracked):
+    """A tag or ingredient, kept searchable by name prefix and ranked by use"""
+
+    name_key = models.CharField(max_length=255, default="", editable=False)
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RecipeAttrManager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.name_key = normalize_name(self.name)
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "name_key"}
+        super().save(*args, **kwargs)
+
+
+class Tag(RecipeAttr):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,)
 
+    class Meta:
+        indexes = [models.Index(fields=["user", "change_seq"])]
+
+    def __str__(self):
+        return self.name
+
+
+class CanonicalIngredientManager(models.Manager):
+    # Keys per IN (...) lookup, under SQLite's limit on query parameters.
+    batch_size = 500
+
+    def ids_for(self, names):
+        """Map the key of each of ``names`` to its canonical ingredient id, adding new ones"""
+        names = {normalize_name(name): name.strip() for name in names}
+        keys = sorted(names)
+        ids = {}
+        for start in range(0, len(keys), self.batch_size):
+            ids.update(
+                self._ids_for({key: names[key] for key in keys[start : start + self.batch_size]})
+            )
+        return ids
+
+    def _ids_for(self, names):
+        # Always the primary: a lagging replica would make us insert duplicates.
+        manager = self.db_manager(router.db_for_write(self.model))
+        ids = dict(manager.filter(name_key__in=list(names)).values_list("name_key", "id"))
+        missing = [key for key in names if key not in ids]
+        if missing:
+            try:
+                with transaction.atomic(using=manager.db):
+                    manager.bulk_create(self.model(name_key=k, name=names[k]) for k in missing)
+            except IntegrityError:
+                # Someone added some of them meanwhile.
+                for key in missing:
+                    manager.get_or_create(name_key=key, defaults={"name": names[key]})
+            ids.update(manager.filter(name_key__in=missing).values_list("name_key", "id"))
+        return ids
+
+
+class CanonicalIngredient(models.Model):
+    """One ingredient shared by every user's ingredient rows with the same normalized name"""
+
+    name_key = models.CharField(max_length=255, unique=True)
+    name = models.CharField(max_length=255)
+
+    objects = CanonicalIngredientManager()
+
     def __str__(self):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(RecipeAttr):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # The catalog is global and stays on the primary, so no constraint across shards.
+    canonical = models.ForeignKey(
+        CanonicalIngredient,
+        null=True,
+        editable=False,
+        related_name="ingredients",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "change_seq"])]
+
+    def save(self, *args, **kwargs):
+        if self.canonical_id is None or normalize_name(self.name) != self.name_key:
+            self.canonical_id = CanonicalIngredient.objects.ids_for([self.name])[
+                normalize_name(self.name)
+            ]
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "canonical"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(ChangeTracked):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
     title = models.CharField(max_length=255)
@@ -68,7 +309,205 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     ingredients = models.ManyToManyField("Ingredient")
     tags = models.ManyToManyField("Tag")
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(
+        null=True, upload_to=recipe_image_file_path, storage=ContentAddressedStorage()
+    )
+    # Kept by recipe.popularity.ViewCounter, which adds to them in bulk.
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    popularity = models.FloatField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "change_seq"]),
+            # One per ordering the recipe list allows, ending in the id tie-break.
+            models.Index(fields=["user", "id"], name="recipe_user_id_idx"),
+            models.Index(fields=["user", "price", "id"], name="recipe_user_price_idx"),
+            models.Index(fields=["user", "time_in_minutes", "id"], name="recipe_user_time_idx"),
+            models.Index(fields=["user", "title", "id"], name="recipe_user_title_idx"),
+            models.Index(fields=["user", "view_count", "id"], name="recipe_user_views_idx"),
+            models.Index(fields=["user", "popularity", "id"], name="recipe_user_popularity_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Don't write back view counts that may have grown since the row was read.
+        if not self._state.adding and not kwargs.get("force_insert"):
+            if kwargs.get("update_fields") is None:
+                kwargs["update_fields"] = [
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in ("view_count", "popularity")
+                ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
+
+
+class ImageBlob(models.Model):
+    """A content-addressed file shared by every recipe image with the same bytes"""
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class PendingImageDeletion(models.Model):
+    """A recipe image name that was replaced or deleted and may now be unused"""
+
+    name = models.CharField(max_length=255)
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class ImageUploadSession(models.Model):
+    """A resumable recipe image upload assembled from numbered chunks"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    recipe = models.ForeignKey("Recipe", on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=64, blank=True)
+    offset = models.PositiveIntegerField(default=0)
+    next_chunk = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_SESSION_ROOT, f"{self.id}.part")
+
+    def __str__(self):
+        return str(self.id)
+
+
+class ImportJob(models.Model):
+    """Progress of a recipe file import"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATES = ((PENDING, "Pending"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed"))
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    format = models.CharField(max_length=8)
+    state = models.CharField(max_length=16, choices=STATES, default=PENDING)
+    processed = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    # JSON list of the first RECIPE_IMPORT_MAX_ERRORS row errors.
+    errors = models.TextField(default="[]")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def path(self):
+        return os.path.join(settings.RECIPE_IMPORT_ROOT, f"{self.id}.{self.format}")
+
+    def __str__(self):
+        return str(self.id)
+
+
+class ShardAssignment(models.Model):
+    """Directory entry saying which database holds a user's recipes, tags and ingredients"""
+
+    ACTIVE = "active"
+    MOVING = "moving"
+    STATES = ((ACTIVE, "Active"), (MOVING, "Moving"))
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True
+    )
+    shard = models.CharField(max_length=64)
+    state = models.CharField(max_length=16, choices=STATES, default=ACTIVE)
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.shard}"
+
+
+class IdempotencyKeyManager(models.Manager):
+    def claim(self, scope, key, fingerprint):
+        """
+        Take ``key`` for a new request, returning ``(row, True)``, or return
+        ``(row, False)`` with the live row of an earlier request. The unique
+        constraint is the lock: concurrent duplicates cannot both insert.
+        """
+        manager = self.db_manager(router.db_for_write(self.model))
+        while True:
+            try:
+                with transaction.atomic(using=manager.db):
+                    return manager.create(scope=scope, key=key, fingerprint=fingerprint), True
+            except IntegrityError:
+                existing = manager.filter(scope=scope, key=key).first()
+            if existing is not None and not existing.is_stale():
+                return existing, False
+            if existing is not None:
+                # Expired, or abandoned by a worker that died mid-request.
+                manager.filter(pk=existing.pk, created_at=existing.created_at).delete()
+
+    def expired(self):
+        cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        return self.filter(created_at__lt=cutoff)
+
+
+class IdempotencyKey(models.Model):
+    """A client's Idempotency-Key for a create and, once it succeeded, the response to replay"""
+
+    # "user:<id>", or "anonymous:<fingerprint>" for sign ups.
+    scope = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    # Unset while the first request with the key is still running.
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = IdempotencyKeyManager()
+
+    class Meta:
+        unique_together = ("scope", "key")
+
+    def is_stale(self):
+        age = (timezone.now() - self.created_at).total_seconds()
+        if self.status_code is None:
+            return age > settings.IDEMPOTENCY_LOCK_SECONDS
+        return age > settings.IDEMPOTENCY_KEY_TTL
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
+
+
+class RequestProfile(models.Model):
+    """A profiled request: the profiler's slowest functions, its SQL and serializer timings"""
+
+    HEADER = "header"
+    SAMPLE = "sample"
+    TRIGGERS = ((HEADER, "Header"), (SAMPLE, "Sample"))
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL)
+    trigger = models.CharField(max_length=16, choices=TRIGGERS)
+    method = models.CharField(max_length=16)
+    path = models.CharField(max_length=255)
+    view_name = models.CharField(max_length=255, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    query_ms = models.FloatField()
+    # JSON: the first PROFILING_MAX_QUERIES queries, and milliseconds per serializer.
+    queries = models.TextField(default="[]")
+    serializers = models.TextField(default="{}")
+    stats = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path}"
@@ -0,0 +1,263 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import generics, serializers
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.permissions import IsAdminUser
+
+from core.models import RequestProfile
+
+HEADER = "HTTP_X_PROFILE"
+MAX_SQL_CHARS = 2000
+MAX_STATS_CHARS = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+class _Trace:
+    """The SQL and serializer timings of one profiled request"""
+
+    def __init__(self):
+        self.queries = []
+        self.query_count = 0
+        self.query_seconds = 0
+        self.serializers = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.query_count += 1
+            self.query_seconds += elapsed
+            if len(self.queries) < settings.PROFILING_MAX_QUERIES:
+                self.queries.append(
+                    {
+                        "sql": sql[:MAX_SQL_CHARS],
+                        "ms": round(elapsed * 1000, 3),
+                        "db": context["connection"].alias,
+                    }
+                )
+
+    def add_serializer(self, name, seconds):
+        self.serializers[name] = self.serializers.get(name, 0) + seconds * 1000
+
+
+def _timed_data(data):
+    def fget(serializer):
+        trace = getattr(_state, "trace", None)
+        if trace is None:
+            return data.fget(serializer)
+        child = getattr(serializer, "child", None)
+        name = type(serializer).__name__ if child is None else f"{type(child).__name__} (many)"
+        start = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            trace.add_serializer(name, time.perf_counter() - start)
+
+    fget.untimed = data
+    return property(fget)
+
+
+def instrument_serializers():
+    """
+    Time ``.data`` of every serializer. Installed by the first profiled
+    request, so processes that never profile run DRF unpatched; afterwards
+    requests that are not profiled pay one thread-local lookup.
+    """
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if not hasattr(cls.data.fget, "untimed"):
+            cls.data = _timed_data(cls.data)
+
+
+class _RateLimit:
+    """Profiles started in this process in the last minute, shared by every middleware chain"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = deque()
+
+    def allow(self, per_minute):
+        now = time.monotonic()
+        with self._lock:
+            while self._started and now - self._started[0] > 60:
+                self._started.popleft()
+            if len(self._started) >= per_minute:
+                return False
+            self._started.append(now)
+            return True
+
+    def reset(self):
+        with self._lock:
+            self._started.clear()
+
+
+rate_limit = _RateLimit()
+
+
+def _staff_user(request):
+    """The staff user of a token in the Authorization header, looked up only when profiling"""
+    keyword, _, key = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+    if keyword != "Token" or not key:
+        return None
+    token = Token.objects.select_related("user").filter(key=key.strip()).first()
+    if token is None or not (token.user.is_active and token.user.is_staff):
+        return None
+    return token.user
+
+
+class ProfilingMiddleware:
+    """
+    Runs requests under cProfile, tracing their SQL and serializer timings,
+    and stores the result as a RequestProfile; the response names it in
+    X-Profile-Id. Profiled are requests from staff tokens that send
+    ``X-Profile: 1`` and, for everyone, a PROFILING_SAMPLE_RATE fraction of
+    requests. Overhead is capped at PROFILING_MAX_PER_MINUTE profiles per
+    process, and storage at the newest PROFILING_MAX_STORED profiles.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path_info.startswith(tuple(settings.PROFILING_EXCLUDED_PATHS)):
+            return self.get_response(request)
+        user = None
+        if request.META.get(HEADER) == "1":
+            user = _staff_user(request)
+        if user is not None:
+            trigger = RequestProfile.HEADER
+        elif random.random() < settings.PROFILING_SAMPLE_RATE:
+            trigger = RequestProfile.SAMPLE
+        else:
+            return self.get_response(request)
+        if not rate_limit.allow(settings.PROFILING_MAX_PER_MINUTE):
+            return self.get_response(request)
+        return self.profile(request, trigger, user)
+
+    def profile(self, request, trigger, user):
+        instrument_serializers()
+        trace = _state.trace = _Trace()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(trace))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+                _state.trace = None
+        duration = time.perf_counter() - start
+
+        try:
+            profile = self.store(request, response, trigger, user, profiler, trace, duration)
+        except Exception:
+            logger.exception("Could not store the profile of %s", request.path)
+        else:
+            response["X-Profile-Id"] = str(profile.pk)
+        return response
+
+    def store(self, request, response, trigger, user, profiler, trace, duration):
+        if user is None:
+            # Set by DRF once the view authenticated the request.
+            user = getattr(request, "user", None)
+        stats = io.StringIO()
+        pstats.Stats(profiler, stream=stats).sort_stats("cumulative").print_stats(
+            settings.PROFILING_STATS_LINES
+        )
+        match = request.resolver_match
+        profile = RequestProfile.objects.create(
+            user_id=user.pk if user is not None and user.is_authenticated else None,
+            trigger=trigger,
+            method=request.method,
+            path=request.path[:255],
+            view_name=match.view_name if match else "",
+            status_code=response.status_code,
+            duration_ms=duration * 1000,
+            query_count=trace.query_count,
+            query_ms=trace.query_seconds * 1000,
+            queries=json.dumps(trace.queries),
+            serializers=json.dumps(trace.serializers),
+            stats=stats.getvalue()[:MAX_STATS_CHARS],
+        )
+        # Ids only grow, so this keeps the newest PROFILING_MAX_STORED.
+        RequestProfile.objects.filter(pk__lte=profile.pk - settings.PROFILING_MAX_STORED).delete()
+        return profile
+
+
+class RequestProfileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RequestProfile
+        fields = (
+            "id",
+            "user",
+            "trigger",
+            "method",
+            "path",
+            "view_name",
+            "status_code",
+            "duration_ms",
+            "query_count",
+            "query_ms",
+            "created_at",
+        )
+
+
+class RequestProfileDetailSerializer(RequestProfileSerializer):
+    queries = serializers.SerializerMethodField()
+    serializers = serializers.SerializerMethodField()
+
+    class Meta(RequestProfileSerializer.Meta):
+        fields = RequestProfileSerializer.Meta.fields + ("queries", "serializers", "stats")
+
+    def get_queries(self, profile):
+        return json.loads(profile.queries)
+
+    def get_serializers(self, profile):
+        return json.loads(profile.serializers)
+
+
+class RequestProfileList(generics.ListAPIView):
+    """Stored request profiles, newest first; ``?path=`` and ``?user=`` narrow them down"""
+
+    serializer_class = RequestProfileSerializer
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+    pagination_class = LimitOffsetPagination
+
+    def get_queryset(self):
+        queryset = RequestProfile.objects.order_by("-id")
+        path = self.request.query_params.get("path")
+        user = self.request.query_params.get("user")
+        if path:
+            queryset = queryset.filter(path__startswith=path)
+        if user and user.isdigit():
+            queryset = queryset.filter(user_id=user)
+        return queryset
+
+
+class RequestProfileDetail(generics.RetrieveAPIView):
+    """One stored profile with its SQL, serializer timings and profiler stats"""
+
+    serializer_class = RequestProfileDetailSerializer
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+    queryset = RequestProfile.objects.all()
@@ -0,0 +1,218 @@
+import bisect
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+PRIMARY = "default"
+VIRTUAL_NODES = 64
+
+_state = threading.local()
+
+# User-owned models, stored on the shard of their user.
+SHARDED_MODELS = {
+    "core.tag",
+    "core.ingredient",
+    "core.recipe",
+    "core.recipe_tags",
+    "core.recipe_ingredients",
+    "core.imageuploadsession",
+    "core.changecounter",
+    "core.tombstone",
+    "core.importjob",
+    "core.usercounters",
+}
+
+
+class ShardMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Your data is being moved, try again shortly."
+    default_code = "shard_moving"
+
+
+def sharding_enabled():
+    return len(settings.DATABASE_SHARDS) > 1
+
+
+def is_sharded(model):
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+class HashRing:
+    """Consistent hash ring, so adding a shard only claims a share of new users"""
+
+    def __init__(self, shards, virtual_nodes=VIRTUAL_NODES):
+        self.shards = tuple(shards)
+        points = sorted(
+            (self._hash(f"{shard}#{node}"), shard)
+            for shard in self.shards
+            for node in range(virtual_nodes)
+        )
+        self._keys = [key for key, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    @staticmethod
+    def _hash(value):
+        return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+    def shard_for(self, key):
+        index = bisect.bisect(self._keys, self._hash(str(key))) % len(self._keys)
+        return self._shards[index]
+
+
+_ring = None
+
+
+def get_ring():
+    global _ring
+    if _ring is None or _ring.shards != tuple(settings.DATABASE_SHARDS):
+        _ring = HashRing(settings.DATABASE_SHARDS)
+    return _ring
+
+
+def _cache_key(user_id):
+    return f"shard-assignment:{user_id}"
+
+
+def get_assignment(user_id):
+    """
+    Return ``(shard, state)`` for ``user_id`` from the directory.
+
+    Users without an entry are placed with the hash ring and recorded, so
+    later changes to DATABASE_SHARDS never move existing users implicitly.
+    """
+    from core.models import ShardAssignment
+
+    key = _cache_key(user_id)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    assignment = ShardAssignment.objects.using(PRIMARY).filter(user_id=user_id).first()
+    if assignment is None:
+        shard = get_ring().shard_for(user_id)
+        copy_user(user_id, shard)
+        try:
+            with transaction.atomic(using=PRIMARY):
+                assignment = ShardAssignment.objects.using(PRIMARY).create(
+                    user_id=user_id, shard=shard
+                )
+        except IntegrityError:
+            assignment = ShardAssignment.objects.using(PRIMARY).get(user_id=user_id)
+
+    result = (assignment.shard, assignment.state)
+    cache.set(key, result, settings.SHARD_DIRECTORY_CACHE_SECONDS)
+    return result
+
+
+def forget_assignment(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def shard_for_user(user_id):
+    if not sharding_enabled():
+        return PRIMARY
+    return get_assignment(user_id)[0]
+
+
+@contextmanager
+def pinned_to_user(user_id):
+    """Route queries on user-owned models in this block to ``user_id``'s shard"""
+    previous = getattr(_state, "user_id", None)
+    _state.user_id = user_id
+    try:
+        yield
+    finally:
+        _state.user_id = previous
+
+
+def pin_user(user_id):
+    _state.user_id = user_id
+
+
+def pinned_user():
+    return getattr(_state, "user_id", None)
+
+
+def current_shard():
+    user_id = pinned_user()
+    return shard_for_user(user_id) if user_id else PRIMARY
+
+
+def copy_user(user_id, shard):
+    """Keep a copy of the user row on ``shard`` so its foreign keys stay valid there"""
+    if shard == PRIMARY:
+        return
+    User = get_user_model()
+    if User.objects.using(shard).filter(pk=user_id).exists():
+        return
+    user = User.objects.using(PRIMARY).get(pk=user_id)
+    user.save(using=shard, force_insert=True)
+
+
+class ShardedViewMixin:
+    """Pins the queries of a request on user-owned models to its user's shard"""
+
+    def dispatch(self, request, *args, **kwargs):
+        with pinned_to_user(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            pin_user(request.user.pk)
+
+
+class ShardRouter:
+    """
+    Sends user-owned rows to their user's shard, told from the instance hint
+    or else from the user pinned with ``pinned_to_user()``. Anything else, and
+    everything when there is a single shard, is left to the next router.
+    """
+
+    def _shard_from_hints(self, hints):
+        instance = hints.get("instance")
+        if instance is not None:
+            if isinstance(instance, get_user_model()):
+                return shard_for_user(instance.pk)
+            if instance._state.db:
+                return instance._state.db
+            if getattr(instance, "user_id", None):
+                return shard_for_user(instance.user_id)
+        user_id = pinned_user()
+        return shard_for_user(user_id) if user_id else None
+
+    def db_for_read(self, model, **hints):
+        if not sharding_enabled() or not is_sharded(model):
+            return None
+        return self._shard_from_hints(hints)
+
+    def db_for_write(self, model, **hints):
+        from core.models import ShardAssignment
+
+        if not sharding_enabled() or not is_sharded(model):
+            return None
+        instance = hints.get("instance")
+        if isinstance(instance, get_user_model()):
+            user_id = instance.pk
+        else:
+            user_id = getattr(instance, "user_id", None) or pinned_user()
+        if user_id and get_assignment(user_id)[1] == ShardAssignment.MOVING:
+            raise ShardMoving
+        return self._shard_from_hints(hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not sharding_enabled():
+            return None
+        User = get_user_model()
+        if isinstance(obj1, User) or isinstance(obj2, User):
+            return True
+        if is_sharded(type(obj1)) and is_sharded(type(obj2)):
+            return obj1._state.db == obj2._state.db
+        return None
@@ -0,0 +1,153 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.models import (
+    ChangeCounter,
+    Ingredient,
+    PendingImageDeletion,
+    Recipe,
+    ShardAssignment,
+    Tag,
+    Tombstone,
+    User,
+    UserCounters,
+)
+from core.events import publish_change
+from core.sharding import PRIMARY, forget_assignment, sharding_enabled
+
+
+@receiver(pre_save, sender=Recipe)
+def queue_replaced_image(sender, instance, using, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and "image" not in update_fields):
+        return
+    recipes = Recipe.objects.using(using)
+    old_name = recipes.filter(pk=instance.pk).values_list("image", flat=True).first()
+    if old_name and old_name != instance.image.name:
+        PendingImageDeletion.objects.create(name=old_name)
+
+
+@receiver(post_delete, sender=Recipe)
+def queue_deleted_image(sender, instance, **kwargs):
+    # Also runs for recipes removed by a cascading User delete.
+    if instance.image:
+        PendingImageDeletion.objects.create(name=instance.image.name)
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_rows(sender, instance, using, **kwargs):
+    # The cascade only reaches the primary; the user's shard has its own copy.
+    if using != PRIMARY or not sharding_enabled():
+        return
+    assignment = ShardAssignment.objects.filter(user_id=instance.pk).first()
+    if assignment is not None and assignment.shard != PRIMARY:
+        User.objects.using(assignment.shard).filter(pk=instance.pk).delete()
+    forget_assignment(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def delete_change_tracking(sender, instance, using, **kwargs):
+    # Not cascaded, since deleting the user's rows above still records changes.
+    Tombstone.objects.using(using).filter(user_id=instance.pk).delete()
+    ChangeCounter.objects.using(using).filter(user_id=instance.pk).delete()
+    UserCounters.objects.using(using).filter(user_id=instance.pk).delete()
+
+
+COUNTER_FIELDS = {Recipe: "recipes", Tag: "tags", Ingredient: "ingredients"}
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+def count_created(sender, instance, created, using, **kwargs):
+    if created:
+        UserCounters.objects.db_manager(using).add(instance.user_id, **{COUNTER_FIELDS[sender]: 1})
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def count_deleted(sender, instance, using, **kwargs):
+    UserCounters.objects.db_manager(using).add(instance.user_id, **{COUNTER_FIELDS[sender]: -1})
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def record_tombstone(sender, instance, using, **kwargs):
+    tombstone = Tombstone.objects.using(using).create(
+        user_id=instance.user_id,
+        model=sender._meta.model_name,
+        object_id=instance.pk,
+        change_seq=ChangeCounter.objects.db_manager(using).advance(instance.user_id),
+    )
+    publish_change(
+        instance.user_id, tombstone.model, instance.pk, tombstone.change_seq, using, deleted=True
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+def publish_saved_change(sender, instance, using, **kwargs):
+    model = sender._meta.model_name
+    publish_change(instance.user_id, model, instance.pk, instance.change_seq, using)
+
+
+def touch_recipes(recipe_ids, using):
+    for recipe in Recipe.objects.using(using).filter(pk__in=recipe_ids):
+        recipe.touch(using=using)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def touch_linked_recipes(sender, instance, using, **kwargs):
+    # The cascade removes the links without an m2m_changed signal.
+    field = "tags" if sender is Tag else "ingredients"
+    recipes = Recipe.objects.using(using).filter(**{field: instance})
+    touch_recipes(recipes.values_list("pk", flat=True), using)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_recipe_links(sender, instance, using, **kwargs):
+    instance._linked_ids = {
+        Tag: list(instance.tags.values_list("pk", flat=True)),
+        Ingredient: list(instance.ingredients.values_list("pk", flat=True)),
+    }
+
+
+@receiver(post_delete, sender=Recipe)
+def recount_unlinked(sender, instance, using, **kwargs):
+    # The cascade has removed the links by now, without an m2m_changed signal.
+    for model, ids in instance.__dict__.pop("_linked_ids", {}).items():
+        if ids:
+            model.objects.db_manager(using).recount(pk__in=ids)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recount_relinked(sender, instance, action, reverse, model, pk_set, using, **kwargs):
+    if reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            type(instance).objects.db_manager(using).recount(pk=instance.pk)
+    elif action == "pre_clear":
+        field = "tags" if model is Tag else "ingredients"
+        instance._cleared_ids = list(getattr(instance, field).values_list("pk", flat=True))
+    elif action == "post_clear":
+        model.objects.db_manager(using).recount(pk__in=instance.__dict__.pop("_cleared_ids", ()))
+    elif action in ("post_add", "post_remove") and pk_set:
+        model.objects.db_manager(using).recount(pk__in=pk_set)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_relinked_recipes(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if not reverse:
+        if action.startswith("post_"):
+            instance.touch(using=using)
+        return
+    if action == "pre_clear":
+        instance._cleared_recipe_ids = list(instance.recipe_set.values_list("pk", flat=True))
+    elif action == "post_clear":
+        touch_recipes(instance.__dict__.pop("_cleared_recipe_ids", ()), using)
+    elif action in ("post_add", "post_remove"):
+        touch_recipes(pk_set, using)
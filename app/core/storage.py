@@ -0,0 +1,101 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each file once under the SHA-256 of its content.
+
+    The directory part of the requested name is kept and the file is placed
+    in fan-out subdirectories, e.g. ``uploads/recipe/ab/cd/abcd...ef.jpg``.
+    Saving identical content again reuses the existing blob and bumps its
+    reference count; ``delete`` only removes the file once nothing uses it.
+    """
+
+    chunk_size = 64 * 1024
+    fan_out = (2, 2)
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save.
+        return name
+
+    def hashed_name(self, directory, digest, ext):
+        parts = []
+        start = 0
+        for width in self.fan_out:
+            parts.append(digest[start : start + width])
+            start += width
+        return "/".join([directory.rstrip("/"), *parts, f"{digest}{ext}"]).lstrip("/")
+
+    def _save(self, name, content):
+        from core.models import ImageBlob
+
+        directory, basename = os.path.split(name)
+        ext = os.path.splitext(basename)[1].lower()
+        staging_dir = self.path(directory)
+        os.makedirs(staging_dir, exist_ok=True)
+
+        hasher = hashlib.sha256()
+        size = 0
+        if hasattr(content, "temporary_file_path"):
+            # Already on disk: hash it in place and move it, no second copy.
+            tmp_path = None
+            for chunk in content.chunks(self.chunk_size):
+                hasher.update(chunk)
+                size += len(chunk)
+        else:
+            fd, tmp_path = tempfile.mkstemp(dir=staging_dir, prefix=".incoming-")
+            try:
+                with os.fdopen(fd, "wb") as tmp:
+                    for chunk in content.chunks(self.chunk_size):
+                        hasher.update(chunk)
+                        size += len(chunk)
+                        tmp.write(chunk)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+        final_name = self.hashed_name(directory, hasher.hexdigest(), ext)
+        full_path = self.path(final_name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+        with transaction.atomic():
+            blob, _ = ImageBlob.objects.select_for_update().get_or_create(
+                name=final_name, defaults={"size": size}
+            )
+            if os.path.exists(full_path):
+                if tmp_path:
+                    os.remove(tmp_path)
+            else:
+                if tmp_path:
+                    os.replace(tmp_path, full_path)
+                else:
+                    file_move_safe(content.temporary_file_path(), full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+            ImageBlob.objects.filter(pk=blob.pk).update(
+                ref_count=F("ref_count") + 1, last_used_at=timezone.now()
+            )
+
+        return final_name
+
+    def delete(self, name):
+        from core.models import ImageBlob
+
+        with transaction.atomic():
+            blob = ImageBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.ref_count > 1:
+                ImageBlob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") - 1)
+                return
+            if blob is not None:
+                blob.delete()
+            super().delete(name)
@@ -1,7 +1,11 @@
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core.models import Recipe, Tag
+
 
 class AdminSiteTest(TestCase):
     def setUp(self):
@@ -31,3 +35,63 @@ class AdminSiteTest(TestCase):
         url = reverse("admin:core_user_add")
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
+
+
+class UserOwnedAdminTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        admin_user = get_user_model().objects.create_superuser("admin@email.com", "1qazxsw2")
+        self.client.force_login(admin_user)
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+
+    def add_rows(self, count):
+        start = Tag.objects.count()
+        for index in range(start, start + count):
+            user = get_user_model().objects.create_user(f"user{index}@email.com", "1qazxsw2")
+            tag = Tag.objects.create(user=user, name=f"Tag {index}")
+            recipe = Recipe.objects.create(user=user, title="Soup", time_in_minutes=5, price=2)
+            recipe.tags.add(tag)
+
+    def count_queries(self, url):
+        self.client.get(url)  # Warms up per-process caches such as content types.
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for name in ("tag", "ingredient", "recipe"):
+            url = reverse(f"admin:core_{name}_changelist")
+            self.add_rows(2)
+            few = self.count_queries(url)
+            self.add_rows(5)
+            self.assertEqual(self.count_queries(url), few, name)
+
+    def test_recipe_change_view_does_not_load_every_tag(self):
+        recipe = Recipe.objects.create(user=self.user, title="Soup", time_in_minutes=5, price=2)
+        url = reverse("admin:core_recipe_change", args=[recipe.id])
+        self.add_rows(2)
+        few = self.count_queries(url)
+
+        self.add_rows(5)
+
+        self.assertEqual(self.count_queries(url), few)
+        self.assertNotContains(self.client.get(url), "Tag 0")
+
+    def test_owner_filter(self):
+        Tag.objects.create(user=self.user, name="Mine")
+        self.add_rows(1)
+
+        response = self.client.get(reverse("admin:core_tag_changelist"), {"user": self.user.id})
+
+        self.assertContains(response, "Mine")
+        self.assertNotContains(response, "Tag 0")
+
+    def test_prefix_search(self):
+        Tag.objects.create(user=self.user, name="Vegan")
+        Tag.objects.create(user=self.user, name="Not vegan")
+
+        response = self.client.get(reverse("admin:core_tag_changelist"), {"q": "veg"})
+
+        self.assertContains(response, "Vegan")
+        self.assertNotContains(response, "Not vegan")
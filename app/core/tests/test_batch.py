@@ -0,0 +1,127 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+BATCH_URL = reverse("batch")
+
+
+class BatchApiTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, *requests, **options):
+        response = self.client.post(
+            BATCH_URL, {"requests": list(requests), **options}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["responses"]
+
+    def test_login_required(self):
+        response = APIClient().post(BATCH_URL, {"requests": []}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_responses_in_order_with_status(self):
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+
+        responses = self.batch(
+            {"method": "GET", "path": "/api/user/me/"},
+            {"method": "GET", "path": "/api/recipe/tags/"},
+            {"method": "GET", "path": "/api/recipe/recipes/12345/"},
+            {"method": "GET", "path": "/api/recipe/tags/?assigned_only=1"},
+        )
+
+        self.assertEqual([r["status"] for r in responses], [200, 200, 404, 200])
+        self.assertEqual(responses[0]["body"]["email"], self.user.email)
+        self.assertEqual(responses[1]["body"], [{"id": tag.id, "name": "Vegan"}])
+
+    def test_writes_are_seen_by_later_requests(self):
+        responses = self.batch(
+            {"method": "POST", "path": "/api/recipe/tags/", "body": {"name": "Dessert"}},
+            {"method": "POST", "path": "/api/recipe/tags/", "body": {"name": ""}},
+            {"method": "GET", "path": "/api/recipe/tags/"},
+        )
+
+        self.assertEqual([r["status"] for r in responses], [201, 400, 200])
+        self.assertIn("name", responses[1]["body"])
+        self.assertEqual([t["name"] for t in responses[2]["body"]], ["Dessert"])
+
+    def test_authenticates_once(self):
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        request = {"method": "GET", "path": "/api/user/me/"}
+
+        # The token lookup, then nothing more for the three sub-requests.
+        with self.assertNumQueries(1):
+            response = client.post(BATCH_URL, {"requests": [request] * 3}, format="json")
+
+        self.assertEqual([r["status"] for r in response.data["responses"]], [200] * 3)
+
+    def test_only_api_views_reachable(self):
+        responses = self.batch(
+            {"method": "GET", "path": "/api/batch/"},
+            {"method": "GET", "path": "/api/recipe/events/"},
+            {"method": "POST", "path": "/api/user/import/", "body": []},
+            {"method": "POST", "path": "/api/user/create/", "body": {}},
+            {"method": "GET", "path": "/api/recipe/sync/"},
+            {"method": "GET", "path": "/admin/"},
+            {"method": "GET", "path": "/nowhere/"},
+        )
+
+        self.assertEqual([r["status"] for r in responses], [404] * 7)
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_too_many_requests(self):
+        request = {"method": "GET", "path": "/api/user/me/"}
+
+        response = self.client.post(BATCH_URL, {"requests": [request] * 3}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ParallelBatchApiTests(TransactionTestCase):
+    def test_parallel_gets(self):
+        user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        recipe = Recipe.objects.create(user=user, title="Soup", time_in_minutes=5, price=2)
+        client = APIClient()
+        client.force_authenticate(user)
+        requests = [
+            {"method": "GET", "path": "/api/recipe/tags/"},
+            {"method": "GET", "path": f"/api/recipe/recipes/{recipe.id}/"},
+            {"method": "PATCH", "path": "/api/user/me/", "body": {"name": "Renamed"}},
+            {"method": "GET", "path": "/api/user/me/"},
+            {"method": "GET", "path": "/api/recipe/ingredients/"},
+        ]
+
+        response = client.post(BATCH_URL, {"requests": requests, "parallel": True}, format="json")
+
+        responses = response.data["responses"]
+        self.assertEqual([r["status"] for r in responses], [200] * 5)
+        self.assertEqual(responses[1]["body"]["title"], "Soup")
+        self.assertEqual(responses[3]["body"]["name"], "Renamed")
+
+    @override_settings(BATCH_MAX_WORKERS=2)
+    def test_parallel_workers_close_connections_once(self):
+        user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        client = APIClient()
+        client.force_authenticate(user)
+        requests = [{"method": "GET", "path": "/api/recipe/tags/"}] * 6
+
+        with patch.object(connections, "close_all", wraps=connections.close_all) as close_all:
+            response = client.post(
+                BATCH_URL, {"requests": requests, "parallel": True}, format="json"
+            )
+
+        self.assertEqual([r["status"] for r in response.data["responses"]], [200] * 6)
+        self.assertEqual(close_all.call_count, 2)
@@ -1,8 +1,31 @@
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.management.commands.profile_startup import parse_importtime
+from core.models import (
+    CanonicalIngredient,
+    ChangeCounter,
+    ImageBlob,
+    IdempotencyKey,
+    ImageUploadSession,
+    Ingredient,
+    PendingImageDeletion,
+    Recipe,
+    Tag,
+    UserCounters,
+)
 
 
 class CommandTests(TestCase):
@@ -18,3 +41,272 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command("wait_for_db")
             self.assertEqual(gi.call_count, 6)
+
+
+class ClearUploadSessionsTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.recipe = Recipe.objects.create(user=user, title="Recipe", time_in_minutes=1, price=1)
+        self.session = ImageUploadSession.objects.create(
+            user=user, recipe=self.recipe, filename="photo.jpg", size=10
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_stale_sessions_and_orphans_are_removed(self):
+        with override_settings(UPLOAD_SESSION_ROOT=self.root):
+            open(self.session.path, "wb").close()
+            orphan = os.path.join(self.root, f"{uuid.uuid4()}.part")
+            open(orphan, "wb").close()
+            ImageUploadSession.objects.update(updated_at=timezone.now() - timedelta(days=2))
+
+            call_command("clear_upload_sessions", max_age=3600, stdout=StringIO())
+
+            self.assertFalse(ImageUploadSession.objects.exists())
+            self.assertFalse(os.path.exists(self.session.path))
+            # Orphans are only removed once they are old enough themselves.
+            self.assertTrue(os.path.exists(orphan))
+
+    def test_active_sessions_are_kept(self):
+        with override_settings(UPLOAD_SESSION_ROOT=self.root):
+            call_command("clear_upload_sessions", stdout=StringIO())
+
+        self.assertTrue(ImageUploadSession.objects.exists())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ReclaimMediaTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+
+    def _recipe_with_image(self, content=b"image", user=None):
+        recipe = Recipe.objects.create(
+            user=user or self.user, title="Recipe", time_in_minutes=1, price=1
+        )
+        recipe.image.save("photo.jpg", ContentFile(content))
+        return recipe
+
+    def _reclaim(self, min_age=0, **options):
+        call_command("reclaim_media", min_age=min_age, rate=0, stdout=StringIO(), **options)
+
+    def test_replaced_image_is_queued_and_reclaimed(self):
+        recipe = self._recipe_with_image(b"old")
+        old_path = recipe.image.path
+
+        recipe.image.save("photo.jpg", ContentFile(b"new"))
+        self.assertTrue(PendingImageDeletion.objects.filter(name__endswith=".jpg").exists())
+
+        self._reclaim()
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(recipe.image.path))
+        self.assertFalse(PendingImageDeletion.objects.exists())
+
+    def test_recently_used_image_stays_queued(self):
+        recipe = self._recipe_with_image(b"old")
+        old_path = recipe.image.path
+        recipe.image.save("photo.jpg", ContentFile(b"new"))
+
+        self._reclaim(min_age=3600, queue_only=True)
+        self.assertTrue(os.path.exists(old_path))
+        self.assertTrue(PendingImageDeletion.objects.exists())
+
+        self._reclaim(queue_only=True)
+        self.assertFalse(os.path.exists(old_path))
+        self.assertFalse(PendingImageDeletion.objects.exists())
+
+    def test_cascaded_user_delete_reclaims_images(self):
+        other = get_user_model().objects.create_user("other@email.com", "1qazxsw2")
+        path = self._recipe_with_image(user=other).image.path
+
+        other.delete()
+        self._reclaim(queue_only=True)
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_shared_image_is_kept_while_referenced(self):
+        recipe_one = self._recipe_with_image(b"shared")
+        recipe_two = self._recipe_with_image(b"shared")
+
+        recipe_one.delete()
+        self._reclaim()
+
+        self.assertTrue(os.path.exists(recipe_two.image.path))
+        self.assertEqual(ImageBlob.objects.get(name=recipe_two.image.name).ref_count, 1)
+
+    def test_scan_finds_untracked_orphans(self):
+        recipe = self._recipe_with_image()
+        orphan = os.path.join(os.path.dirname(recipe.image.path), "orphan.jpg")
+        open(orphan, "wb").close()
+
+        self._reclaim(dry_run=True)
+        self.assertTrue(os.path.exists(orphan))
+
+        self._reclaim()
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(recipe.image.path))
+
+
+class SeedDataTests(TestCase):
+    def seed(self, seed=1):
+        call_command(
+            "seed_data",
+            seed=seed,
+            users=5,
+            recipes=40,
+            tags_per_user=3,
+            ingredients_per_user=4,
+            stdout=StringIO(),
+        )
+
+    def snapshot(self):
+        recipes = Recipe.objects.order_by("id").prefetch_related("tags")
+        return [(r.user.email, r.title, sorted(t.name for t in r.tags.all())) for r in recipes]
+
+    def test_generates_requested_rows(self):
+        self.seed()
+
+        self.assertEqual(get_user_model().objects.count(), 5)
+        self.assertEqual(Tag.objects.count(), 15)
+        self.assertEqual(Recipe.objects.count(), 40)
+        self.assertTrue(Recipe.tags.through.objects.exists())
+        self.assertTrue(Recipe.ingredients.through.objects.exists())
+        self.assertEqual(CanonicalIngredient.objects.count(), 4)
+        self.assertFalse(Ingredient.objects.filter(canonical__isnull=True).exists())
+
+    def test_same_seed_same_data(self):
+        self.seed()
+        first = self.snapshot()
+        get_user_model().objects.all().delete()
+        self.seed()
+
+        self.assertEqual(
+            [row[1:] for row in self.snapshot()], [row[1:] for row in first],
+        )
+
+    def test_rows_are_numbered_for_sync(self):
+        self.seed()
+        user = Recipe.objects.first().user
+        counter = ChangeCounter.objects.get(user=user)
+
+        seqs = [
+            *Tag.objects.filter(user=user).values_list("change_seq", flat=True),
+            *Recipe.objects.filter(user=user).values_list("change_seq", flat=True),
+        ]
+        tag = Tag.objects.create(user=user, name="After seeding")
+
+        self.assertEqual(len(set(seqs)), len(seqs))
+        self.assertLessEqual(max(seqs), counter.value)
+        self.assertEqual(tag.change_seq, counter.value + 1)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ImportUsersTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, "users.csv")
+        with open(self.path, "w") as f:
+            f.write("email,password,name\none@email.com,secret,One\none@email.com,secret,Again\n")
+
+    def test_import_users(self):
+        tokens = os.path.join(self.root, "tokens.csv")
+        stderr = StringIO()
+
+        call_command(
+            "import_users", self.path, workers=1, tokens=tokens, stdout=StringIO(), stderr=stderr
+        )
+
+        user = get_user_model().objects.get(email="one@email.com")
+        self.assertEqual(user.name, "One")
+        self.assertIn("Line 3: one@email.com: Duplicate email in import", stderr.getvalue())
+        with open(tokens) as f:
+            self.assertEqual(f.read().strip(), f"one@email.com,{user.auth_token.key}")
+
+
+class ImportRecipesTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, "recipes.csv")
+        with open(self.path, "w") as f:
+            f.write("title,time_in_minutes,price,tags\nSoup,5,2.00,Vegan\nBroken,x,1,\n")
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+
+    def test_import_recipes(self):
+        stdout, stderr = StringIO(), StringIO()
+
+        call_command("import_recipes", self.user.email, self.path, stdout=stdout, stderr=stderr)
+
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual([tag.name for tag in recipe.tags.all()], ["Vegan"])
+        self.assertIn("Row 2:", stderr.getvalue())
+        self.assertIn("Imported 1 recipes, 1 rows failed", stdout.getvalue())
+
+
+class ReconcileCountersTests(TestCase):
+    def test_reconcile_counters(self):
+        user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        tag = Tag.objects.create(user=user, name="Vegan")
+        recipe = Recipe.objects.create(user=user, title="Soup", time_in_minutes=5, price=2)
+        recipe.tags.add(tag)
+        UserCounters.objects.filter(user=user).update(recipes=0)
+        Tag.objects.filter(pk=tag.pk).update(recipe_count=5)
+        stdout = StringIO()
+
+        call_command("reconcile_counters", email=user.email, stdout=stdout)
+
+        self.assertEqual(UserCounters.objects.counts(user.pk)["recipes"], 1)
+        self.assertEqual(Tag.objects.get(pk=tag.pk).recipe_count, 1)
+        self.assertIn("Fixed the counters of 1 users", stdout.getvalue())
+
+
+class BackfillCanonicalIngredientsTests(TestCase):
+    def test_maps_ingredients_in_batches(self):
+        user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        other = get_user_model().objects.create_user("other@email.com", "1qazxsw2")
+        for owner, name in ((user, "Salt"), (user, "Pepper"), (other, "salt"), (other, "Kale")):
+            Ingredient.objects.create(user=owner, name=name)
+        Ingredient.objects.update(canonical=None)
+        CanonicalIngredient.objects.all().delete()
+        stdout = StringIO()
+
+        call_command("backfill_canonical_ingredients", batch_size=2, stdout=stdout)
+
+        self.assertIn("Mapped 4 ingredients", stdout.getvalue())
+        self.assertEqual(CanonicalIngredient.objects.count(), 3)
+        salts = Ingredient.objects.filter(name_key="salt").values_list("canonical_id", flat=True)
+        self.assertEqual(len(set(salts)), 1)
+        self.assertFalse(Ingredient.objects.filter(canonical__isnull=True).exists())
+
+
+class ClearIdempotencyKeysTests(TestCase):
+    def test_removes_expired_keys(self):
+        for key in ("old-1", "old-2", "new"):
+            IdempotencyKey.objects.create(scope="anonymous", key=key, fingerprint="x")
+        IdempotencyKey.objects.exclude(key="new").update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+        stdout = StringIO()
+
+        call_command("clear_idempotency_keys", batch_size=1, stdout=stdout)
+
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["new"])
+        self.assertIn("Removed 2 expired idempotency keys", stdout.getvalue())
+
+
+class ProfileStartupTests(TestCase):
+    def test_parse_importtime(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     django.utils\n"
+            "import time:      2500 |       2620 |   django\n"
+            "Warmed up in 12 ms\n"
+        )
+
+        self.assertEqual(
+            parse_importtime(stderr),
+            [("django.utils", 0.00012, 0.00012), ("django", 0.0025, 0.00262)],
+        )
@@ -0,0 +1,157 @@
+import tempfile
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.caches import check_caches
+from core.db_routers import ReplicaRouter, pool, replica_reads
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Recipe, Tag
+
+TAGS_URL = reverse("recipe:tag-list")
+
+REPLICAS = ["replica_0", "replica_1"]
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS, REPLICA_HEALTH_CHECK_INTERVAL=60)
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        pool.reset()
+        patcher = patch.object(pool, "check", return_value=True)
+        self.check = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_use_primary_outside_replica_block(self):
+        self.assertEqual(self.router.db_for_read(Recipe), "default")
+
+    def test_reads_rotate_over_replicas(self):
+        with replica_reads():
+            chosen = {self.router.db_for_read(Recipe) for _ in range(4)}
+
+        self.assertEqual(chosen, set(REPLICAS))
+
+    def test_write_pins_block_to_primary(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_write(Recipe), "default")
+            self.assertEqual(self.router.db_for_read(Recipe), "default")
+
+    def test_unhealthy_replica_leaves_rotation(self):
+        self.check.side_effect = lambda alias: alias == "replica_1"
+
+        with replica_reads():
+            chosen = {self.router.db_for_read(Recipe) for _ in range(4)}
+
+        self.assertEqual(chosen, {"replica_1"})
+
+    def test_falls_back_to_primary_when_all_replicas_fail(self):
+        self.check.return_value = False
+
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Recipe), "default")
+
+    def test_health_checks_are_cached(self):
+        with replica_reads():
+            for _ in range(10):
+                self.router.db_for_read(Recipe)
+
+        self.assertEqual(self.check.call_count, len(REPLICAS))
+
+    def test_no_migrations_on_replicas(self):
+        self.assertFalse(self.router.allow_migrate("replica_0", "core"))
+        self.assertIsNone(self.router.allow_migrate("default", "core"))
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS, REPLICA_STICKY_SECONDS=30)
+class ReplicaRoutingMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        pool.reset()
+        patcher = patch.object(pool, "check", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def _call(self, request, write=False):
+        seen = {}
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Recipe)
+            seen["db"] = self.router.db_for_read(Recipe)
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(view)(request)
+        return seen["db"]
+
+    def test_safe_request_reads_from_replica(self):
+        request = self.factory.get("/", HTTP_AUTHORIZATION="Token abc")
+
+        self.assertIn(self._call(request), REPLICAS)
+
+    def test_client_sticks_to_primary_after_write(self):
+        self._call(self.factory.post("/", HTTP_AUTHORIZATION="Token abc"), write=True)
+
+        after_write = self._call(self.factory.get("/", HTTP_AUTHORIZATION="Token abc"))
+        other_client = self._call(self.factory.get("/", HTTP_AUTHORIZATION="Token xyz"))
+
+        self.assertEqual(after_write, "default")
+        self.assertIn(other_client, REPLICAS)
+
+
+SHARED_CACHE = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": tempfile.gettempdir(),
+    }
+}
+
+
+class CacheCheckTests(TestCase):
+    @override_settings(DATABASE_REPLICAS=REPLICAS)
+    def test_replicas_need_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            check_caches()
+        with override_settings(CACHES=SHARED_CACHE):
+            check_caches()
+
+    def test_local_cache_allowed_without_replicas(self):
+        check_caches()
+
+
+@skipUnless("replica" in settings.DATABASES, "needs a second database aliased 'replica'")
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaReadTests(TestCase):
+    """Runs against two real databases standing in for the primary and a replica"""
+
+    multi_db = True
+
+    def setUp(self):
+        cache.clear()
+        pool.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        # Replication is simulated by copying the rows the request depends on.
+        for obj in (self.user, token):
+            obj.save(using="replica")
+        Tag.objects.using("replica").create(user=self.user, name="On replica")
+
+    def test_reads_come_from_replica_until_client_writes(self):
+        response = self.client.get(TAGS_URL)
+        self.assertEqual([tag["name"] for tag in response.data], ["On replica"])
+
+        self.client.post(TAGS_URL, {"name": "On primary"})
+        response = self.client.get(TAGS_URL)
+        self.assertEqual([tag["name"] for tag in response.data], ["On primary"])
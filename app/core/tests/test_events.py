@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.events import Broker, LocalBackend, format_event, get_broker, replay
+from core.models import Tag
+
+EVENTS_URL = reverse("recipe:events")
+
+
+class BrokerTests(TestCase):
+    def setUp(self):
+        self.broker = Broker(LocalBackend())
+
+    def test_events_reach_only_the_users_subscriptions(self):
+        mine, other = self.broker.subscribe(1), self.broker.subscribe(2)
+
+        self.broker.publish(1, {"seq": 1})
+
+        self.assertEqual(mine.get(0), {"seq": 1})
+        self.assertIsNone(other.get(0))
+
+    @override_settings(EVENTS_BUFFER_SIZE=2)
+    def test_full_buffer_marks_overflow(self):
+        subscription = self.broker.subscribe(1)
+
+        for seq in range(3):
+            self.broker.publish(1, {"seq": seq})
+
+        self.assertTrue(subscription.overflowed)
+
+    def test_unsubscribe(self):
+        subscription = self.broker.subscribe(1)
+        self.broker.unsubscribe(subscription)
+
+        self.broker.publish(1, {"seq": 1})
+
+        self.assertIsNone(subscription.get(0))
+
+    def test_publish_before_any_subscription(self):
+        self.broker.publish(1, {"seq": 1})
+
+        self.assertIsNone(self.broker.subscribe(1).get(0))
+
+    def test_format_event(self):
+        self.assertEqual(
+            format_event({"id": 1}, event="change", event_id=7),
+            'id: 7\nevent: change\ndata: {"id":1}\n\n',
+        )
+
+
+@override_settings(EVENTS_HEARTBEAT_SECONDS=0.01, EVENTS_STREAM_MAX_SECONDS=0.05)
+class EventStreamApiTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_login_required(self):
+        response = APIClient().get(EVENTS_URL, HTTP_ACCEPT="text/event-stream")
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertTrue(response.content.startswith(b"event: error"))
+
+    def test_streams_published_changes_and_heartbeats(self):
+        response = self.client.get(EVENTS_URL, HTTP_ACCEPT="text/event-stream")
+        chunks = iter(response.streaming_content)
+        self.assertEqual(next(chunks), b"retry: 3000\n\n")
+
+        get_broker().publish(self.user.pk, {"type": "tag", "id": 1, "seq": 4, "deleted": False})
+        body = b"".join(chunks).decode()
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertIn("id: 4\nevent: change\n", body)
+        self.assertIn(": heartbeat", body)
+
+    def test_reconnect_replays_missed_changes(self):
+        first = Tag.objects.create(user=self.user, name="Vegan")
+        second = Tag.objects.create(user=self.user, name="Dessert")
+
+        response = self.client.get(EVENTS_URL, HTTP_LAST_EVENT_ID=str(first.change_seq))
+        body = b"".join(response.streaming_content).decode()
+
+        self.assertIn(f"id: {second.change_seq}\n", body)
+        self.assertNotIn(f"id: {first.change_seq}\n", body)
+
+    @override_settings(SYNC_PAGE_SIZE=1)
+    def test_reconnect_far_behind_asks_for_resync(self):
+        Tag.objects.create(user=self.user, name="Vegan")
+        Tag.objects.create(user=self.user, name="Dessert")
+
+        self.assertIsNone(replay(self.user.pk, 0, 1))
+        response = self.client.get(EVENTS_URL, HTTP_LAST_EVENT_ID="0")
+        body = b"".join(response.streaming_content).decode()
+
+        self.assertIn('event: resync\ndata: {"cursor":"0"}', body)
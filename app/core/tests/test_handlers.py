@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from core.handlers import LaneWSGIHandler
+from core.middleware import in_flight
+from core.models import RequestProfile
+from core.profiling import rate_limit
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class LaneWSGIHandlerTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.token = Token.objects.create(user=user)
+        self.handler = LaneWSGIHandler()
+        self.factory = RequestFactory()
+
+    def test_api_requests_skip_browser_middleware(self):
+        request = self.factory.get(
+            "/api/recipe/tags/", HTTP_AUTHORIZATION=f"Token {self.token.key}"
+        )
+
+        response = self.handler.get_response(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(hasattr(request, "session"))
+        self.assertFalse(response.has_header("X-Frame-Options"))
+
+    def test_other_requests_get_full_chain(self):
+        request = self.factory.get("/admin/login/")
+
+        response = self.handler.get_response(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(hasattr(request, "session"))
+        self.assertEqual(response["X-Frame-Options"], "SAMEORIGIN")
+
+    def test_api_lane_keeps_common_middleware(self):
+        request = self.factory.get("/api/recipe/tags", HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+        response = self.handler.get_response(request)
+
+        self.assertEqual(response.status_code, status.HTTP_301_MOVED_PERMANENTLY)
+        self.assertEqual(response["Location"], "/api/recipe/tags/")
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_PER_MINUTE=2)
+    def test_lanes_share_profiling_cap(self):
+        rate_limit.reset()
+        api_request = f"Token {self.token.key}"
+        for _ in range(2):
+            self.handler.get_response(
+                self.factory.get("/api/recipe/tags/", HTTP_AUTHORIZATION=api_request)
+            )
+        self.handler.get_response(self.factory.get("/admin/login/"))
+
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+    @override_settings(REQUEST_MAX_IN_FLIGHT=1)
+    def test_lanes_share_in_flight_limit(self):
+        # One request of either lane is already running.
+        self.assertTrue(in_flight.enter(1))
+        self.addCleanup(in_flight.leave)
+        api = self.factory.get("/api/recipe/tags/", HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+        admin = self.factory.get("/admin/login/")
+
+        for request in (api, admin):
+            response = self.handler.get_response(request)
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import IdempotencyKey, Recipe, Tag
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+CREATE_USER_URL = reverse("user:create")
+BATCH_URL = reverse("batch")
+
+RECIPE = {"title": "Soup", "time_in_minutes": 10, "price": "2.50", "tags": [], "ingredients": []}
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, url, data, key="key-1", client=None):
+        return (client or self.client).post(url, data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_repeat_replays_first_response(self):
+        first = self.post(RECIPES_URL, RECIPE)
+        repeat = self.post(RECIPES_URL, RECIPE)
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repeat.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repeat.data, first.data)
+        self.assertEqual(repeat["Idempotent-Replayed"], "true")
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_keys_are_per_user_and_optional(self):
+        other = get_user_model().objects.create_user("other@email.com", "1qazxsw2")
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+
+        self.post(TAGS_URL, {"name": "Vegan"})
+        self.post(TAGS_URL, {"name": "Vegan"}, client=other_client)
+        self.client.post(TAGS_URL, {"name": "Vegan"})
+        self.client.post(TAGS_URL, {"name": "Vegan"})
+
+        self.assertEqual(Tag.objects.filter(user=other).count(), 1)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+    def test_key_reused_for_different_request(self):
+        self.post(RECIPES_URL, RECIPE)
+        response = self.post(RECIPES_URL, {**RECIPE, "title": "Stew"})
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_request_in_progress(self):
+        self.post(RECIPES_URL, RECIPE)
+        IdempotencyKey.objects.update(status_code=None, response="")
+
+        response = self.post(RECIPES_URL, RECIPE)
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_abandoned_and_expired_keys_are_taken_over(self):
+        self.post(RECIPES_URL, RECIPE)
+        IdempotencyKey.objects.update(
+            status_code=None, created_at=timezone.now() - timedelta(minutes=5)
+        )
+        self.post(RECIPES_URL, RECIPE)
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.post(RECIPES_URL, RECIPE)
+
+        self.assertEqual(Recipe.objects.count(), 3)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_failed_request_releases_key(self):
+        invalid = self.post(RECIPES_URL, {"title": "Soup"})
+        retry = self.post(RECIPES_URL, RECIPE)
+
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_sign_up_replay_does_not_store_password(self):
+        payload = {"email": "new@email.com", "password": "1qazxsw2", "name": "New"}
+        first = self.post(CREATE_USER_URL, payload, client=APIClient())
+        repeat = self.post(CREATE_USER_URL, payload, client=APIClient())
+
+        self.assertEqual(repeat.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repeat.data, first.data)
+        row = IdempotencyKey.objects.get()
+        self.assertEqual(row.scope, f"anonymous:{row.fingerprint}")
+        self.assertNotIn("1qazxsw2", row.response + row.fingerprint)
+
+    def test_anonymous_clients_sharing_a_key_do_not_collide(self):
+        first = {"email": "first@email.com", "password": "1qazxsw2", "name": "First"}
+        second = {"email": "second@email.com", "password": "2wsxzaq1", "name": "Second"}
+
+        responses = [
+            self.post(CREATE_USER_URL, data, client=APIClient()) for data in (first, second)
+        ]
+
+        self.assertEqual([r.status_code for r in responses], [status.HTTP_201_CREATED] * 2)
+        self.assertEqual(responses[1].data["email"], "second@email.com")
+        self.assertFalse(responses[1].has_header("Idempotent-Replayed"))
+
+    def test_batch_does_not_pass_its_key_on(self):
+        create = {"method": "POST", "path": TAGS_URL, "body": {"name": "Vegan"}}
+        response = self.post(BATCH_URL, {"requests": [create, create]})
+
+        self.assertEqual([r["status"] for r in response.data["responses"]], [201, 201])
+        self.assertEqual(Tag.objects.count(), 2)
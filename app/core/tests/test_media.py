@@ -0,0 +1,96 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.media import parse_range
+from core.models import Recipe
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, MEDIA_ACCEL=None)
+class MediaViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.client.force_authenticate(self.user)
+
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Recipe", time_in_minutes=10, price=6.00
+        )
+        self.recipe.image.save("photo.jpg", ContentFile(b"0123456789"))
+        self.url = self.recipe.image.url
+
+    def tearDown(self):
+        self.recipe.image.delete()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_owner_gets_immutable_file(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertTrue(response["ETag"])
+
+    def test_other_user_is_refused(self):
+        other = get_user_model().objects.create_user("other@email.com", "1qazxsw2")
+        self.client.force_authenticate(other)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_auth_required(self):
+        response = APIClient().get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_range_request(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-5")
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=20-")
+
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    @override_settings(MEDIA_ACCEL="x-accel-redirect", MEDIA_ACCEL_PREFIX="/protected/")
+    def test_accel_redirect_delegates_transfer(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected/" + self.recipe.image.name)
+        self.assertEqual(response.content, b"")
+
+
+class ParseRangeTests(TestCase):
+    def test_suffix_and_open_ranges(self):
+        self.assertEqual(parse_range("bytes=-3", 10), (7, 9))
+        self.assertEqual(parse_range("bytes=4-", 10), (4, 9))
+        self.assertEqual(parse_range("bytes=4-100", 10), (4, 9))
+
+    def test_multiple_ranges_are_ignored(self):
+        self.assertIsNone(parse_range("bytes=0-1,4-5", 10))
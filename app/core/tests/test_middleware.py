@@ -0,0 +1,109 @@
+import tempfile
+import time
+from io import StringIO
+from unittest.mock import MagicMock, Mock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.middleware import RequestBudgetMiddleware, RequestDeadlineExceeded, _Budget
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+SHARED_CACHE = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": tempfile.mkdtemp(),
+    }
+}
+
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(LOAD_SHED_RETRY_AFTER=3, CACHES=SHARED_CACHE)
+class RequestBudgetMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def shed_counts(self):
+        stdout = StringIO()
+        call_command("shed_counts", stdout=stdout)
+        return stdout.getvalue()
+
+    def assertUnavailable(self, response):
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "3")
+
+    def test_within_budget(self):
+        response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.shed_counts(), "No requests were shed\n")
+
+    @override_settings(REQUEST_BUDGETS={"recipe:recipe-list": 0})
+    def test_no_queries_past_deadline(self):
+        self.assertUnavailable(self.client.get(RECIPES_URL))
+        self.assertEqual(self.client.get(TAGS_URL).status_code, status.HTTP_200_OK)
+
+        counts = self.shed_counts().splitlines()
+        self.assertEqual(counts[1].split(), ["recipe:recipe-list", "0", "0", "1"])
+
+    @override_settings(REQUEST_MAX_QUEUE_SECONDS=1)
+    def test_sheds_requests_queued_too_long(self):
+        queued = f"t={int((time.time() - 5) * 1000)}"
+        fresh = f"t={time.time():.3f}"
+
+        self.assertUnavailable(self.client.get(TAGS_URL, HTTP_X_REQUEST_START=queued))
+        response = self.client.get(TAGS_URL, HTTP_X_REQUEST_START=fresh)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("recipe:tag-list", self.shed_counts())
+
+    @override_settings(REQUEST_MAX_IN_FLIGHT=0, REQUEST_BUDGET_EXEMPT=("recipe:tag-list",))
+    def test_sheds_over_in_flight_limit_except_exempt_views(self):
+        self.assertUnavailable(self.client.get(RECIPES_URL))
+        self.assertEqual(self.client.get(TAGS_URL).status_code, status.HTTP_200_OK)
+
+        stdout = StringIO()
+        call_command("shed_counts", reset=True, stdout=stdout)
+        self.assertEqual(
+            stdout.getvalue().splitlines()[1].split()[:3], ["recipe:recipe-list", "0", "1"]
+        )
+        self.assertEqual(self.shed_counts(), "No requests were shed\n")
+
+    @override_settings(CACHES=LOCAL_CACHE)
+    def test_counts_need_shared_cache(self):
+        with self.assertRaisesMessage(CommandError, "MEMCACHED_HOSTS"):
+            self.shed_counts()
+
+    def test_statement_timeout_becomes_unavailable(self):
+        middleware = RequestBudgetMiddleware(Mock())
+        request = Mock(budget=_Budget())
+        request.budget.start("recipe:recipe-list", 5)
+        cancelled = OperationalError("canceling statement due to statement timeout")
+        cancelled.__cause__ = Exception()
+        cancelled.__cause__.pgcode = "57014"
+
+        self.assertUnavailable(middleware.process_exception(request, cancelled))
+        self.assertUnavailable(middleware.process_exception(request, RequestDeadlineExceeded()))
+        self.assertIsNone(middleware.process_exception(request, OperationalError("other")))
+
+    def test_reset_restores_default_statement_timeout(self):
+        budget = _Budget()
+        budget.timed.add("default")
+        connection = MagicMock(needs_rollback=False)
+        cursor = connection.cursor.return_value.__enter__.return_value
+
+        with patch("core.middleware.connections", {"default": connection}):
+            budget.reset()
+
+        cursor.execute.assert_called_once_with("RESET statement_timeout")
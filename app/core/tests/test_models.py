@@ -1,8 +1,6 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
-from unittest.mock import patch
-
 from core import models
 
 
@@ -52,11 +50,78 @@ class ModelTests(TestCase):
             user=sample_user(), title="Steak", time_in_minutes=5, price=5.00
         )
 
-    @patch("uuid.uuid4")
-    def test_recipe_file_name_uuid(self, mock_uuid):
-        uuid = "test-uuid"
-        mock_uuid.return_value = uuid
+    def test_recipe_file_name_keeps_extension(self):
         file_path = models.recipe_image_file_path(None, "myimage.jpg")
 
-        exp_path = f"uploads/recipe/{uuid}.jpg"
-        self.assertEqual(file_path, exp_path)
+        self.assertTrue(file_path.startswith("uploads/recipe/"))
+        self.assertTrue(file_path.endswith(".jpg"))
+
+    def test_tag_name_key_and_recipe_count(self):
+        user = sample_user()
+        tag = models.Tag.objects.create(user=user, name=" Gluten FREE")
+        recipe = models.Recipe.objects.create(user=user, title="Bread", time_in_minutes=60, price=3)
+        other = models.Recipe.objects.create(user=user, title="Cake", time_in_minutes=60, price=3)
+
+        def count():
+            tag.refresh_from_db()
+            return tag.recipe_count
+
+        self.assertEqual(tag.name_key, "gluten free")
+        recipe.tags.add(tag)
+        tag.recipe_set.add(other)
+        self.assertEqual(count(), 2)
+        recipe.tags.remove(tag)
+        self.assertEqual(count(), 1)
+        recipe.tags.add(tag)
+        other.delete()
+        self.assertEqual(count(), 1)
+        recipe.tags.clear()
+        self.assertEqual(count(), 0)
+
+    def test_user_counters_follow_creates_and_deletes(self):
+        user = sample_user()
+        tag = models.Tag.objects.create(user=user, name="Vegan")
+        models.Ingredient.objects.create(user=user, name="Salt")
+        recipe = models.Recipe.objects.create(user=user, title="Soup", time_in_minutes=5, price=2)
+        recipe.tags.add(tag)
+        tag.name = "Vegetarian"
+        tag.save()
+
+        self.assertEqual(
+            models.UserCounters.objects.counts(user.pk),
+            {"recipes": 1, "tags": 1, "ingredients": 1},
+        )
+        tag.delete()
+        recipe.delete()
+        self.assertEqual(
+            models.UserCounters.objects.counts(user.pk),
+            {"recipes": 0, "tags": 0, "ingredients": 1},
+        )
+
+    def test_reconcile_fixes_drift(self):
+        user = sample_user()
+        models.Tag.objects.create(user=user, name="Vegan")
+        models.UserCounters.objects.filter(user=user).update(tags=7, recipes=3)
+
+        self.assertEqual(models.UserCounters.objects.reconcile(), 1)
+        self.assertEqual(
+            models.UserCounters.objects.counts(user.pk),
+            {"recipes": 0, "tags": 1, "ingredients": 0},
+        )
+        self.assertEqual(models.UserCounters.objects.reconcile([user.pk]), 0)
+
+    def test_ingredients_share_canonical_ingredient(self):
+        salt = models.Ingredient.objects.create(user=sample_user(), name="Sea Salt")
+        other = get_user_model().objects.create_user("other@email.com", "1qazxsw2")
+        same = models.Ingredient.objects.create(user=other, name=" sea SALT")
+
+        self.assertIsNotNone(salt.canonical_id)
+        self.assertEqual(salt.canonical_id, same.canonical_id)
+        self.assertEqual(salt.canonical.name, "Sea Salt")
+
+        same.name = "Pepper"
+        same.save(update_fields=["name"])
+        same.refresh_from_db()
+        self.assertNotEqual(same.canonical_id, salt.canonical_id)
+        self.assertEqual(same.canonical.name_key, "pepper")
+        self.assertEqual(models.CanonicalIngredient.objects.count(), 2)
@@ -0,0 +1,120 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import RequestProfile, Tag
+from core.profiling import rate_limit
+
+TAGS_URL = reverse("recipe:tag-list")
+PROFILES_URL = reverse("profiles")
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.staff = User.objects.create_superuser("admin@email.com", "1qazxsw2")
+        self.user = User.objects.create_user("email@email.com", "1qazxsw2")
+        Tag.objects.create(user=self.staff, name="Vegan")
+        self.client = APIClient()
+        rate_limit.reset()
+
+    def get(self, user, **extra):
+        token, _ = Token.objects.get_or_create(user=user)
+        return self.client.get(TAGS_URL, HTTP_AUTHORIZATION=f"Token {token.key}", **extra)
+
+    def test_staff_header_stores_profile(self):
+        response = self.get(self.staff, HTTP_X_PROFILE="1")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile = RequestProfile.objects.get(pk=response["X-Profile-Id"])
+        self.assertEqual(profile.trigger, RequestProfile.HEADER)
+        self.assertEqual(profile.user, self.staff)
+        self.assertEqual(profile.view_name, "recipe:tag-list")
+        self.assertGreater(profile.query_count, 0)
+        self.assertIn("core_tag", profile.queries)
+        self.assertIn("TagSerializer (many)", profile.serializers)
+        self.assertIn("cumulative", profile.stats)
+
+    @override_settings(REQUEST_BUDGETS={"recipe:tag-list": 0})
+    def test_requests_past_their_budget_are_stored(self):
+        response = self.get(self.staff, HTTP_X_PROFILE="1")
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        profile = RequestProfile.objects.get(pk=response["X-Profile-Id"])
+        self.assertEqual(profile.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_header_ignored_for_other_users(self):
+        with patch("core.profiling.instrument_serializers") as instrument:
+            response = self.get(self.user, HTTP_X_PROFILE="1")
+
+        instrument.assert_not_called()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header("X-Profile-Id"))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampled_requests(self):
+        self.get(self.user)
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.trigger, RequestProfile.SAMPLE)
+        self.assertEqual(profile.user, self.user)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_PER_MINUTE=2)
+    def test_profiles_per_minute_capped(self):
+        for _ in range(3):
+            response = self.get(self.user)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_STORED=2)
+    def test_only_newest_profiles_kept(self):
+        ids = [int(self.get(self.user)["X-Profile-Id"]) for _ in range(3)]
+
+        self.assertEqual(list(RequestProfile.objects.values_list("id", flat=True)), ids[1:])
+
+
+class RequestProfileApiTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.staff = User.objects.create_superuser("admin@email.com", "1qazxsw2")
+        self.profile = RequestProfile.objects.create(
+            trigger=RequestProfile.SAMPLE,
+            method="GET",
+            path=TAGS_URL,
+            status_code=200,
+            duration_ms=12.5,
+            query_count=1,
+            query_ms=0.4,
+            queries='[{"sql": "SELECT 1", "ms": 0.4, "db": "default"}]',
+            serializers='{"TagSerializer (many)": 1.2}',
+            stats="cumulative",
+        )
+        self.client = APIClient()
+
+    def test_admins_browse_profiles(self):
+        self.client.force_authenticate(self.staff)
+
+        listing = self.client.get(PROFILES_URL, {"limit": 10})
+        detail = self.client.get(reverse("profile", args=[self.profile.pk]))
+
+        self.assertEqual(listing.status_code, status.HTTP_200_OK)
+        self.assertEqual(listing.data["results"][0]["id"], self.profile.pk)
+        self.assertNotIn("queries", listing.data["results"][0])
+        self.assertEqual(detail.data["queries"][0]["sql"], "SELECT 1")
+        self.assertEqual(detail.data["serializers"], {"TagSerializer (many)": 1.2})
+
+    def test_profiles_require_admin(self):
+        user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.client.force_authenticate(user)
+
+        self.assertEqual(self.client.get(PROFILES_URL).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(PROFILES_URL).status_code, status.HTTP_401_UNAUTHORIZED)
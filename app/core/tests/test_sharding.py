@@ -0,0 +1,166 @@
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import PendingImageDeletion, Recipe, ShardAssignment, Tag, Tombstone
+from core.sharding import (
+    HashRing,
+    ShardMoving,
+    ShardRouter,
+    copy_user,
+    get_assignment,
+    pinned_to_user,
+)
+
+TAGS_URL = reverse("recipe:tag-list")
+RECIPES_URL = reverse("recipe:recipe-list")
+
+SHARDS = ["default", "shard_1", "shard_2"]
+
+
+class HashRingTests(TestCase):
+    def test_placement_is_deterministic(self):
+        first, second = HashRing(SHARDS), HashRing(SHARDS)
+
+        self.assertEqual(
+            [first.shard_for(key) for key in range(100)],
+            [second.shard_for(key) for key in range(100)],
+        )
+
+    def test_new_shard_only_claims_some_keys(self):
+        before, after = HashRing(SHARDS), HashRing(SHARDS + ["shard_3"])
+
+        moved = [key for key in range(1000) if before.shard_for(key) != after.shard_for(key)]
+
+        self.assertTrue(moved)
+        self.assertTrue(all(after.shard_for(key) == "shard_3" for key in moved))
+        self.assertLess(len(moved), 500)
+
+
+class ShardRouterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ShardRouter()
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+
+    def test_single_shard_defers_to_next_router(self):
+        with pinned_to_user(self.user.pk):
+            self.assertIsNone(self.router.db_for_read(Tag))
+            self.assertIsNone(self.router.db_for_write(Tag))
+
+    @override_settings(DATABASE_SHARDS=["default", "shard_1"])
+    def test_directory_entry_wins_over_ring(self):
+        ShardAssignment.objects.create(user=self.user, shard="default")
+
+        with pinned_to_user(self.user.pk):
+            self.assertEqual(self.router.db_for_read(Tag), "default")
+        self.assertEqual(self.router.db_for_write(Tag, instance=Tag(user=self.user)), "default")
+        self.assertIsNone(self.router.db_for_read(get_user_model()))
+
+    @override_settings(DATABASE_SHARDS=["default", "shard_1"])
+    def test_writes_refused_while_moving(self):
+        ShardAssignment.objects.create(
+            user=self.user, shard="default", state=ShardAssignment.MOVING
+        )
+
+        with self.assertRaises(ShardMoving):
+            self.router.db_for_write(Tag, instance=Tag(user=self.user))
+
+
+@skipUnless("shard_1" in settings.DATABASES, "needs a second database aliased 'shard_1'")
+@override_settings(DATABASE_SHARDS=["default", "shard_1"])
+class ShardedApiTests(TestCase):
+    """Runs against two real databases standing in for two shards"""
+
+    multi_db = True
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        ShardAssignment.objects.create(user=self.user, shard="shard_1")
+        copy_user(self.user.pk, "shard_1")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_rows_are_written_to_and_read_from_the_users_shard(self):
+        tag = self.client.post(TAGS_URL, {"name": "Vegan"}).data
+        payload = {"title": "Soup", "time_in_minutes": 5, "price": "2.00", "tags": [tag["id"]]}
+        payload["ingredients"] = []
+        response = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Recipe.objects.using("default").exists())
+        recipe = Recipe.objects.using("shard_1").get()
+        self.assertEqual([t.name for t in recipe.tags.all()], ["Vegan"])
+        self.assertEqual(len(self.client.get(RECIPES_URL).data), 1)
+
+    def test_writes_get_503_while_moving(self):
+        ShardAssignment.objects.filter(user=self.user).update(state=ShardAssignment.MOVING)
+
+        response = self.client.post(TAGS_URL, {"name": "Vegan"})
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_move_user_shard(self):
+        tag = Tag.objects.using("shard_1").create(user=self.user, name="Vegan")
+        recipe = Recipe.objects.using("shard_1").create(
+            user=self.user, title="Soup", time_in_minutes=5, price=2
+        )
+        recipe.tags.add(tag)
+
+        call_command("move_user_shard", self.user.email, "default", wait=0, stdout=StringIO())
+
+        self.assertEqual(get_assignment(self.user.pk), ("default", ShardAssignment.ACTIVE))
+        self.assertFalse(Recipe.objects.using("shard_1").exists())
+        moved = Recipe.objects.using("default").get(pk=recipe.pk)
+        self.assertEqual([t.pk for t in moved.tags.all()], [tag.pk])
+        self.assertEqual(len(self.client.get(TAGS_URL).data), 1)
+
+    def test_move_records_no_changes(self):
+        tag = Tag.objects.using("shard_1").create(user=self.user, name="Vegan")
+        recipe = Recipe.objects.using("shard_1").create(
+            user=self.user, title="Soup", time_in_minutes=5, price=2, image="photo.jpg"
+        )
+        recipe.tags.add(tag)
+        change_seq = Recipe.objects.using("shard_1").get(pk=recipe.pk).change_seq
+
+        with patch("core.signals.publish_change") as publish:
+            call_command("move_user_shard", self.user.email, "default", wait=0, stdout=StringIO())
+            call_command("move_user_shard", self.user.email, "shard_1", wait=0, stdout=StringIO())
+
+        publish.assert_not_called()
+        self.assertFalse(Tombstone.objects.using("shard_1").exists())
+        self.assertFalse(PendingImageDeletion.objects.exists())
+        self.assertFalse(Recipe.objects.using("default").exists())
+        self.assertEqual(Recipe.objects.using("shard_1").get().change_seq, change_seq)
+
+    def test_move_keeps_source_rows_until_caches_expire(self):
+        Tag.objects.using("shard_1").create(user=self.user, name="Vegan")
+        source_rows = []
+
+        def sleep(seconds):
+            source_rows.append(Tag.objects.using("shard_1").count())
+
+        with patch("core.management.commands.move_user_shard.time.sleep", side_effect=sleep):
+            call_command("move_user_shard", self.user.email, "default", stdout=StringIO())
+
+        # Once after marking the user as moving, once after switching shards.
+        self.assertEqual(source_rows, [1, 1])
+        self.assertFalse(Tag.objects.using("shard_1").exists())
+
+    def test_deleting_user_deletes_rows_on_its_shard(self):
+        self.client.post(TAGS_URL, {"name": "Vegan"})
+
+        self.user.delete()
+
+        self.assertFalse(Tag.objects.using("shard_1").exists())
+        self.assertFalse(get_user_model().objects.using("shard_1").exists())
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.test import TestCase
+
+from core.models import ImageBlob
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def test_name_is_content_hash_with_fan_out(self):
+        name = self.storage.save("uploads/recipe/image.JPG", ContentFile(b"abc"))
+
+        digest = "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+        self.assertEqual(name, f"uploads/recipe/ba/78/{digest}.jpg")
+        self.assertTrue(self.storage.exists(name))
+
+    def test_identical_uploads_share_one_blob(self):
+        name_one = self.storage.save("uploads/recipe/image.jpg", ContentFile(b"same"))
+        name_two = self.storage.save("uploads/recipe/image.jpg", ContentFile(b"same"))
+
+        self.assertEqual(name_one, name_two)
+        self.assertEqual(ImageBlob.objects.get(name=name_one).ref_count, 2)
+        directory = os.path.dirname(self.storage.path(name_one))
+        self.assertEqual(os.listdir(directory), [os.path.basename(name_one)])
+
+    def test_delete_removes_file_after_last_reference(self):
+        name = self.storage.save("uploads/recipe/image.jpg", ContentFile(b"shared"))
+        self.storage.save("uploads/recipe/image.jpg", ContentFile(b"shared"))
+
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 1)
+
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+    def test_temporary_upload_is_moved_not_copied(self):
+        upload = TemporaryUploadedFile("photo.png", "image/png", 5, None)
+        upload.write(b"bytes")
+        upload.seek(0)
+        tmp_path = upload.temporary_file_path()
+
+        name = self.storage.save("uploads/recipe/image.png", upload)
+        upload.close()
+
+        self.assertFalse(os.path.exists(tmp_path))
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), b"bytes")
@@ -0,0 +1,42 @@
+from io import BytesIO
+
+from django.http.multipartparser import MultiPartParserError
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.serializers import ValidationError
+
+from core.uploads import LimitedTemporaryFileUploadHandler, inspect_image
+
+
+class SizedBytesIO(BytesIO):
+    @property
+    def size(self):
+        return len(self.getvalue())
+
+
+@override_settings(IMAGE_UPLOAD_MAX_BYTES=1024)
+class UploadLimitTests(TestCase):
+    def test_declared_body_too_large_is_refused_before_reading(self):
+        handler = LimitedTemporaryFileUploadHandler()
+
+        with self.assertRaises(MultiPartParserError):
+            handler.handle_raw_input(None, {}, 10 * 1024 * 1024, b"boundary")
+
+    def test_stream_stops_once_file_passes_the_limit(self):
+        handler = LimitedTemporaryFileUploadHandler()
+        handler.new_file("image", "photo.jpg", "image/jpeg", None)
+
+        handler.receive_data_chunk(b"x" * 1000, 0)
+        with self.assertRaises(MultiPartParserError):
+            handler.receive_data_chunk(b"x" * 1000, 1000)
+
+    def test_inspect_image_reads_header(self):
+        data = SizedBytesIO()
+        Image.new("RGB", (4, 3)).save(data, format="PNG")
+
+        self.assertEqual(inspect_image(data), "PNG")
+        self.assertEqual(data.tell(), 0)
+
+    def test_inspect_image_rejects_garbage(self):
+        with self.assertRaises(ValidationError):
+            inspect_image(SizedBytesIO(b"not an image"))
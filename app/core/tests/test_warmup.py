@@ -0,0 +1,52 @@
+from unittest.mock import Mock, patch
+
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, override_settings
+
+from core.handlers import LaneWSGIHandler
+from core.warmup import STEPS, release_connections, serializer_classes, warm_up
+from recipe.serializers import RecipeDetailSerializer
+from user.serializers import UserSerializer
+
+
+class WarmUpTests(TestCase):
+    def setUp(self):
+        # The cached content types would outlive the rows this test rolls back.
+        self.addCleanup(ContentType.objects.clear_cache)
+
+    def test_serializer_classes(self):
+        classes = list(serializer_classes())
+
+        self.assertIn(RecipeDetailSerializer, classes)
+        self.assertIn(UserSerializer, classes)
+
+    @override_settings(ALLOWED_HOSTS=["api.example.com"])
+    def test_runs_every_step(self):
+        with self.assertLogs("core.warmup", "INFO") as logs:
+            timings = warm_up(LaneWSGIHandler())
+
+        self.assertEqual(list(timings), [step for step, _ in STEPS])
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("Warmed up in", logs.output[0])
+
+    @override_settings(WARMUP_DATABASES=["missing"])
+    def test_failing_step_is_logged(self):
+        with self.assertLogs("core.warmup", "ERROR") as logs:
+            timings = warm_up()
+
+        self.assertIn("request", timings)
+        self.assertIn("Warm-up step databases failed", logs.output[0])
+
+    @override_settings(WARMUP_DATABASES=["shard_1"])
+    def test_only_warmed_databases_stay_connected(self):
+        connections = {
+            "default": Mock(in_atomic_block=False),
+            "shard_1": Mock(in_atomic_block=False),
+            "replica_0": Mock(in_atomic_block=True),
+        }
+        with patch("core.warmup.connections", connections):
+            release_connections(None)
+
+        connections["default"].close.assert_called_once_with()
+        connections["shard_1"].close.assert_not_called()
+        connections["replica_0"].close.assert_not_called()
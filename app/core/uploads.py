@@ -0,0 +1,146 @@
+import hashlib
+import os
+import warnings
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from django.utils.translation import gettext as _
+from PIL import Image
+from rest_framework.serializers import ValidationError
+
+# Room for the multipart boundaries and the other form fields.
+MULTIPART_OVERHEAD = 64 * 1024
+
+IMAGE_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+
+CHUNK_SIZE = 64 * 1024
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every upload to a temporary file and stops at IMAGE_UPLOAD_MAX_BYTES,
+    or at ``request.upload_max_bytes`` when a view sets one before parsing.
+    """
+
+    @property
+    def max_bytes(self):
+        return getattr(self.request, "upload_max_bytes", settings.IMAGE_UPLOAD_MAX_BYTES)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Refuse before reading a byte when the declared body is already too big.
+        if content_length > self.max_bytes + MULTIPART_OVERHEAD:
+            raise MultiPartParserError(_("Request body is too large"))
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_bytes:
+            self.file.close()
+            raise MultiPartParserError(_("Uploaded file is too large"))
+        return super().receive_data_chunk(raw_data, start)
+
+
+def inspect_image(file_object):
+    """
+    Check an uploaded image against the upload limits from its header alone.
+
+    ``Image.open`` only parses the header, so the byte, format, dimension and
+    pixel-count checks all happen before anything would decode the pixels.
+    Returns the Pillow format name.
+    """
+    if file_object.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+        raise ValidationError(_("Image file is too large"), code="max_bytes")
+
+    file_object.seek(0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            image = Image.open(file_object)
+    except (Image.DecompressionBombWarning, Image.DecompressionBombError):
+        raise ValidationError(_("Image has too many pixels"), code="max_pixels")
+    except (OSError, SyntaxError, ValueError):
+        raise ValidationError(_("Upload a valid image"), code="invalid_image")
+    finally:
+        file_object.seek(0)
+
+    width, height = image.size
+    if image.format not in IMAGE_FORMATS:
+        raise ValidationError(_("Unsupported image format"), code="invalid_format")
+    if max(width, height) > settings.IMAGE_UPLOAD_MAX_DIMENSION:
+        raise ValidationError(_("Image dimensions are too large"), code="max_dimension")
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise ValidationError(_("Image has too many pixels"), code="max_pixels")
+    return image.format
+
+
+class UploadOffsetMismatch(Exception):
+    """The chunk doesn't start where the data received so far ends"""
+
+
+class AssembledFile(File):
+    """A finished part file; storages move it into place instead of copying it"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def append_chunk(session, index, offset, stream, length, checksum):
+    """
+    Append chunk ``index`` of ``length`` bytes read from ``stream`` to the
+    session's part file, verifying its SHA-256 ``checksum`` on the way.
+
+    A retransmitted chunk that was already acknowledged is accepted without
+    reading it again. The session is expected to be locked by the caller.
+    """
+    if index < session.next_chunk and offset < session.offset:
+        return session
+    if index != session.next_chunk or offset != session.offset:
+        raise UploadOffsetMismatch
+    if length > settings.IMAGE_UPLOAD_CHUNK_MAX_BYTES:
+        raise ValidationError(_("Chunk is too large"), code="max_chunk_bytes")
+    if offset + length > session.size:
+        raise ValidationError(_("Chunk runs past the declared size"), code="size")
+
+    os.makedirs(settings.UPLOAD_SESSION_ROOT, exist_ok=True)
+    hasher = hashlib.sha256()
+    received = 0
+    with open(session.path, "ab") as part:
+        # Drop whatever an interrupted attempt left past the last good offset.
+        part.truncate(offset)
+        while received < length:
+            data = stream.read(min(CHUNK_SIZE, length - received))
+            if not data:
+                break
+            hasher.update(data)
+            part.write(data)
+            received += len(data)
+
+        if received != length or hasher.hexdigest() != checksum.lower():
+            part.truncate(offset)
+            raise ValidationError(_("Chunk checksum mismatch"), code="checksum")
+
+    session.offset += length
+    session.next_chunk += 1
+    session.save(update_fields=["offset", "next_chunk", "updated_at"])
+    return session
+
+
+def open_assembled_file(session):
+    """Return the complete part file of ``session`` once it passes validation"""
+    if session.offset != session.size:
+        raise UploadOffsetMismatch
+
+    assembled = AssembledFile(open(session.path, "rb"), name=session.filename)
+    if session.checksum:
+        hasher = hashlib.sha256()
+        for data in assembled.chunks(CHUNK_SIZE):
+            hasher.update(data)
+        if hasher.hexdigest() != session.checksum.lower():
+            assembled.close()
+            raise ValidationError(_("File checksum mismatch"), code="checksum")
+    try:
+        inspect_image(assembled)
+    except ValidationError:
+        assembled.close()
+        raise
+    return assembled
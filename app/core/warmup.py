@@ -0,0 +1,127 @@
+import inspect
+import io
+import logging
+import time
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import get_resolver
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def _populate_resolvers(resolver):
+    # Reading reverse_dict builds the lookup tables of the resolver and of
+    # every namespace under it, which the first reverse() would otherwise do.
+    resolver.reverse_dict
+    for _, sub_resolver in resolver.namespace_dict.values():
+        _populate_resolvers(sub_resolver)
+
+
+def _build_fields(serializer):
+    for field in serializer.fields.values():
+        field = getattr(field, "child", field)
+        if isinstance(field, BaseSerializer):
+            _build_fields(field)
+
+
+def serializer_classes():
+    for module_name in settings.WARMUP_SERIALIZER_MODULES:
+        module = import_module(module_name)
+        for _, value in inspect.getmembers(module, inspect.isclass):
+            if issubclass(value, BaseSerializer) and value.__module__ == module_name:
+                yield value
+
+
+def warm_urls(application):
+    _populate_resolvers(get_resolver())
+
+
+def warm_models(application):
+    for model in apps.get_models():
+        model._meta.get_fields()
+
+
+def warm_serializers(application):
+    for serializer_class in serializer_classes():
+        _build_fields(serializer_class())
+
+
+def warm_databases(application):
+    for alias in settings.WARMUP_DATABASES:
+        connections[alias].ensure_connection()
+
+
+def warm_caches(application):
+    ContentType.objects.get_for_models(*apps.get_models())
+
+
+def warm_request(application):
+    if application is not None:
+        application.get_response(_request(settings.WARMUP_PATH)).close()
+
+
+def release_connections(application):
+    # The other steps query the database too. Left open, those connections
+    # would be shared with any worker forked from this process.
+    for alias in connections:
+        connection = connections[alias]
+        if alias not in settings.WARMUP_DATABASES and not connection.in_atomic_block:
+            connection.close()
+
+
+STEPS = [
+    ("urls", warm_urls),
+    ("models", warm_models),
+    ("serializers", warm_serializers),
+    ("databases", warm_databases),
+    ("caches", warm_caches),
+    ("request", warm_request),
+    ("connections", release_connections),
+]
+
+
+def warm_up(application=None):
+    """
+    Do the lazy work of the first requests up front: URL resolvers, model
+    metadata, serializer fields, connections to WARMUP_DATABASES and the
+    content type cache, then one request to WARMUP_PATH through
+    ``application``. Other connections are closed again. Returns the seconds
+    each step took; a failing step is logged and skipped.
+    """
+    timings = {}
+    for step, function in STEPS:
+        start = time.perf_counter()
+        try:
+            function(application)
+        except Exception:
+            logger.exception("Warm-up step %s failed", step)
+        timings[step] = time.perf_counter() - start
+    logger.info(
+        "Warmed up in %.0f ms (%s)",
+        sum(timings.values()) * 1000,
+        ", ".join(f"{step} {seconds * 1000:.0f} ms" for step, seconds in timings.items()),
+    )
+    return timings
+
+
+def _request(path):
+    host = next(
+        (h for h in settings.ALLOWED_HOSTS if h != "*" and not h.startswith(".")), "localhost"
+    )
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": host,
+        "SERVER_PORT": "80",
+        "HTTP_ACCEPT": "application/json",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.url_scheme": "http",
+    }
+    return WSGIRequest(environ)
@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class RecipeConfig(AppConfig):
     name = "recipe"
+
+    def ready(self):
+        import atexit
+
+        from django.core.signals import request_finished
+
+        from recipe.popularity import view_counter
+
+        request_finished.connect(view_counter.flush_if_due, dispatch_uid="recipe_view_counter")
+        atexit.register(view_counter.close)
@@ -0,0 +1,280 @@
+import csv
+import io
+import itertools
+import json
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from core.events import publish_change
+from core.models import (
+    CanonicalIngredient,
+    ChangeCounter,
+    ImportJob,
+    Ingredient,
+    Recipe,
+    Tag,
+    UserCounters,
+    normalize_name,
+)
+from core.sharding import shard_for_user
+from recipe.serializers import RecipeImportRowSerializer
+
+READ_SIZE = 64 * 1024
+# A single recipe larger than this is treated as malformed JSON.
+MAX_ITEM_CHARS = 1024 * 1024
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Names per IN (...) lookup, under SQLite's limit on query parameters.
+LOOKUP_BATCH_SIZE = 500
+
+
+def _text(stream):
+    return stream if isinstance(stream, io.TextIOBase) else io.TextIOWrapper(stream, "utf-8")
+
+
+class _JsonReader:
+    """Rolling buffer over a text stream for decoding one JSON value at a time"""
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self, stream, read_size):
+        self.stream = stream
+        self.read_size = read_size
+        self.buffer, self.position, self.eof = "", 0, False
+
+    def read_more(self):
+        more = self.stream.read(self.read_size)
+        self.buffer, self.position, self.eof = self.buffer[self.position :] + more, 0, not more
+
+    def next_char(self):
+        """Skip whitespace and return the next character, empty at the end of the file"""
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer) or self.eof:
+                return self.buffer[self.position : self.position + 1]
+            self.read_more()
+
+    def take(self, char):
+        if self.next_char() != char:
+            return False
+        self.position += 1
+        return True
+
+    def value(self):
+        while True:
+            self.next_char()
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as error:
+                if self.eof or len(self.buffer) - self.position > MAX_ITEM_CHARS:
+                    raise ValueError(f"Invalid JSON in recipe file: {error.msg}")
+            else:
+                # A number could go on in the part of the file not read yet.
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            self.read_more()
+
+
+def iter_json_array(stream, read_size=READ_SIZE):
+    """Yield the items of a top-level JSON array without reading the whole document"""
+    reader = _JsonReader(_text(stream), read_size)
+    if not reader.take("["):
+        raise ValueError("Expected a JSON array of recipes")
+    if reader.take("]"):
+        return
+    while True:
+        yield reader.value()
+        if reader.take("]"):
+            return
+        if not reader.take(","):
+            raise ValueError("Expected ',' or ']' between recipes in JSON")
+
+
+def iter_csv_rows(stream):
+    """Yield CSV rows as dicts; tags and ingredients are separated by semicolons"""
+    for row in csv.DictReader(_text(stream)):
+        for key in ("tags", "ingredients"):
+            row[key] = [name.strip() for name in (row.get(key) or "").split(";") if name.strip()]
+        yield row
+
+
+PARSERS = {"json": iter_json_array, "csv": iter_csv_rows}
+
+
+class RecipeImporter:
+    """
+    Imports recipes for ``job.user`` in transactions of ``chunk_size`` rows,
+    recording progress on the job after each one.
+    """
+
+    def __init__(self, job, chunk_size=None, on_chunk=None):
+        self.job = job
+        self.user_id = job.user_id
+        self.using = shard_for_user(job.user_id)
+        self.chunk_size = chunk_size or settings.RECIPE_IMPORT_CHUNK_SIZE
+        self.on_chunk = on_chunk
+        self.errors = []
+
+    def run(self, rows):
+        self.update(state=ImportJob.RUNNING)
+        self.read_error = None
+        numbered = enumerate(self.read(rows), start=1)
+        for chunk in iter(lambda: list(itertools.islice(numbered, self.chunk_size)), []):
+            self.import_chunk(chunk)
+            if self.on_chunk is not None:
+                self.on_chunk(self.job)
+        if self.read_error is not None:
+            self.add_error(None, self.read_error)
+            self.update(state=ImportJob.FAILED)
+        else:
+            self.update(state=ImportJob.DONE)
+
+    def read(self, rows):
+        # Stop at a malformed file, keeping the rows read before it.
+        try:
+            yield from rows
+        except (ValueError, csv.Error) as error:
+            self.read_error = str(error)
+
+    def update(self, **fields):
+        fields.update(errors=json.dumps(self.errors), updated_at=timezone.now())
+        for name, value in fields.items():
+            setattr(self.job, name, value)
+        ImportJob.objects.using(self.using).filter(pk=self.job.pk).update(**fields)
+
+    def add_error(self, line, errors):
+        if len(self.errors) < settings.RECIPE_IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    def import_chunk(self, chunk):
+        valid = []
+        for line, row in chunk:
+            if not isinstance(row, dict):
+                self.add_error(line, "Expected an object")
+                continue
+            serializer = RecipeImportRowSerializer(data=row)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                self.add_error(line, serializer.errors)
+
+        if valid:
+            with transaction.atomic(using=self.using):
+                self.insert(valid)
+        self.update(
+            processed=self.job.processed + len(chunk),
+            created=self.job.created + len(valid),
+            failed=self.job.failed + len(chunk) - len(valid),
+        )
+
+    def reserve_seqs(self, count):
+        last = ChangeCounter.objects.db_manager(self.using).advance(self.user_id, count)
+        return range(last - count + 1, last + 1)
+
+    def resolve(self, model, names):
+        """Map ``names`` to the ids of the user's rows, creating the missing ones"""
+        rows = model.objects.using(self.using).filter(user_id=self.user_id)
+        ids = {}
+        names = sorted(names)
+        for start in range(0, len(names), LOOKUP_BATCH_SIZE):
+            batch = names[start : start + LOOKUP_BATCH_SIZE]
+            for name, pk in rows.filter(name__in=batch).order_by("-id").values_list("name", "id"):
+                ids[name] = pk
+
+        missing = [name for name in names if name not in ids]
+        if missing:
+            counter = "tags" if model is Tag else "ingredients"
+            UserCounters.objects.db_manager(self.using).add(self.user_id, **{counter: len(missing)})
+            seqs = self.reserve_seqs(len(missing))
+            extra = {}
+            if model is Ingredient:
+                canonical_ids = CanonicalIngredient.objects.ids_for(missing)
+                extra = {
+                    name: {"canonical_id": canonical_ids[normalize_name(name)]} for name in missing
+                }
+            model.objects.using(self.using).bulk_create(
+                model(
+                    user_id=self.user_id,
+                    name=name,
+                    name_key=normalize_name(name),
+                    change_seq=seq,
+                    **extra.get(name, {}),
+                )
+                for name, seq in zip(missing, seqs)
+            )
+            created = rows.filter(change_seq__gte=seqs[0], change_seq__lte=seqs[-1])
+            for name, pk, seq in created.values_list("name", "id", "change_seq"):
+                ids[name] = pk
+                self.publish(model, pk, seq)
+        return ids
+
+    def insert(self, valid):
+        tag_ids = self.resolve(Tag, {name for data in valid for name in data["tags"]})
+        ingredient_ids = self.resolve(
+            Ingredient, {name for data in valid for name in data["ingredients"]}
+        )
+
+        seqs = self.reserve_seqs(len(valid))
+        recipes = []
+        for data, seq in zip(valid, seqs):
+            fields = {k: v for k, v in data.items() if k not in ("tags", "ingredients")}
+            recipes.append(Recipe(user_id=self.user_id, change_seq=seq, **fields))
+        Recipe.objects.using(self.using).bulk_create(recipes)
+        UserCounters.objects.db_manager(self.using).add(self.user_id, recipes=len(recipes))
+        # Not every backend returns ids from a bulk insert; the change numbers are unique.
+        created = Recipe.objects.using(self.using).filter(
+            user_id=self.user_id, change_seq__gte=seqs[0], change_seq__lte=seqs[-1]
+        )
+        ids = dict(created.values_list("change_seq", "id"))
+
+        recipe_tags, recipe_ingredients = [], []
+        for data, seq in zip(valid, seqs):
+            recipe_id = ids[seq]
+            recipe_tags += [
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_ids[name])
+                for name in set(data["tags"])
+            ]
+            recipe_ingredients += [
+                Recipe.ingredients.through(recipe_id=recipe_id, ingredient_id=ingredient_ids[name])
+                for name in set(data["ingredients"])
+            ]
+            self.publish(Recipe, recipe_id, seq)
+        Recipe.tags.through.objects.using(self.using).bulk_create(recipe_tags)
+        Recipe.ingredients.through.objects.using(self.using).bulk_create(recipe_ingredients)
+        for model, ids in ((Tag, tag_ids), (Ingredient, ingredient_ids)):
+            ids = sorted(set(ids.values()))
+            for start in range(0, len(ids), LOOKUP_BATCH_SIZE):
+                batch = ids[start : start + LOOKUP_BATCH_SIZE]
+                model.objects.db_manager(self.using).recount(pk__in=batch)
+
+    def publish(self, model, pk, seq):
+        publish_change(self.user_id, model._meta.model_name, pk, seq, self.using)
+
+
+def run_import_file(job):
+    """Import the file uploaded for ``job`` and remove it afterwards"""
+    try:
+        with open(job.path, "rb") as stream:
+            RecipeImporter(job).run(PARSERS[job.format](stream))
+    finally:
+        if os.path.exists(job.path):
+            os.remove(job.path)
+
+
+def start_import(job):
+    if not settings.RECIPE_IMPORT_IN_BACKGROUND:
+        run_import_file(job)
+        return
+
+    def target():
+        try:
+            run_import_file(job)
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=target, daemon=True).start()
@@ -0,0 +1,142 @@
+import collections
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Case, F, FloatField, IntegerField, Value, When
+from django.utils import timezone
+
+from core.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Scores count half-lives since this moment, so they only ever grow slowly.
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+# Recipes per UPDATE; each one takes five query parameters, and SQLite allows 999.
+FLUSH_BATCH_SIZE = 150
+
+
+def add_views(score, views, now):
+    """
+    Add ``views`` seen at ``now`` to a popularity ``score``.
+
+    Scores are base-2 logarithms of the views weighted by 2 ** (half-lives
+    since EPOCH), so a view is worth half as much as one a half-life newer and
+    ordering by the score ranks recipes by their decayed view counts.
+    """
+    age = (now - EPOCH).total_seconds() / settings.RECIPE_POPULARITY_HALF_LIFE
+    added = age + math.log2(views)
+    if not score:
+        return added
+    high, low = max(score, added), min(score, added)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+class ViewCounter:
+    """
+    Counts recipe views in memory and adds them to the recipe rows in one
+    UPDATE per batch of recipes at most every RECIPE_VIEWS_FLUSH_SECONDS, so
+    busy recipes are not rewritten on every read. A crash loses the views since
+    the last flush.
+
+    Views are kept by ``(user id, recipe id)`` and written to the database the
+    router picks for writing that user's recipes when flushing, never to the
+    replica a recipe may have been read from.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = collections.Counter()
+        self._flushed_at = time.monotonic()
+
+    def record(self, recipe):
+        with self._lock:
+            self._pending[recipe.user_id, recipe.pk] += 1
+
+    def discard(self):
+        """Forget the views counted so far, as the test runner does before tearing down"""
+        with self._lock:
+            self._pending.clear()
+
+    def flush_if_due(self, **kwargs):
+        if time.monotonic() - self._flushed_at >= settings.RECIPE_VIEWS_FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self, keep_failed=True):
+        """
+        Write out the views counted so far, returning how many there were.
+        Views that cannot be written are kept for the next flush, or with
+        ``keep_failed=False`` logged and dropped.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, collections.Counter()
+            self._flushed_at = time.monotonic()
+
+        now = timezone.now()
+        flushed = 0
+        for using, counts in self._by_database(pending, keep_failed).items():
+            keys = sorted(counts)
+            for start in range(0, len(keys), FLUSH_BATCH_SIZE):
+                batch = {key: counts[key] for key in keys[start : start + FLUSH_BATCH_SIZE]}
+                try:
+                    self.write(using, {pk: views for (_, pk), views in batch.items()}, now)
+                except Exception:
+                    self._failed(batch, keep_failed)
+                else:
+                    flushed += sum(batch.values())
+        return flushed
+
+    def close(self):
+        """Flush at interpreter exit, when failures can no longer be retried"""
+        self.flush(keep_failed=False)
+
+    def _by_database(self, pending, keep_failed):
+        by_user = collections.defaultdict(dict)
+        for key, count in pending.items():
+            by_user[key[0]][key] = count
+        by_database = collections.defaultdict(dict)
+        for user_id, views in by_user.items():
+            try:
+                using = router.db_for_write(Recipe, instance=Recipe(user_id=user_id))
+            except Exception:
+                # E.g. ShardMoving while the user's rows are being moved.
+                self._failed(views, keep_failed)
+            else:
+                by_database[using].update(views)
+        return by_database
+
+    def _failed(self, views, keep_failed):
+        if keep_failed:
+            logger.exception("Could not save recipe views, keeping them for next time")
+            with self._lock:
+                self._pending.update(views)
+        else:
+            logger.warning("Could not save %d recipe views, dropping them", sum(views.values()))
+
+    def write(self, using, counts, now):
+        recipes = Recipe.objects.using(using)
+        with transaction.atomic(using=using):
+            rows = recipes.select_for_update().filter(pk__in=list(counts))
+            scores = {
+                pk: add_views(score, counts[pk], now)
+                for pk, score in rows.values_list("pk", "popularity")
+            }
+            if scores:
+                recipes.filter(pk__in=list(scores)).update(
+                    view_count=F("view_count")
+                    + Case(
+                        *(When(pk=pk, then=Value(counts[pk])) for pk in scores),
+                        output_field=IntegerField(),
+                    ),
+                    popularity=Case(
+                        *(When(pk=pk, then=Value(score)) for pk, score in scores.items()),
+                        output_field=FloatField(),
+                    ),
+                )
+
+
+view_counter = ViewCounter()
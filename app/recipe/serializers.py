@@ -1,4 +1,10 @@
-from core.models import Ingredient, Recipe, Tag
+import json
+import os
+import re
+
+from core.models import ImageUploadSession, ImportJob, Ingredient, Recipe, Tag, Tombstone
+from core.uploads import inspect_image
+from django.conf import settings
 from rest_framework import serializers
 
 
@@ -25,7 +31,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ("id", "title", "ingredients", "tags", "time_in_minutes", "price", "link")
 
-        read_only_fields = "id"
+        read_only_fields = ("id",)
 
 
 class RecipeDetailSerializer(RecipeSerializer):
@@ -33,8 +39,109 @@ class RecipeDetailSerializer(RecipeSerializer):
     tags = TagSerializer(many=True, read_only=True)
 
 
+class RecipeBatchSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_ids(self, value):
+        if len(value) > settings.RECIPE_BATCH_MAX_IDS:
+            raise serializers.ValidationError(
+                f"Ask for at most {settings.RECIPE_BATCH_MAX_IDS} recipes at a time"
+            )
+        return list(dict.fromkeys(value))
+
+
+class TombstoneSerializer(serializers.ModelSerializer):
+    type = serializers.CharField(source="model")
+    id = serializers.IntegerField(source="object_id")
+
+    class Meta:
+        model = Tombstone
+        fields = ("type", "id")
+
+
+class RecipeImageField(serializers.FileField):
+    """Image upload validated from its header, without a full Pillow decode"""
+
+    def to_internal_value(self, data):
+        file_object = super().to_internal_value(data)
+        inspect_image(file_object)
+        return file_object
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
+    image = RecipeImageField()
+
     class Meta:
         model = Recipe
         fields = ("id", "image")
         read_only_fields = ("id",)
+
+
+class ImageUploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImageUploadSession
+        fields = ("id", "filename", "size", "checksum", "offset", "next_chunk")
+        read_only_fields = ("id", "offset", "next_chunk")
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Size must be positive")
+        if value > settings.IMAGE_UPLOAD_MAX_BYTES:
+            raise serializers.ValidationError("Image file is too large")
+        return value
+
+    def validate_checksum(self, value):
+        if value and not re.fullmatch(r"[0-9a-fA-F]{64}", value):
+            raise serializers.ValidationError("Checksum must be a SHA-256 hex digest")
+        return value.lower()
+
+
+class RecipeImportRowSerializer(serializers.ModelSerializer):
+    """One recipe of an import file, naming its tags and ingredients"""
+
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=255), required=False, default=list
+    )
+    ingredients = serializers.ListField(
+        child=serializers.CharField(max_length=255), required=False, default=list
+    )
+
+    class Meta:
+        model = Recipe
+        fields = ("title", "time_in_minutes", "price", "link", "tags", "ingredients")
+
+
+class RecipeImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=("json", "csv"), required=False)
+
+    def validate(self, attrs):
+        if "format" not in attrs:
+            extension = os.path.splitext(attrs["file"].name)[1].lstrip(".").lower()
+            if extension not in ("json", "csv"):
+                raise serializers.ValidationError({"format": "Give the format of the file"})
+            attrs["format"] = extension
+        return attrs
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    errors = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = (
+            "id",
+            "filename",
+            "format",
+            "state",
+            "processed",
+            "created",
+            "failed",
+            "errors",
+            "created_at",
+            "updated_at",
+        )
+        read_only_fields = fields
+
+    def get_errors(self, job):
+        return json.loads(job.errors)
@@ -0,0 +1,127 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+from recipe.popularity import ViewCounter, add_views, view_counter
+
+RECIPES_URL = reverse("recipe:recipe-list")
+HALF_LIFE = 60 * 60
+
+
+def detail_url(recipe_id):
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def sample_recipe(user, **params):
+    defaults = {"title": "Recipe", "time_in_minutes": 10, "price": 6.00}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+@override_settings(RECIPE_POPULARITY_HALF_LIFE=HALF_LIFE)
+class AddViewsTests(TestCase):
+    def test_views_lose_half_their_weight_each_half_life(self):
+        now = timezone.now()
+        earlier = now - timedelta(seconds=HALF_LIFE)
+
+        self.assertAlmostEqual(add_views(0, 2, earlier), add_views(0, 1, now))
+        self.assertAlmostEqual(add_views(add_views(0, 2, earlier), 1, now), add_views(0, 2, now))
+        self.assertGreater(add_views(0, 1, now), add_views(0, 1, earlier))
+
+
+class ViewCounterTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.counter = ViewCounter()
+
+    def test_flush_adds_buffered_views_in_bulk(self):
+        soup = sample_recipe(self.user, title="Soup")
+        cake = sample_recipe(self.user, title="Cake")
+        for recipe in (soup, soup, cake):
+            self.counter.record(recipe)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.counter.flush(), 3)
+        updates = [q for q in queries.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        soup.refresh_from_db()
+        cake.refresh_from_db()
+        self.assertEqual((soup.view_count, cake.view_count), (2, 1))
+        self.assertGreater(soup.popularity, cake.popularity)
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_failed_flush_keeps_views(self):
+        soup = sample_recipe(self.user)
+        self.counter.record(soup)
+
+        with patch.object(ViewCounter, "write", side_effect=RuntimeError):
+            with self.assertLogs("recipe.popularity", "ERROR"):
+                self.assertEqual(self.counter.flush(), 0)
+        self.assertEqual(self.counter.flush(), 1)
+        soup.refresh_from_db()
+        self.assertEqual(soup.view_count, 1)
+
+    @override_settings(DATABASE_REPLICAS=["replica"])
+    def test_views_read_on_replica_are_written_to_primary(self):
+        soup = sample_recipe(self.user)
+        read_on_replica = Recipe.objects.get(pk=soup.pk)
+        read_on_replica._state.db = "replica"
+        self.counter.record(read_on_replica)
+
+        self.assertEqual(self.counter.flush(), 1)
+        soup.refresh_from_db()
+        self.assertEqual(soup.view_count, 1)
+
+    def test_close_drops_views_it_cannot_save(self):
+        self.counter.record(sample_recipe(self.user))
+
+        with patch.object(ViewCounter, "write", side_effect=DatabaseError("no such table")):
+            with self.assertLogs("recipe.popularity", "WARNING") as logs:
+                self.counter.close()
+        self.assertIn("dropping", logs.output[0])
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_save_keeps_flushed_views(self):
+        soup = sample_recipe(self.user)
+        self.counter.record(soup)
+        self.counter.flush()
+
+        soup.title = "Tomato soup"
+        soup.save()
+        soup.refresh_from_db()
+        self.assertEqual((soup.title, soup.view_count), ("Tomato soup", 1))
+
+
+@override_settings(RECIPE_VIEWS_FLUSH_SECONDS=0)
+class RecipeViewsApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.client.force_authenticate(self.user)
+        view_counter.flush()
+
+    def test_retrieve_counts_views_and_orders_by_them(self):
+        soup = sample_recipe(self.user, title="Soup")
+        cake = sample_recipe(self.user, title="Cake")
+        sample_recipe(self.user, title="Stew")
+        for recipe in (cake, soup, cake):
+            response = self.client.get(detail_url(recipe.id))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        most_viewed = self.client.get(RECIPES_URL, {"ordering": "-view_count"})
+        trending = self.client.get(RECIPES_URL, {"ordering": "-popularity"})
+
+        self.assertEqual([r["title"] for r in most_viewed.data], ["Cake", "Soup", "Stew"])
+        self.assertEqual([r["title"] for r in trending.data], ["Cake", "Soup", "Stew"])
+        self.assertNotIn("view_count", most_viewed.data[0])
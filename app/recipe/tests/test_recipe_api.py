@@ -1,20 +1,23 @@
+import hashlib
+import io
 import tempfile
 import os
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Recipe, Tag, Ingredient
+from core.models import ImageUploadSession, Recipe, Tag, Ingredient, UserCounters
 
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 RECIPES_URL = reverse("recipe:recipe-list")
+BATCH_URL = reverse("recipe:recipe-batch")
 
 
 def image_upload_url(recipe_id):
@@ -179,6 +182,93 @@ class PrivateRecipeApiTest(TestCase):
         tags = recipe.tags.all()
         self.assertEqual(len(tags), 0)
 
+    def test_filter_recipes_by_price_and_time(self):
+        cheap = sample_recipe(user=self.user, title="Cheap", price=4, time_in_minutes=10)
+        sample_recipe(user=self.user, title="Dear", price=20, time_in_minutes=10)
+        sample_recipe(user=self.user, title="Slow", price=4, time_in_minutes=90)
+
+        response = self.client.get(RECIPES_URL, {"max_price": "10", "max_time": "30"})
+
+        self.assertEqual([r["id"] for r in response.data], [cheap.id])
+        response = self.client.get(RECIPES_URL, {"min_price": "5"})
+        self.assertEqual([r["title"] for r in response.data], ["Dear"])
+
+    def test_invalid_range_filter(self):
+        for params in ({"max_price": "cheap"}, {"min_price": "NaN"}, {"max_time": "1.5"}):
+            response = self.client.get(RECIPES_URL, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ordering_breaks_ties_by_id(self):
+        first = sample_recipe(user=self.user, title="B", price=5)
+        second = sample_recipe(user=self.user, title="A", price=5)
+        cheapest = sample_recipe(user=self.user, title="C", price=1)
+
+        response = self.client.get(RECIPES_URL, {"ordering": "price"})
+        self.assertEqual([r["id"] for r in response.data], [cheapest.id, first.id, second.id])
+        response = self.client.get(RECIPES_URL, {"ordering": "-price"})
+        self.assertEqual([r["id"] for r in response.data], [second.id, first.id, cheapest.id])
+        response = self.client.get(RECIPES_URL, {"ordering": "price,title"})
+        self.assertEqual([r["id"] for r in response.data], [cheapest.id, second.id, first.id])
+
+    def test_ordering_outside_allowlist(self):
+        response = self.client.get(RECIPES_URL, {"ordering": "user__password"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_limit_paginates(self):
+        recipes = [sample_recipe(user=self.user, price=price) for price in (3, 1, 2)]
+
+        response = self.client.get(RECIPES_URL, {"ordering": "price", "limit": 2, "offset": 1})
+
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(
+            [r["id"] for r in response.data["results"]], [recipes[2].id, recipes[0].id]
+        )
+
+    def test_batch_retrieve(self):
+        recipes = [sample_recipe(user=self.user, title=f"Recipe {n}") for n in range(3)]
+        for recipe in recipes:
+            recipe.tags.add(sample_tag(user=self.user))
+            recipe.ingredients.add(sample_ingredient(user=self.user))
+        other = get_user_model().objects.create_user("other@email.com", "1qazxsw2")
+        foreign = sample_recipe(user=other)
+        ids = [recipes[2].id, foreign.id, recipes[0].id, 9999, recipes[1].id]
+
+        with self.assertNumQueries(3):
+            response = self.client.get(BATCH_URL, {"ids": ",".join(map(str, ids))})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = RecipeDetailSerializer([recipes[2], recipes[0], recipes[1]], many=True).data
+        self.assertEqual(response.data["recipes"], expected)
+        self.assertEqual(response.data["missing"], [foreign.id, 9999])
+
+    def test_batch_retrieve_post(self):
+        recipe = sample_recipe(user=self.user)
+
+        response = self.client.post(BATCH_URL, {"ids": [recipe.id, recipe.id]}, format="json")
+
+        self.assertEqual([r["id"] for r in response.data["recipes"]], [recipe.id])
+
+    @override_settings(RECIPE_BATCH_MAX_IDS=2)
+    def test_batch_retrieve_limits(self):
+        for ids in ("", "1,2,3", "1,x"):
+            response = self.client.get(BATCH_URL, {"ids": ids})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unfiltered_totals_come_from_counters(self):
+        sample_recipe(user=self.user)
+        sample_recipe(user=self.user, price=20)
+        # Counters are trusted over the rows; a changed one shows it is not recounted.
+        UserCounters.objects.filter(user=self.user).update(recipes=9)
+
+        response = self.client.get(RECIPES_URL, {"limit": 1, "include": "counts"})
+        self.assertEqual(response.data["count"], 9)
+        self.assertEqual(response["X-Total-Count"], "9")
+
+        response = self.client.get(RECIPES_URL, {"limit": 1, "max_price": 10, "include": "counts"})
+        self.assertEqual(response.data["count"], 1)
+        self.assertFalse(response.has_header("X-Total-Count"))
+
 
 class RecipeImageUploadTests(TestCase):
     def setUp(self):
@@ -210,6 +300,40 @@ class RecipeImageUploadTests(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def _post_image(self, size=(10, 10), image_format="JPEG"):
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            Image.new("RGB", size).save(ntf, format=image_format)
+            ntf.seek(0)
+            return self.client.post(url, {"image": ntf}, format="multipart")
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=200)
+    def test_upload_image_too_many_bytes(self):
+        response = self._post_image(size=(200, 200), image_format="BMP")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(IMAGE_UPLOAD_MAX_DIMENSION=50)
+    def test_upload_image_too_wide(self):
+        response = self._post_image(size=(60, 10))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", response.data)
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=99)
+    def test_upload_image_too_many_pixels(self):
+        response = self._post_image(size=(10, 10))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", response.data)
+
+    def test_upload_image_unsupported_format(self):
+        response = self._post_image(image_format="BMP")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_filter_recipes_by_tags(self):
         recipe_one = sample_recipe(user=self.user, title="Curry")
         recipe_two = sample_recipe(user=self.user, title="Tahini")
@@ -229,7 +353,7 @@ class RecipeImageUploadTests(TestCase):
 
         self.assertIn(serializer_one.data, response.data)
         self.assertIn(serializer_two.data, response.data)
-        # self.assertNotIn(serializer_three.data, response.data)
+        self.assertNotIn(serializer_three.data, response.data)
 
     def test_filter_recipes_by_ingredients(self):
         recipe_one = sample_recipe(user=self.user, title="Cubios")
@@ -253,4 +377,120 @@ class RecipeImageUploadTests(TestCase):
 
         self.assertIn(serializer_one.data, response.data)
         self.assertIn(serializer_two.data, response.data)
-        # self.assertNotIn(serializer_three.data, response.data)
+        self.assertNotIn(serializer_three.data, response.data)
+
+
+def upload_session_url(recipe_id, session_id=None):
+    if session_id is None:
+        return reverse("recipe:recipe-upload-session-start", args=[recipe_id])
+    return reverse("recipe:recipe-upload-session", args=[recipe_id, session_id])
+
+
+def upload_chunk_url(recipe_id, session_id, index):
+    return reverse("recipe:recipe-upload-chunk", args=[recipe_id, session_id, index])
+
+
+def upload_complete_url(recipe_id, session_id):
+    return reverse("recipe:recipe-upload-session-complete", args=[recipe_id, session_id])
+
+
+@override_settings(UPLOAD_SESSION_ROOT=tempfile.mkdtemp())
+class ResumableImageUploadTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(user=self.user)
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (32, 32)).save(buffer, format="PNG")
+        self.data = buffer.getvalue()
+
+    def tearDown(self):
+        self.recipe.image.delete()
+
+    def _start(self):
+        payload = {
+            "filename": "photo.png",
+            "size": len(self.data),
+            "checksum": hashlib.sha256(self.data).hexdigest(),
+        }
+        response = self.client.post(upload_session_url(self.recipe.id), payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data["id"]
+
+    def _put_chunk(self, session_id, index, offset, chunk, checksum=None):
+        return self.client.put(
+            upload_chunk_url(self.recipe.id, session_id, index),
+            chunk,
+            content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_UPLOAD_CHECKSUM=checksum or hashlib.sha256(chunk).hexdigest(),
+        )
+
+    def test_chunked_upload_attaches_image(self):
+        session_id = self._start()
+        half = len(self.data) // 2
+
+        self._put_chunk(session_id, 0, 0, self.data[:half])
+        response = self._put_chunk(session_id, 1, half, self.data[half:])
+        self.assertEqual(response.data["offset"], len(self.data))
+
+        response = self.client.post(upload_complete_url(self.recipe.id, session_id))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        with self.recipe.image.open() as image:
+            self.assertEqual(image.read(), self.data)
+        self.assertFalse(ImageUploadSession.objects.exists())
+
+    def test_retransmitted_chunk_is_acknowledged(self):
+        session_id = self._start()
+        chunk = self.data[:10]
+
+        self._put_chunk(session_id, 0, 0, chunk)
+        response = self._put_chunk(session_id, 0, 0, chunk)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["offset"], 10)
+
+    def test_chunk_at_wrong_offset_conflicts(self):
+        session_id = self._start()
+
+        response = self._put_chunk(session_id, 0, 5, self.data[5:10])
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["offset"], 0)
+
+    def test_bad_checksum_is_rolled_back(self):
+        session_id = self._start()
+
+        response = self._put_chunk(session_id, 0, 0, self.data[:10], checksum="0" * 64)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(upload_session_url(self.recipe.id, session_id))
+        self.assertEqual(response.data["offset"], 0)
+
+    def test_incomplete_upload_cannot_finish(self):
+        session_id = self._start()
+        self._put_chunk(session_id, 0, 0, self.data[:10])
+
+        response = self.client.post(upload_complete_url(self.recipe.id, session_id))
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_sessions_limited_to_owner(self):
+        session_id = self._start()
+        other = get_user_model().objects.create_user("other@email.com", "1qazxsw2")
+        self.client.force_authenticate(other)
+
+        response = self.client.get(upload_session_url(self.recipe.id, session_id))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_malformed_session_id_not_found(self):
+        sessions_url = upload_session_url(self.recipe.id)
+        for session_id in ("abc", "----"):
+            response = self.client.get(f"{sessions_url}{session_id}/")
+
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,123 @@
+import io
+import json
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ChangeCounter, ImportJob, Ingredient, Recipe, Tag, UserCounters
+from recipe.importer import iter_json_array
+
+IMPORT_URL = reverse("recipe:recipe-import-file")
+
+
+def job_url(job_id):
+    return reverse("recipe:recipe-import-job", args=[job_id])
+
+
+class IterJsonArrayTests(TestCase):
+    def parse(self, text, read_size=4):
+        return list(iter_json_array(io.StringIO(text), read_size=read_size))
+
+    def test_items_across_reads(self):
+        items = [{"title": "Soup", "price": 1.5}, {"title": "Pie, [sweet]"}, 12345, []]
+        self.assertEqual(self.parse(json.dumps(items)), items)
+        self.assertEqual(self.parse(" [ ] "), [])
+
+    def test_malformed(self):
+        for text in ('{"title": "Soup"}', '[{"title": "Soup"}', '[{"title": "Soup"} {}]'):
+            with self.assertRaises(ValueError):
+                self.parse(text)
+
+
+@override_settings(RECIPE_IMPORT_IN_BACKGROUND=False, RECIPE_IMPORT_CHUNK_SIZE=2)
+class RecipeImportApiTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.settings_override = override_settings(RECIPE_IMPORT_ROOT=root.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def upload(self, name, content):
+        response = self.client.post(
+            IMPORT_URL, {"file": SimpleUploadedFile(name, content.encode())}, format="multipart"
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        return self.client.get(job_url(response.data["id"])).data
+
+    def test_import_json(self):
+        Tag.objects.create(user=self.user, name="Vegan")
+        rows = [
+            {"title": "Soup", "time_in_minutes": 5, "price": "2.00", "tags": ["Vegan"]},
+            {"title": "Curry", "time_in_minutes": 30, "price": "7.50", "ingredients": ["Rice"]},
+            {"title": "No price", "time_in_minutes": 1},
+            {"title": "Salad", "time_in_minutes": 5, "price": "3", "tags": ["Vegan", "Quick"]},
+        ]
+
+        job = self.upload("recipes.json", json.dumps(rows))
+
+        self.assertEqual(job["state"], ImportJob.DONE)
+        self.assertEqual((job["processed"], job["created"], job["failed"]), (4, 3, 1))
+        self.assertEqual([error["line"] for error in job["errors"]], [3])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        salad = Recipe.objects.get(user=self.user, title="Salad")
+        self.assertEqual(sorted(tag.name for tag in salad.tags.all()), ["Quick", "Vegan"])
+        self.assertEqual(Ingredient.objects.get(user=self.user).recipe_set.get().title, "Curry")
+        counts = UserCounters.objects.counts(self.user.pk)
+        self.assertEqual(counts, {"recipes": 3, "tags": 2, "ingredients": 1})
+
+    def test_imported_rows_get_change_numbers(self):
+        job = self.upload(
+            "recipes.json",
+            json.dumps([{"title": "Soup", "time_in_minutes": 5, "price": 2, "tags": ["Vegan"]}]),
+        )
+
+        self.assertEqual(job["created"], 1)
+        seqs = [Tag.objects.get().change_seq, Recipe.objects.get().change_seq]
+        self.assertEqual(seqs, [1, 2])
+        self.assertEqual(ChangeCounter.objects.get(user=self.user).value, 2)
+
+    def test_import_csv(self):
+        content = (
+            "title,time_in_minutes,price,link,tags,ingredients\n"
+            "Soup,5,2.00,,Vegan; Quick,Salt;Water\n"
+        )
+
+        job = self.upload("recipes.csv", content)
+
+        self.assertEqual(job["created"], 1)
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(sorted(i.name for i in recipe.ingredients.all()), ["Salt", "Water"])
+
+    def test_malformed_json_fails_job(self):
+        job = self.upload("recipes.json", '[{"title": "Soup", "time_in_minutes": 5, "price": 2}, {')
+
+        self.assertEqual(job["state"], ImportJob.FAILED)
+        self.assertEqual(job["created"], 1)
+
+    def test_unknown_format_rejected(self):
+        response = self.client.post(
+            IMPORT_URL, {"file": SimpleUploadedFile("recipes.txt", b"[]")}, format="multipart"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_job_not_found(self):
+        other = get_user_model().objects.create_user("other@email.com", "1qazxsw2")
+        job = ImportJob.objects.create(user=other, filename="x.json", format="json")
+
+        response = self.client.get(job_url(job.id))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_malformed_job_id_not_found(self):
+        response = self.client.get(reverse("recipe:recipe-list") + "imports/----/")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
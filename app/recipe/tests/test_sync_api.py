@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Tombstone
+
+SYNC_URL = reverse("recipe:sync")
+
+
+class PublicSyncApiTests(TestCase):
+    def test_login_required(self):
+        response = APIClient().get(SYNC_URL)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncApiTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since):
+        response = self.client.get(SYNC_URL, {"since": since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_full_sync_from_zero(self):
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        other = get_user_model().objects.create_user("other@email.com", "1qazxsw2")
+        Tag.objects.create(user=other, name="Not mine")
+
+        data = self.sync(0)
+
+        self.assertEqual(data["tags"], [{"id": tag.id, "name": "Vegan"}])
+        self.assertFalse(data["has_more"])
+
+    def test_only_changes_after_cursor(self):
+        Tag.objects.create(user=self.user, name="Vegan")
+        cursor = self.sync(0)["cursor"]
+        tag = Tag.objects.create(user=self.user, name="Dessert")
+
+        data = self.sync(cursor)
+
+        self.assertEqual([t["id"] for t in data["tags"]], [tag.id])
+        self.assertEqual(self.sync(data["cursor"])["tags"], [])
+
+    def test_deletes_leave_tombstones(self):
+        recipe = Recipe.objects.create(user=self.user, title="Soup", time_in_minutes=5, price=2)
+        cursor = self.sync(0)["cursor"]
+        recipe_id = recipe.id
+        recipe.delete()
+
+        data = self.sync(cursor)
+
+        self.assertEqual(data["deleted"], [{"type": "recipe", "id": recipe_id}])
+        self.assertEqual(data["recipes"], [])
+
+    def test_link_changes_resend_recipe(self):
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe = Recipe.objects.create(user=self.user, title="Soup", time_in_minutes=5, price=2)
+        recipe.tags.add(tag)
+        cursor = self.sync(0)["cursor"]
+        tag_id = tag.id
+
+        tag.delete()
+        data = self.sync(cursor)
+
+        self.assertEqual(data["recipes"][0]["tags"], [])
+        self.assertEqual(data["deleted"], [{"type": "tag", "id": tag_id}])
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_pages_through_changes(self):
+        for name in ("a", "b", "c"):
+            Tag.objects.create(user=self.user, name=name)
+
+        first = self.sync(0)
+        second = self.sync(first["cursor"])
+
+        self.assertTrue(first["has_more"])
+        self.assertEqual([t["name"] for t in first["tags"] + second["tags"]], ["a", "b", "c"])
+        self.assertFalse(second["has_more"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(SYNC_URL, {"since": "abc"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deleting_user_removes_change_tracking(self):
+        Tag.objects.create(user=self.user, name="Vegan").delete()
+
+        self.user.delete()
+
+        self.assertFalse(Tombstone.objects.exists())
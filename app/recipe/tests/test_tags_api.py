@@ -5,11 +5,12 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Tag
+from core.models import Recipe, Tag
 
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse("recipe:tag-list")
+AUTOCOMPLETE_URL = reverse("recipe:tag-autocomplete")
 
 
 class PublicTagApiTest(TestCase):
@@ -64,3 +65,21 @@ class PrivateTagsApiTests(TestCase):
         response = self.client.post(TAGS_URL, payload)
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_autocomplete_by_prefix_and_usage(self):
+        names = ["Vegan", "vegetarian", "Very quick", "Dessert", "VEGAN dessert"]
+        tags = {name: Tag.objects.create(user=self.user, name=name) for name in names}
+        recipe = Recipe.objects.create(user=self.user, title="Soup", time_in_minutes=5, price=2)
+        recipe.tags.add(tags["vegetarian"])
+        other = get_user_model().objects.create_user("other@email.com", "1qazxsw2")
+        Tag.objects.create(user=other, name="Vegetable")
+
+        response = self.client.get(AUTOCOMPLETE_URL, {"prefix": "vEg", "limit": 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([t["name"] for t in response.data], ["vegetarian", "Vegan"])
+
+    def test_autocomplete_requires_prefix(self):
+        response = self.client.get(AUTOCOMPLETE_URL, {"prefix": " "})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,14 +1,111 @@
-from core.models import Ingredient, Recipe, Tag
+import heapq
+import os
+import shutil
+import sys
+import time
+from decimal import Decimal
+
+from core.models import (
+    ImageUploadSession,
+    ImportJob,
+    Ingredient,
+    Recipe,
+    Tag,
+    Tombstone,
+    UserCounters,
+    normalize_name,
+)
+from core.events import (
+    EventStreamRenderer,
+    format_event,
+    get_broker,
+    release_connections,
+    replay,
+)
+from core.idempotency import IdempotentCreateMixin
+from core.sharding import ShardedViewMixin, current_shard, pinned_to_user
+from core.uploads import UploadOffsetMismatch, append_chunk, open_assembled_file
+from django.conf import settings
+from django.db import connections, transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from recipe import serializers
+from recipe.importer import start_import
+from recipe.popularity import view_counter
 from rest_framework import mixins, status, viewsets
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+# As Django's <uuid:> converter, so malformed ids are a 404 and never reach a UUIDField.
+UUID_PATTERN = r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+UPLOAD_SESSION_PATH = rf"upload-sessions/(?P<session_id>{UUID_PATTERN})"
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+# Each has a (user, field, id) index on Recipe.
+RECIPE_ORDERING_FIELDS = ("id", "price", "time_in_minutes", "title", "view_count", "popularity")
+
+
+def finite_decimal(value):
+    value = Decimal(value)
+    if not value.is_finite():
+        raise ValueError(value)
+    return value
+
+
+def includes(request):
+    return set(request.query_params.get("include", "").split(","))
+
+
+class CountedPagination(LimitOffsetPagination):
+    """Limit/offset pages whose total comes from the view's ``known_count`` when it has one"""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.view = view
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset):
+        count = self.view.known_count() if self.view is not None else None
+        return super().get_count(queryset) if count is None else count
+
+
+class CountedListMixin:
+    """
+    Takes the total of an unfiltered list from the user's counters instead of
+    a COUNT(*); ``?include=counts`` sends it as X-Total-Count.
+    """
+
+    counter_field = None
+
+    def is_filtered(self):
+        return False
+
+    def known_count(self):
+        if self.is_filtered():
+            return None
+        return UserCounters.objects.counts(self.request.user.pk)[self.counter_field]
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if "counts" in includes(request):
+            count = self.known_count()
+            if count is not None:
+                response["X-Total-Count"] = str(count)
+        return response
 
 
 class BaseRecipeAttrViewSet(
-    viewsets.GenericViewSet, mixins.ListModelMixin, mixins.CreateModelMixin
+    ShardedViewMixin,
+    IdempotentCreateMixin,
+    CountedListMixin,
+    viewsets.GenericViewSet,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
 ):
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
@@ -19,10 +116,31 @@ class BaseRecipeAttrViewSet(
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(methods=["GET"], detail=False)
+    def autocomplete(self, request):
+        """The most used names starting with ``?prefix=``, ignoring case"""
+        prefix = normalize_name(request.query_params.get("prefix", ""))
+        if not prefix:
+            raise ValidationError({"prefix": "This parameter is required"})
+        try:
+            limit = int(request.query_params.get("limit", AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            raise ValidationError({"limit": "Enter a whole number"})
+        limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+
+        queryset = self.queryset.filter(user=request.user, name_key__startswith=prefix)
+        if connections[queryset.db].vendor != "postgresql" and ord(prefix[-1]) < sys.maxunicode:
+            # With binary collation the prefix is also a range the index can seek.
+            upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            queryset = queryset.filter(name_key__gte=prefix, name_key__lt=upper)
+        queryset = queryset.order_by("-recipe_count", "name_key", "id")[:limit]
+        return Response(self.get_serializer(queryset, many=True).data)
+
 
 class TagViewSet(BaseRecipeAttrViewSet):
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    counter_field = "tags"
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
@@ -30,43 +148,129 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
 
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    counter_field = "ingredients"
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ShardedViewMixin, IdempotentCreateMixin, CountedListMixin, viewsets.ModelViewSet
+):
 
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    # Lists are paginated only when ?limit= is given.
+    pagination_class = CountedPagination
+    counter_field = "recipes"
+
+    def is_filtered(self):
+        params = ("tags", "ingredients", "min_price", "max_price", "max_time")
+        return any(self.request.query_params.get(param) for param in params)
 
     def _params_to_ints(self, qs):
         return [int(str_id) for str_id in qs.split(",")]
 
+    def _param(self, name, convert):
+        value = self.request.query_params.get(name)
+        if value in (None, ""):
+            return None
+        try:
+            return convert(value)
+        except (ArithmeticError, ValueError):
+            raise ValidationError({name: "Enter a number"})
+
+    def _ordering(self):
+        """
+        Fields from ``?ordering=``, with the id breaking ties in the direction
+        of the first field so the user-prefixed indexes serve the whole order.
+        """
+        fields = [f.strip() for f in self.request.query_params.get("ordering", "").split(",")]
+        fields = [f for f in fields if f] or ["-id"]
+        for field in fields:
+            if field.lstrip("-") not in RECIPE_ORDERING_FIELDS:
+                raise ValidationError({"ordering": f"Cannot order by {field}"})
+        if "id" not in {field.lstrip("-") for field in fields}:
+            fields.append("-id" if fields[0].startswith("-") else "id")
+        return fields
+
     def get_queryset(self):
         """ queryset """
         tags = self.request.query_params.get("tags")
         ingredients = self.request.query_params.get("ingredients")
-        queryset = self.queryset
+        queryset = self.queryset.filter(user=self.request.user)
         if tags:
             tag_ids = self._params_to_ints(tags)
             queryset = queryset.filter(tags__id__in=tag_ids)
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        if tags or ingredients:
+            queryset = queryset.distinct()
 
-        return self.queryset.filter(user=self.request.user)
+        if self.action == "list":
+            min_price = self._param("min_price", finite_decimal)
+            max_price = self._param("max_price", finite_decimal)
+            max_time = self._param("max_time", int)
+            if min_price is not None:
+                queryset = queryset.filter(price__gte=min_price)
+            if max_price is not None:
+                queryset = queryset.filter(price__lte=max_price)
+            if max_time is not None:
+                queryset = queryset.filter(time_in_minutes__lte=max_time)
+            return queryset.order_by(*self._ordering())
+        return queryset.order_by("-id")
 
     def get_serializer_class(self):
         if self.action == "retrieve":
             return serializers.RecipeDetailSerializer
-        elif self.action == "upload_image":
+        elif self.action == "batch":
+            return serializers.RecipeBatchSerializer
+        elif self.action in ("upload_image", "upload_session_complete"):
             return serializers.RecipeImageSerializer
+        elif self.action in ("upload_session_start", "upload_session", "upload_chunk"):
+            return serializers.ImageUploadSessionSerializer
+        elif self.action == "import_file":
+            return serializers.RecipeImportSerializer
+        elif self.action == "import_job":
+            return serializers.ImportJobSerializer
 
         return self.serializer_class
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        view_counter.record(instance)
+        return Response(self.get_serializer(instance).data)
+
+    @action(methods=["GET", "POST"], detail=False)
+    def batch(self, request):
+        """
+        Details of the recipes in ``?ids=1,2,3`` or a JSON body ``{"ids": [...]}``,
+        in the order asked for. Ids that do not exist or belong to someone else
+        are listed under ``missing``.
+        """
+        if request.method == "GET":
+            ids = request.query_params.get("ids", "")
+            data = {"ids": [pk.strip() for pk in ids.split(",") if pk.strip()]}
+        else:
+            data = request.data
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["ids"]
+
+        recipes = self.get_queryset().filter(id__in=ids).prefetch_related("tags", "ingredients")
+        found = {recipe.id: recipe for recipe in recipes}
+        return Response(
+            {
+                "recipes": serializers.RecipeDetailSerializer(
+                    [found[pk] for pk in ids if pk in found], many=True
+                ).data,
+                "missing": [pk for pk in ids if pk not in found],
+            }
+        )
+
     @action(methods=["POST"], detail=True, url_path="upload-image")
     def upload_image(self, request, pk=None):
         recipe = self.get_object()
@@ -77,3 +281,203 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def _get_upload_session(self, session_id, lock=False):
+        recipe = self.get_object()
+        sessions = ImageUploadSession.objects.filter(recipe=recipe)
+        if lock:
+            sessions = sessions.select_for_update()
+        return get_object_or_404(sessions, pk=session_id)
+
+    @action(methods=["POST"], detail=True, url_path="upload-sessions")
+    def upload_session_start(self, request, pk=None):
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(recipe=recipe, user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(methods=["GET", "DELETE"], detail=True, url_path=UPLOAD_SESSION_PATH)
+    def upload_session(self, request, pk=None, session_id=None):
+        session = self._get_upload_session(session_id)
+        if request.method == "DELETE":
+            path = session.path
+            session.delete()
+            if os.path.exists(path):
+                os.remove(path)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(self.get_serializer(session).data)
+
+    @action(
+        methods=["PUT"], detail=True, url_path=UPLOAD_SESSION_PATH + r"/chunks/(?P<index>[0-9]+)",
+    )
+    def upload_chunk(self, request, pk=None, session_id=None, index=None):
+        """Append one chunk; needs Upload-Offset and Upload-Checksum (SHA-256 hex)"""
+        try:
+            offset = int(request.META["HTTP_UPLOAD_OFFSET"])
+            checksum = request.META["HTTP_UPLOAD_CHECKSUM"]
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except (KeyError, ValueError):
+            raise ValidationError("Upload-Offset and Upload-Checksum headers are required")
+
+        with transaction.atomic(using=current_shard()):
+            session = self._get_upload_session(session_id, lock=True)
+            try:
+                append_chunk(session, int(index), offset, request.stream, length, checksum)
+            except UploadOffsetMismatch:
+                data = self.get_serializer(session).data
+                return Response(data, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(session).data)
+
+    @action(methods=["POST"], detail=True, url_path=UPLOAD_SESSION_PATH + "/complete")
+    def upload_session_complete(self, request, pk=None, session_id=None):
+        with transaction.atomic(using=current_shard()):
+            session = self._get_upload_session(session_id, lock=True)
+            path = session.path
+            try:
+                assembled = open_assembled_file(session)
+            except UploadOffsetMismatch:
+                return Response(
+                    {"detail": "Upload is incomplete", "offset": session.offset},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            with assembled:
+                session.recipe.image.save(session.filename, assembled)
+            session.delete()
+        if os.path.exists(path):
+            # The storage already had this content and kept its own copy.
+            os.remove(path)
+        return Response(self.get_serializer(session.recipe).data)
+
+    @action(methods=["POST"], detail=False, url_path="import")
+    def import_file(self, request):
+        """Start importing recipes from a JSON array or CSV file"""
+        # Read by the upload handler, which runs on the first access to request.data.
+        request._request.upload_max_bytes = settings.RECIPE_IMPORT_MAX_BYTES
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["file"]
+        job = ImportJob.objects.create(
+            user=request.user, filename=upload.name, format=serializer.validated_data["format"]
+        )
+
+        os.makedirs(settings.RECIPE_IMPORT_ROOT, exist_ok=True)
+        if hasattr(upload, "temporary_file_path"):
+            shutil.move(upload.temporary_file_path(), job.path)
+        else:
+            with open(job.path, "wb") as destination:
+                for chunk in upload.chunks():
+                    destination.write(chunk)
+        start_import(job)
+        return Response(serializers.ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(methods=["GET"], detail=False, url_path=rf"imports/(?P<job_id>{UUID_PATTERN})")
+    def import_job(self, request, job_id=None):
+        job = get_object_or_404(ImportJob, user=request.user, pk=job_id)
+        return Response(self.get_serializer(job).data)
+
+
+class SyncView(ShardedViewMixin, APIView):
+    """
+    Changes to the user's tags, ingredients and recipes after ``?since=<cursor>``.
+
+    Start from 0 and pass back the returned cursor until ``has_more`` is false.
+    Recipes come back whole, including their tag and ingredient ids, whenever
+    those links change.
+    """
+
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    sources = (
+        ("tags", Tag.objects.all(), serializers.TagSerializer),
+        ("ingredients", Ingredient.objects.all(), serializers.IngredientSerializer),
+        (
+            "recipes",
+            Recipe.objects.prefetch_related("tags", "ingredients"),
+            serializers.RecipeSerializer,
+        ),
+        ("deleted", Tombstone.objects.all(), serializers.TombstoneSerializer),
+    )
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get("since", 0))
+        except ValueError:
+            raise ValidationError({"since": "Cursor must be an integer"})
+        limit = settings.SYNC_PAGE_SIZE
+
+        changes = []
+        for key, queryset, _ in self.sources:
+            rows = queryset.filter(user=request.user, change_seq__gt=since)
+            rows = rows.order_by("change_seq")[: limit + 1]
+            changes.append([(row.change_seq, key, row) for row in rows])
+        merged = list(heapq.merge(*changes, key=lambda change: change[0]))
+
+        page = merged[:limit]
+        data = {"cursor": str(page[-1][0] if page else since), "has_more": len(merged) > limit}
+        for key, _, serializer_class in self.sources:
+            rows = [row for _, change_key, row in page if change_key == key]
+            data[key] = serializer_class(rows, many=True).data
+        return Response(data)
+
+
+class EventStreamView(APIView):
+    """
+    Server-sent events for changes to the user's tags, ingredients and recipes.
+
+    Event ids are change numbers, so a reconnect with Last-Event-ID replays
+    what was missed; a ``resync`` event asks the client to use the sync
+    endpoint from its cursor instead.
+    """
+
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = (*api_settings.DEFAULT_RENDERER_CLASSES, EventStreamRenderer)
+
+    def get(self, request):
+        last_id = request.META.get("HTTP_LAST_EVENT_ID") or request.query_params.get(
+            "last_event_id"
+        )
+        try:
+            last_id = int(last_id) if last_id else None
+        except ValueError:
+            raise ValidationError({"last_event_id": "Event id must be an integer"})
+
+        response = StreamingHttpResponse(
+            self.stream(request.user.pk, last_id), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    def stream(self, user_id, last_id):
+        broker = get_broker()
+        subscription = broker.subscribe(user_id)
+        try:
+            yield "retry: 3000\n\n"
+            if last_id is not None:
+                with pinned_to_user(user_id):
+                    events = replay(user_id, last_id, settings.SYNC_PAGE_SIZE)
+                if events is None:
+                    yield format_event({"cursor": str(last_id)}, event="resync")
+                    return
+                for event in events:
+                    yield format_event(event, event="change", event_id=event["seq"])
+                    last_id = event["seq"]
+            release_connections()
+
+            deadline = time.monotonic() + settings.EVENTS_STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                timeout = min(settings.EVENTS_HEARTBEAT_SECONDS, deadline - time.monotonic())
+                event = subscription.get(max(timeout, 0))
+                if subscription.overflowed:
+                    yield format_event({"cursor": str(last_id or 0)}, event="resync")
+                    return
+                if event is None:
+                    yield ": heartbeat\n\n"
+                elif last_id is None or event["seq"] > last_id:
+                    yield format_event(event, event="change", event_id=event["seq"])
+                    last_id = event["seq"]
+        finally:
+            broker.unsubscribe(subscription)
@@ -0,0 +1,127 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import DataError, IntegrityError, transaction
+from rest_framework.authtoken.models import Token
+
+from user.serializers import UserImportRowSerializer
+
+
+def _init_worker():
+    # Processes started with "spawn" do not inherit the configured apps.
+    import django
+
+    django.setup()
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = []
+        self.tokens = {}
+        self.failures = []
+
+    def fail(self, line, email, error):
+        self.failures.append({"line": line, "email": email, "error": error})
+
+
+class UserImporter:
+    """
+    Creates users in batches, hashing their passwords across a process pool.
+    A bad row is reported in ``failures`` and never stops the rest.
+    """
+
+    def __init__(self, batch_size=1000, workers=None, issue_tokens=False):
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count()
+        self.issue_tokens = issue_tokens
+
+    def run(self, rows):
+        """Import ``rows``, dicts with email, password and an optional name"""
+        result = ImportResult()
+        self.seen = set()
+        numbered = enumerate(rows, start=1)
+        pool = None
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+        try:
+            while True:
+                batch = list(itertools.islice(numbered, self.batch_size))
+                if not batch:
+                    break
+                self.import_batch(batch, pool, result)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        result.failures.sort(key=lambda failure: failure["line"])
+        return result
+
+    def validate(self, batch, result):
+        User = get_user_model()
+        valid = []
+        for line, row in batch:
+            serializer = UserImportRowSerializer(data=row)
+            if not serializer.is_valid():
+                field, errors = next(iter(serializer.errors.items()))
+                result.fail(line, str(row.get("email", ""))[:255], f"{field}: {errors[0]}")
+                continue
+            row = serializer.validated_data
+            email = User.objects.normalize_email(row["email"])
+            if email in self.seen:
+                result.fail(line, email, "Duplicate email in import")
+            else:
+                self.seen.add(email)
+                valid.append((line, email, row))
+
+        existing = set(
+            User.objects.filter(email__in=[email for _, email, _ in valid]).values_list(
+                "email", flat=True
+            )
+        )
+        for line, email, _ in valid:
+            if email in existing:
+                result.fail(line, email, "User with this email already exists")
+        return [entry for entry in valid if entry[1] not in existing]
+
+    def hash_passwords(self, passwords, pool):
+        if pool is None:
+            return [make_password(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+    def import_batch(self, batch, pool, result):
+        User = get_user_model()
+        valid = self.validate(batch, result)
+        hashes = self.hash_passwords([row["password"] for _, _, row in valid], pool)
+        users = [
+            (line, User(email=email, name=row["name"], password=password))
+            for (line, email, row), password in zip(valid, hashes)
+        ]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create([user for _, user in users])
+            created = [user.email for _, user in users]
+        except (IntegrityError, DataError):
+            # Someone signed up with one of the emails meanwhile, or the
+            # database refused a value; find out which rows.
+            created = []
+            for line, user in users:
+                try:
+                    with transaction.atomic():
+                        user.save(force_insert=True)
+                    created.append(user.email)
+                except IntegrityError:
+                    result.fail(line, user.email, "User with this email already exists")
+                except DataError as exc:
+                    result.fail(line, user.email, f"Invalid value: {exc}")
+        result.created.extend(created)
+
+        if self.issue_tokens and created:
+            emails = dict(User.objects.filter(email__in=created).values_list("id", "email"))
+            tokens = [Token(user_id=pk) for pk in emails]
+            for token in tokens:
+                token.key = token.generate_key()
+            Token.objects.bulk_create(tokens)
+            result.tokens.update((emails[token.user_id], token.key) for token in tokens)
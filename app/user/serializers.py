@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
@@ -27,6 +28,16 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
+class UserImportRowSerializer(UserSerializer):
+    """
+    One imported user, checked as at sign up. Whether the email is taken is
+    checked for a whole batch at once, so the unique validator is left out.
+    """
+
+    email = serializers.EmailField(max_length=255)
+    name = serializers.CharField(max_length=255, required=False, allow_blank=True, default="")
+
+
 class AuthTokenSerializer(serializers.Serializer):
     """ Authorization token serializer """
 
@@ -45,3 +56,12 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs["user"] = user
         return attrs
+
+
+class UserImportSerializer(serializers.Serializer):
+    """Rows are checked one by one during the import, so a bad row never fails the request"""
+
+    users = serializers.ListField(
+        child=serializers.DictField(), min_length=1, max_length=settings.USER_IMPORT_MAX_ROWS
+    )
+    issue_tokens = serializers.BooleanField(default=False)
@@ -5,6 +5,8 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.models import Tag
+
 CREATE_USER_URL = reverse("user:create")
 TOKEN_URL = reverse("user:token")
 ME_URL = reverse("user:me")
@@ -99,6 +101,13 @@ class PrivateUserApiTest(TestCase):
             response.data, {"name": self.user.name, "email": self.user.email}
         )
 
+    def test_retrieve_profile_with_counts(self):
+        Tag.objects.create(user=self.user, name="Vegan")
+
+        response = self.client.get(ME_URL, {"include": "counts"})
+
+        self.assertEqual(response.data["counts"], {"recipes": 0, "tags": 1, "ingredients": 0})
+
     def test_post_me_not_allowed(self):
         response = self.client.post(ME_URL, {})
 
@@ -0,0 +1,96 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.importer import UserImporter
+
+IMPORT_URL = reverse("user:import")
+
+FAST_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, USER_IMPORT_WORKERS=1)
+class UserImportApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_superuser("admin@email.com", "1qazxsw2")
+        self.client.force_authenticate(self.staff)
+
+    def test_staff_only(self):
+        user = get_user_model().objects.create_user("email@email.com", "1qazxsw2")
+        self.client.force_authenticate(user)
+
+        response = self.client.post(IMPORT_URL, {"users": []}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_creates_users_with_usable_passwords(self):
+        users = [
+            {"email": "one@email.com", "password": "secret1", "name": "One"},
+            {"email": "two@email.com", "password": "secret2"},
+        ]
+
+        response = self.client.post(IMPORT_URL, {"users": users}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"created": 2, "failures": []})
+        user = get_user_model().objects.get(email="one@email.com")
+        self.assertTrue(user.check_password("secret1"))
+        self.assertEqual(user.name, "One")
+
+    def test_bad_rows_are_reported_without_aborting(self):
+        users = [
+            {"email": "admin@email.com", "password": "secret"},
+            {"email": "new@email.com", "password": "secret"},
+            {"email": "new@email.com", "password": "secret"},
+            {"email": "not an email", "password": "secret"},
+            {"email": "other@email.com", "password": ""},
+        ]
+
+        response = self.client.post(IMPORT_URL, {"users": users}, format="json")
+
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual([f["line"] for f in response.data["failures"]], [1, 3, 4, 5])
+        self.assertTrue(get_user_model().objects.filter(email="new@email.com").exists())
+
+    def test_rows_of_wrong_types_or_lengths_fail_alone(self):
+        users = [
+            {"email": 12345, "password": "secret"},
+            {"email": ["one@email.com"], "password": "secret"},
+            {"email": f"{'x' * 250}@email.com", "password": "secret"},
+            {"email": "long@email.com", "password": "secret", "name": "x" * 256},
+            {"email": "fine@email.com", "password": "secret"},
+        ]
+
+        response = self.client.post(IMPORT_URL, {"users": users}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual([f["line"] for f in response.data["failures"]], [1, 2, 3, 4])
+        self.assertTrue(response.data["failures"][3]["error"].startswith("name:"))
+
+    def test_issue_tokens(self):
+        users = [{"email": "one@email.com", "password": "secret"}]
+
+        response = self.client.post(
+            IMPORT_URL, {"users": users, "issue_tokens": True}, format="json"
+        )
+
+        token = Token.objects.get(user__email="one@email.com")
+        self.assertEqual(response.data["tokens"], {"one@email.com": token.key})
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class UserImporterTests(TestCase):
+    def test_hashes_in_worker_processes(self):
+        rows = [{"email": f"user{i}@email.com", "password": f"secret{i}"} for i in range(5)]
+
+        result = UserImporter(batch_size=2, workers=2).run(rows)
+
+        self.assertEqual(len(result.created), 5)
+        self.assertTrue(
+            get_user_model().objects.get(email="user3@email.com").check_password("secret3")
+        )
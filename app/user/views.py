@@ -1,10 +1,17 @@
+from django.conf import settings
 from rest_framework import authentication, generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
-from user.serializers import AuthTokenSerializer, UserSerializer
+from rest_framework.views import APIView
+from core.idempotency import IdempotentCreateMixin
+from core.models import UserCounters
+from core.sharding import shard_for_user
+from user.importer import UserImporter
+from user.serializers import AuthTokenSerializer, UserImportSerializer, UserSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(IdempotentCreateMixin, generics.CreateAPIView):
     """User creation"""
 
     serializer_class = UserSerializer
@@ -26,3 +33,31 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
 
     def get_object(self):
         return self.request.user
+
+    def retrieve(self, request, *args, **kwargs):
+        """``?include=counts`` adds the user's recipe, tag and ingredient counts"""
+        data = self.get_serializer(self.get_object()).data
+        if "counts" in request.query_params.get("include", "").split(","):
+            manager = UserCounters.objects.db_manager(shard_for_user(request.user.pk))
+            data["counts"] = manager.counts(request.user.pk)
+        return Response(data)
+
+
+class ImportUsersView(APIView):
+    """Bulk user import for staff; reports the rows it could not create"""
+
+    authentication_classes = (authentication.TokenAuthentication,)
+    permission_classes = (permissions.IsAdminUser,)
+
+    def post(self, request):
+        serializer = UserImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        importer = UserImporter(
+            workers=settings.USER_IMPORT_WORKERS,
+            issue_tokens=serializer.validated_data["issue_tokens"],
+        )
+        result = importer.run(serializer.validated_data["users"])
+        data = {"created": len(result.created), "failures": result.failures}
+        if importer.issue_tokens:
+            data["tokens"] = result.tokens
+        return Response(data)